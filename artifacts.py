@@ -0,0 +1,74 @@
+import os
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+# Artefacts des exécutions (structured_synthesis.txt, works_output.txt, chunks_to_draft.txt) :
+# chaque exécution d'un outil écrit dans son propre répertoire, et chaque fichier est écrit
+# dans un fichier temporaire du même répertoire puis renommé (os.replace, atomique). Deux
+# exécutions simultanées, dans un même processus ou non, n'écrasent pas leurs sorties, et un
+# lecteur ne voit jamais un fichier à moitié écrit.
+
+# Racine des répertoires d'exécution ; une valeur vide écrit dans le répertoire courant
+DEFAULT_ROOT = os.getenv("ARTIFACTS_ROOT", "runs")
+
+
+def atomic_write_text(path: str, content: str) -> str:
+    """
+    Écrit un fichier texte de façon atomique : fichier temporaire dans le même répertoire,
+    vidé sur disque, puis renommé à la place de la cible.
+
+    Args:
+        path (str): Fichier à écrire (son répertoire est créé au besoin).
+        content (str): Contenu UTF-8.
+
+    Returns:
+        str: Chemin du fichier écrit.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def new_run_id(tool: str) -> str:
+    """Identifiant d'exécution unique entre processus et machines : horodatage, outil, suffixe aléatoire."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{tool}-{uuid.uuid4().hex[:8]}"
+
+
+class RunArtifacts:
+    """Répertoire des artefacts d'une exécution, créé à la première écriture."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @classmethod
+    def for_run(cls, tool: str, output_dir: Optional[str] = None) -> "RunArtifacts":
+        """
+        Répertoire d'une exécution de l'outil : output_dir s'il est fourni (batch, file de
+        tâches), sinon un répertoire neuf sous ARTIFACTS_ROOT.
+        """
+        if output_dir:
+            return cls(output_dir)
+        root = os.getenv("ARTIFACTS_ROOT", DEFAULT_ROOT)
+        return cls(os.path.join(root, new_run_id(tool)) if root else ".")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def write_text(self, name: str, content: str) -> str:
+        """Écrit un artefact (atomique) et retourne son chemin."""
+        return atomic_write_text(self.path(name), content)
@@ -0,0 +1,305 @@
+"""
+Pré-rédaction de plusieurs projets CIR en ligne de commande, sans Streamlit.
+
+Le manifeste (JSON) décrit les projets :
+
+    {
+      "defaults": {"provider": "xai", "pipelines": ["guess", "draft", "sections"]},
+      "projects": [
+        {
+          "name": "citykomi-2024",
+          "files": ["docs/Fonctionnalités.pdf", "docs/User guide Teamnews.pdf"],
+          "file_infos": ["Pour le fichier Fonctionnalités.pdf, ...", "Pour le fichier User guide Teamnews.pdf, ..."],
+          "synthesis_file": "docs/synthese.txt",
+          "solution_name": "Citykomi",
+          "company_name": "Citykomi",
+          "website": "https://www.citykomi.com",
+          "sections": ["1.1", "1.2", "1.3", "1.5", "1.7"]
+        }
+      ]
+    }
+
+Chemins relatifs au manifeste ; "synthesis" (texte) peut remplacer "synthesis_file" ;
+"file_infos" est facultatif. Pipelines :
+    - guess : GuessStrategyTool, morceaux pertinents dans chunks_to_draft.txt ;
+    - draft : DirectDraftingTool sur les morceaux retenus par guess, sinon WorkDraftingTool
+      sur tous les fichiers ; travaux dans works_output.txt ;
+    - sections : InnovationAnalysisTool, MarketStudyTool puis DraftingTool par section.
+
+Chaque projet s'exécute dans son propre processus (un processus neuf par projet), avec son
+répertoire de sortie comme répertoire courant et comme répertoire d'artefacts des outils :
+sorties (écrites de façon atomique), logs, cache de relance et métriques ne se mélangent pas. Les quotas des fournisseurs sont partagés entre les processus.
+
+Utilisation :
+    python batch_cli.py projets.json
+    python batch_cli.py projets.json --output-dir sorties --workers 4 --pipelines guess draft
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+from artifacts import atomic_write_text
+from llmscheduler import PROVIDER_LIMITS
+
+PIPELINES = ("guess", "draft", "sections")
+DEFAULT_SECTIONS = ["1.1", "1.2", "1.3", "1.5", "1.7"]
+
+
+def project_slug(name: str) -> str:
+    """Nom de répertoire sûr pour un projet."""
+    return re.sub(r"[^\w.-]+", "_", name).strip("._") or "projet"
+
+
+def load_manifest(path: str, pipelines: List[str] = None, provider: str = None) -> List[dict]:
+    """
+    Lit le manifeste et retourne les projets complétés (valeurs par défaut, chemins absolus,
+    synthèse chargée).
+
+    Args:
+        path (str): Chemin du manifeste JSON.
+        pipelines (list, optional): Pipelines imposés à tous les projets.
+        provider (str, optional): Fournisseur imposé à tous les projets.
+
+    Returns:
+        list: Projets prêts à être exécutés.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get("defaults", {})
+    projects, slugs = [], set()
+    for index, raw in enumerate(manifest.get("projects", [])):
+        project = {**defaults, **raw}
+        name = project.get("name") or f"projet_{index + 1}"
+        slug = project_slug(name)
+        if slug in slugs:
+            raise ValueError(f"Nom de projet en double dans le manifeste : {name}")
+        slugs.add(slug)
+
+        files = [os.path.join(base_dir, p) for p in project.get("files", [])]
+        file_infos = project.get("file_infos") or [
+            f"Pour le fichier {os.path.basename(p)}, la position est dossier source. Contenu : contenu générique."
+            for p in files]
+        if len(file_infos) != len(files):
+            raise ValueError(f"{name} : {len(files)} fichier(s) mais {len(file_infos)} file_info(s).")
+        synthesis = project.get("synthesis")
+        if not synthesis and project.get("synthesis_file"):
+            with open(os.path.join(base_dir, project["synthesis_file"]), "r", encoding="utf-8") as f:
+                synthesis = f.read().strip()
+        if not synthesis:
+            raise ValueError(f"{name} : synthèse du projet manquante (synthesis ou synthesis_file).")
+
+        selected = pipelines or project.get("pipelines") or list(PIPELINES)
+        unknown = set(selected) - set(PIPELINES)
+        if unknown:
+            raise ValueError(f"{name} : pipeline(s) inconnu(s) {sorted(unknown)}.")
+        projects.append({
+            "name": name,
+            "slug": slug,
+            "files": files,
+            "file_infos": file_infos,
+            "synthesis": synthesis,
+            "solution_name": project.get("solution_name", ""),
+            "company_name": project.get("company_name", ""),
+            "website": project.get("website"),
+            "sections": project.get("sections", DEFAULT_SECTIONS),
+            "pipelines": [p for p in PIPELINES if p in selected],
+            "provider": (provider or project.get("provider") or "xai").lower(),
+        })
+    return projects
+
+
+def share_provider_limits(workers: int):
+    """
+    Initialisation de chaque processus : les quotas RPM/TPM/concurrence de llmscheduler sont
+    par processus, on les divise donc par le nombre de processus pour respecter le quota global.
+    """
+    for provider, limits in PROVIDER_LIMITS.items():
+        prefix = provider.upper()
+        for key, env in (("rpm", "RPM"), ("tpm", "TPM"), ("max_concurrency", "MAX_CONCURRENCY")):
+            total = int(os.getenv(f"{prefix}_{env}", limits[key]))
+            os.environ[f"{prefix}_{env}"] = str(max(1, total // workers))
+
+
+def run_sections(project: dict, write_output):
+    """
+    Pipeline des sections : analyse d'innovation, étude de marché puis chaque section du
+    rapport ; write_output(nom, texte) enregistre chaque sortie.
+    """
+    from draftingtool import DraftingTool
+    from innovationanalysistool import InnovationAnalysisTool
+    from marketstudytool import MarketStudyTool
+    provider = project["provider"]
+    innovation = InnovationAnalysisTool()._run(
+        project["synthesis"], project["solution_name"], project["company_name"], project["website"],
+        llm_provider=provider)
+    write_output("innovation_analysis.txt", innovation)
+    market = MarketStudyTool()._run(
+        project["synthesis"], innovation_analysis=innovation, solution_name=project["solution_name"],
+        company_name=project["company_name"], llm_provider=provider)
+    write_output("market_study.txt", market)
+    drafting = DraftingTool()
+    for section in project["sections"]:
+        text = drafting._run(
+            content_to_draft=innovation if section == "1.3" else market,
+            synthesis=project["synthesis"], section=section, solution_name=project["solution_name"],
+            company_name=project["company_name"], llm_provider=provider)
+        write_output(f"section_{section}.txt", text)
+
+
+def run_project(project: dict, output_dir: str) -> dict:
+    """
+    Exécute les pipelines d'un projet dans son répertoire de sortie (processus dédié).
+
+    Returns:
+        dict: Bilan du projet (statut, durée, appels LLM, tokens, coût, sorties).
+    """
+    project_dir = os.path.join(output_dir, project["slug"])
+    os.makedirs(project_dir, exist_ok=True)
+    os.chdir(project_dir)  # Les outils écrivent leurs sorties et logs dans le répertoire courant
+    if "RUN_CACHE_PATH" not in os.environ:  # Cache de relance du projet (RUN_CACHE_PATH="" le désactive)
+        os.environ["RUN_CACHE_PATH"] = os.path.join(project_dir, "run_cache.sqlite")
+
+    from llmmetrics import get_metrics
+    metrics = get_metrics()
+    run_id = metrics.start_run(project["slug"])
+    provider = project["provider"]
+    outputs, errors = [], []
+    start = time.perf_counter()
+
+    def write_output(name: str, content: str):
+        atomic_write_text(name, content or "")
+        outputs.append(name)
+
+    chunks_to_draft = None
+    for pipeline in project["pipelines"]:
+        try:
+            if pipeline == "guess":
+                from guessstrategytool import GuessStrategyTool
+                chunks_to_draft = GuessStrategyTool(llm_provider=provider, output_dir=project_dir)._run(
+                    project["files"], project["file_infos"], project["synthesis"])
+                if os.path.exists("chunks_to_draft.txt"):
+                    outputs.append("chunks_to_draft.txt")
+            elif pipeline == "draft":
+                if chunks_to_draft:
+                    from directdraftingtool import DirectDraftingTool
+                    DirectDraftingTool(llm_provider=provider, output_dir=project_dir)._run(
+                        project["files"], project["file_infos"], project["synthesis"], chunks_to_draft)
+                else:
+                    from workdraftingtool import WorkDraftingTool
+                    WorkDraftingTool(llm_provider=provider, output_dir=project_dir)._run(
+                        project["files"], project["file_infos"], project["synthesis"])
+                if os.path.exists("works_output.txt"):
+                    outputs.append("works_output.txt")
+            elif pipeline == "sections":
+                run_sections(project, write_output)
+        except Exception as e:
+            errors.append({"pipeline": pipeline, "error": str(e), "traceback": traceback.format_exc()})
+
+    elapsed = time.perf_counter() - start
+    metrics.export_json("llm_metrics.json", run_id)
+    total = metrics.summary(run_id)["total"]
+    summary = {
+        "name": project["name"],
+        "directory": project_dir,
+        "status": "erreur" if errors else "ok",
+        "pipelines": project["pipelines"],
+        "files": len(project["files"]),
+        "duration_s": round(elapsed, 3),
+        "llm_calls": total["calls"],
+        "llm_errors": total["errors"],
+        "prompt_tokens": total["prompt_tokens"],
+        "completion_tokens": total["completion_tokens"],
+        "cost_usd": total["cost_usd"],
+        "outputs": outputs,
+        "errors": errors,
+    }
+    atomic_write_text("project_summary.json", json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
+
+
+def run_batch(projects: List[dict], output_dir: str, workers: int) -> dict:
+    """
+    Répartit les projets sur un pool de processus (un processus neuf par projet) et
+    retourne le bilan global, avec le débit en projets et en fichiers par heure.
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers, len(projects) or 1))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1,
+                             initializer=share_provider_limits, initargs=(workers,)) as pool:
+        futures = {pool.submit(run_project, project, output_dir): project for project in projects}
+        for future in as_completed(futures):
+            project = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # Processus mort (mémoire, signal) : le projet est marqué en erreur
+                result = {"name": project["name"], "status": "erreur", "files": len(project["files"]),
+                          "duration_s": None, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                          "cost_usd": 0.0, "outputs": [], "errors": [{"pipeline": None, "error": str(e)}]}
+            results.append(result)
+            print(f"[{len(results)}/{len(projects)}] {result['name']} : {result['status']} "
+                  f"({result['duration_s']}s, {result['llm_calls']} appels LLM)")
+            sys.stdout.flush()
+    elapsed = time.perf_counter() - start
+
+    order = {project["name"]: i for i, project in enumerate(projects)}
+    results.sort(key=lambda r: order[r["name"]])
+    files = sum(r["files"] for r in results)
+    return {
+        "workers": workers,
+        "projects": len(results),
+        "succeeded": sum(r["status"] == "ok" for r in results),
+        "failed": sum(r["status"] != "ok" for r in results),
+        "wall_time_s": round(elapsed, 3),
+        "projects_per_hour": round(len(results) * 3600 / elapsed, 2) if elapsed else None,
+        "files_per_hour": round(files * 3600 / elapsed, 2) if elapsed else None,
+        "llm_calls": sum(r["llm_calls"] for r in results),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in results),
+        "completion_tokens": sum(r["completion_tokens"] for r in results),
+        "cost_usd": round(sum(r["cost_usd"] for r in results), 6),
+        "results": results,
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Pré-rédaction de plusieurs projets CIR à partir d'un manifeste.")
+    parser.add_argument("manifest", help="Manifeste JSON des projets.")
+    parser.add_argument("--output-dir", default="batch_output", help="Répertoire des sorties (un sous-répertoire par projet).")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Nombre de projets en parallèle (les appels LLM attendent le réseau : au-delà du nombre de CPU).")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=None,
+                        help="Pipelines à exécuter (par défaut ceux du manifeste, sinon tous).")
+    parser.add_argument("--provider", choices=["xai", "openai"], default=None,
+                        help="Fournisseur pour tous les projets (par défaut celui du manifeste, sinon xai).")
+    args = parser.parse_args(argv)
+
+    projects = load_manifest(args.manifest, args.pipelines, args.provider)
+    if not projects:
+        print("Aucun projet dans le manifeste.")
+        return 1
+    summary = run_batch(projects, args.output_dir, args.workers)
+    summary_path = os.path.join(os.path.abspath(args.output_dir), "batch_summary.json")
+    atomic_write_text(summary_path, json.dumps(summary, ensure_ascii=False, indent=2))
+
+    print(f"\n{'projet':<30}{'statut':>8}{'durée s':>10}{'appels':>8}{'tokens':>10}{'coût $':>10}")
+    for r in summary["results"]:
+        tokens = r["prompt_tokens"] + r["completion_tokens"]
+        print(f"{r['name'][:29]:<30}{r['status']:>8}{r['duration_s'] or 0:>10.1f}{r['llm_calls']:>8}{tokens:>10}{r['cost_usd']:>10.4f}")
+    print(f"\n{summary['succeeded']}/{summary['projects']} projet(s) réussi(s) en {summary['wall_time_s']:.1f}s "
+          f"avec {summary['workers']} processus : {summary['projects_per_hour']} projets/h, "
+          f"{summary['files_per_hour']} fichiers/h, {summary['llm_calls']} appels LLM, {summary['cost_usd']:.4f} $.")
+    print(f"Bilan écrit dans {summary_path}")
+    return 0 if not summary["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Benchmark du magasin de morceaux (chunkstore.ChunkStore) face aux listes en mémoire.
+
+Pour un nombre croissant de fichiers, compare :
+    - "liste" : FileProcessingTool._run puis regroupement par fichier et recherche linéaire
+      du morceau (ancien fonctionnement des outils) ;
+    - "magasin" : FileProcessingTool.process_to_store puis accès direct par (fichier, part_id).
+Relève le pic mémoire (tracemalloc) et le temps moyen d'une recherche de morceau.
+
+Utilisation :
+    python benchmarks/bench_chunkstore.py
+    python benchmarks/bench_chunkstore.py --files 10 50 200 --chunks 40 --lookups 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipelines import write_input_file  # noqa: E402
+
+
+def bench_list(tool, paths, lookups):
+    tracemalloc.start()
+    chunks_by_file = {}
+    for chunk in tool._run(paths):
+        chunks_by_file.setdefault(chunk["source"], []).append(chunk)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for source, part_id in lookups:
+        next((c for c in chunks_by_file[source] if c["part_id"] == part_id), None)
+    return peak, (time.perf_counter() - start) / len(lookups)
+
+
+def bench_store(tool, paths, lookups):
+    from chunkstore import ChunkStore
+    with ChunkStore() as store:
+        tracemalloc.start()
+        tool.process_to_store(paths, store)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for source, part_id in lookups:
+            store.get(source, part_id)
+        return peak, (time.perf_counter() - start) / len(lookups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire et temps d'accès : listes de morceaux vs ChunkStore.")
+    parser.add_argument("--files", nargs="+", type=int, default=[5, 20, 80])
+    parser.add_argument("--chunks", type=int, default=30, help="Morceaux par fichier.")
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    from fileprocessingtool import FileProcessingTool
+    tool = FileProcessingTool()
+    rng = random.Random(0)
+    print(f"{'fichiers':>9}{'pic liste Mo':>14}{'pic magasin Mo':>16}{'accès liste µs':>16}{'accès magasin µs':>18}")
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = []
+        for n_files in args.files:
+            while len(paths) < n_files:
+                paths.append(write_input_file(workdir, len(paths), args.chunks))
+            lookups = [(os.path.basename(rng.choice(paths[:n_files])), rng.randint(1, args.chunks))
+                       for _ in range(args.lookups)]
+            list_peak, list_access = bench_list(tool, paths[:n_files], lookups)
+            store_peak, store_access = bench_store(tool, paths[:n_files], lookups)
+            print(f"{n_files:>9}{list_peak / 2**20:>14.2f}{store_peak / 2**20:>16.2f}"
+                  f"{list_access * 1e6:>16.1f}{store_access * 1e6:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark des aperçus locaux de morceaux (chunkdigest) : coût CPU et taille des prompts.
+
+Pour un nombre croissant de morceaux par fichier, relève :
+    - le temps de FileProcessingTool.process_to_store sans puis avec aperçus, et le coût
+      des aperçus par morceau ;
+    - la taille en tokens du texte brut des morceaux, de la table des matières complète
+      (mots-clés et phrases clés) et de la table réduite aux mots-clés.
+
+Utilisation :
+    python benchmarks/bench_digest.py
+    python benchmarks/bench_digest.py --chunks 10 50 200 --files 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipelines import write_input_file  # noqa: E402
+
+
+def process(paths, digests: bool):
+    from chunkstore import ChunkStore
+    from fileprocessingtool import FileProcessingTool
+    store = ChunkStore()
+    tool = FileProcessingTool(digests=digests)
+    start = time.perf_counter()
+    tool.process_to_store(paths, store)
+    return store, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût et compression des aperçus de morceaux (TF-IDF, TextRank).")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--chunks", nargs="+", type=int, default=[10, 50, 200], help="Morceaux par fichier.")
+    args = parser.parse_args()
+
+    from chunkdigest import table_of_contents
+    from tokencount import count_tokens
+
+    print(f"{'morceaux':>9} {'sans ms':>9} {'avec ms':>9} {'ms/morceau':>11} {'tokens bruts':>13} "
+          f"{'table':>8} {'mots-clés':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        # Échauffement : imports (parseurs, numpy) hors mesure
+        for digests in (False, True):
+            process([write_input_file(workdir, 0, 2)], digests)[0].close()
+        for n_chunks in args.chunks:
+            paths = [write_input_file(workdir, 100 * n_chunks + i, n_chunks) for i in range(args.files)]
+            plain, plain_s = process(paths, digests=False)
+            plain.close()
+            store, digest_s = process(paths, digests=True)
+            raw = toc = keywords = 0
+            for source in store.sources():
+                raw += sum(count_tokens(store.text(source, m["part_id"]) or "") for m in store.metadata(source))
+                toc += count_tokens(table_of_contents(store, source))
+                keywords += count_tokens(table_of_contents(store, source, summary=False))
+            total = store.count()
+            store.close()
+            print(f"{total:>9} {plain_s * 1000:>9.1f} {digest_s * 1000:>9.1f} "
+                  f"{(digest_s - plain_s) * 1000 / total:>11.3f} {raw:>13} "
+                  f"{toc:>8} ({toc / raw:.0%}) {keywords:>5} ({keywords / raw:.0%})")
+
+
+if __name__ == "__main__":
+    main()
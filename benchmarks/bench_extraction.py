@@ -0,0 +1,177 @@
+"""
+Benchmark d'ingestion : FileProcessingTool._extract_text et _chunk_text.
+
+Pour chaque format et tranche de taille du corpus synthétique (corpus_generator),
+le script mesure le débit d'extraction (Mo/s, mots/s), le débit de découpage
+(mots/s), le traitement d'un upload (écrit sur disque puis relu, ou lu en mémoire
+depuis un BytesIO) et le pic mémoire (tracemalloc, mesuré dans une passe séparée pour ne
+pas fausser les temps). Les résultats peuvent être enregistrés comme référence
+puis comparés aux exécutions suivantes : une baisse de débit au-delà de la
+tolérance est signalée et le script sort en erreur.
+
+Utilisation :
+    python benchmarks/bench_extraction.py --save-baseline
+    python benchmarks/bench_extraction.py                     # compare à la référence
+    python benchmarks/bench_extraction.py --formats pdf csv --buckets small medium --tolerance 0.25
+    python benchmarks/bench_extraction.py --chunking tokens                  # découpage par budget de tokens
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus_generator import GENERATORS, generate_corpus  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "extraction.json")
+
+
+def _best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_file(tool, item: dict, repeat: int) -> dict:
+    path = item["path"]
+    file_name = os.path.basename(path)
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+
+    chunk_text = tool._chunk_by_tokens if tool.chunking == "tokens" else tool._chunk_text
+    text = tool._extract_text(path, file_name)  # Passe de chauffe (imports des parseurs)
+    words = len(text.split())
+    extract_s = _best_time(lambda: tool._extract_text(path, file_name), repeat)
+    chunk_s = _best_time(lambda: chunk_text(text, file_name), repeat)
+    clean_s = _best_time(lambda: tool._extract_clean_text(path, file_name), repeat) if tool.clean_text else 0.0
+    cleaning = tool.cleaning_stats.get(file_name, {})
+    chunks = chunk_text(text, file_name)
+
+    # Upload Streamlit : ancien aller-retour par un fichier temporaire vs lecture en mémoire
+    with open(path, "rb") as f:
+        data = f.read()
+    upload_dir = tempfile.mkdtemp()
+
+    def upload_via_disk():
+        temp_path = os.path.join(upload_dir, file_name)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        tool._extract_text(temp_path, file_name)
+        os.remove(temp_path)
+
+    memory_text = tool._extract_text((file_name, io.BytesIO(data)), file_name)
+    if memory_text != text:
+        raise AssertionError(f"Extraction en mémoire différente de l'extraction par chemin pour {file_name}")
+    upload_disk_s = _best_time(upload_via_disk, repeat)
+    upload_memory_s = _best_time(lambda: tool._extract_text((file_name, io.BytesIO(data)), file_name), repeat)
+    os.rmdir(upload_dir)
+
+    return {
+        "format": item["format"],
+        "bucket": item["bucket"],
+        "chunking": tool.chunking,
+        "size_mb": round(size_mb, 4),
+        "words": words,
+        "chunks": len(chunks),
+        "extract_s": round(extract_s, 5),
+        "extract_mb_per_s": round(size_mb / extract_s, 3) if extract_s else None,
+        "extract_words_per_s": round(words / extract_s, 1) if extract_s else None,
+        "chunk_s": round(chunk_s, 5),
+        "extract_clean_s": round(clean_s, 5),
+        "words_removed": cleaning.get("words_removed", 0),
+        "tokens_removed": cleaning.get("tokens_removed", 0),
+        "chunk_words_per_s": round(words / chunk_s, 1) if chunk_s else None,
+        "upload_disk_s": round(upload_disk_s, 5),
+        "upload_memory_s": round(upload_memory_s, 5),
+        "extract_peak_mb": round(_peak_memory(lambda: tool._extract_text(path, file_name)) / (1024 * 1024), 3),
+        "chunk_peak_mb": round(_peak_memory(lambda: chunk_text(text, file_name)) / (1024 * 1024), 3),
+    }
+
+
+def compare_to_baseline(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Retourne les régressions : débit inférieur à (1 - tolerance) × référence,
+    ou pic mémoire supérieur à (1 + tolerance) × référence.
+    """
+    reference = {(r["format"], r["bucket"], r.get("chunking", "words")): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        ref = reference.get((result["format"], result["bucket"], result["chunking"]))
+        if not ref:
+            continue
+        for key in ("extract_words_per_s", "chunk_words_per_s"):
+            if ref.get(key) and result.get(key) is not None and result[key] < ref[key] * (1 - tolerance):
+                regressions.append(f"{result['format']}/{result['bucket']} {key} : {result[key]} < référence {ref[key]}")
+        for key in ("extract_peak_mb", "chunk_peak_mb"):
+            if ref.get(key) and result[key] > ref[key] * (1 + tolerance):
+                regressions.append(f"{result['format']}/{result['bucket']} {key} : {result[key]} > référence {ref[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark d'extraction et de découpage par format et taille.")
+    parser.add_argument("--formats", nargs="+", choices=list(GENERATORS), default=None)
+    parser.add_argument("--buckets", nargs="+", choices=["small", "medium", "large"], default=None)
+    parser.add_argument("--corpus-dir", default=None, help="Corpus existant (sinon généré dans un répertoire temporaire).")
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure (meilleur temps retenu).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichier de référence JSON.")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme nouvelle référence.")
+    parser.add_argument("--chunking", default="words", choices=["words", "tokens"], help="Mode de découpage mesuré.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Écart toléré par rapport à la référence.")
+    args = parser.parse_args()
+
+    from fileprocessingtool import FileProcessingTool
+    tool = FileProcessingTool(chunking=args.chunking)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = generate_corpus(args.corpus_dir or tmp, args.formats, args.buckets)
+        results = [bench_file(tool, item, args.repeat) for item in corpus]
+
+    print(f"{'format':<8}{'taille':<8}{'Mo':>9}{'mots':>10}{'Mo/s':>9}{'mots/s':>12}"
+          f"{'découpe mots/s':>16}{'pic extr. Mo':>14}{'mots nettoyés':>15}{'upload disque ms':>18}{'upload mémoire ms':>19}")
+    for r in results:
+        print(f"{r['format']:<8}{r['bucket']:<8}{r['size_mb']:>9.3f}{r['words']:>10}{r['extract_mb_per_s']:>9.2f}"
+              f"{r['extract_words_per_s']:>12.0f}{r['chunk_words_per_s']:>16.0f}{r['extract_peak_mb']:>14.2f}"
+              f"{r['words_removed']:>15}{r['upload_disk_s'] * 1000:>18.2f}{r['upload_memory_s'] * 1000:>19.2f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"Référence enregistrée dans {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Régressions par rapport à la référence :")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("Aucune régression par rapport à la référence.")
+    else:
+        print(f"Pas de référence ({args.baseline}) : relancez avec --save-baseline pour en créer une.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark du découpage aligné sur les sections et du plan des documents (documentoutline),
+contre le serveur local fake_openai_server.
+
+Des rapports Word sont générés avec des titres (introduction, travaux et sous-sections,
+annexe 'guide utilisateur', conclusion) :
+    1. découpage "words" contre "sections" : nombre de morceaux et morceaux à cheval sur
+       deux sections (un titre au milieu de leur texte nouveau) ;
+    2. GuessStrategyTool (découpage "sections") sans puis avec le plan du fichier dans les
+       prompts : le serveur saute les sections de guide quand le plan les signale.
+
+Utilisation :
+    python benchmarks/bench_outline.py
+    python benchmarks/bench_outline.py --files 4 --guide-words 4000 --latency 0.1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipelines import FILE_INFO, PROJECT_SYNTHESIS  # noqa: E402
+from bench_prefilter import GUIDE_SENTENCE  # noqa: E402
+from fake_openai_server import FakeLLMConfig, FakeOpenAIServer  # noqa: E402
+
+PROJECT_WORDS = ("nous avons conçu le module de notification géolocalisée avec des règles de ciblage, "
+                 "mesuré la latence des envois et corrigé les échecs de synchronisation du back-office").split()
+
+
+def paragraphs(rng: random.Random, vocabulary, words: int, prefix: str = ""):
+    for _ in range(max(1, words // 40)):
+        yield prefix + " ".join(rng.choice(vocabulary) for _ in range(40)) + "."
+
+
+def write_report(directory: str, index: int, work_sections: int, guide_words: int) -> str:
+    """Rapport Word : introduction, travaux (une sous-section par lot), annexe de guide, conclusion."""
+    import docx
+    rng = random.Random(index)
+    document = docx.Document()
+    document.add_heading(f"Rapport technique {index}", 0)
+    document.add_heading("Introduction", 1)
+    for text in paragraphs(rng, PROJECT_WORDS, 200):
+        document.add_paragraph(text)
+    document.add_heading("Travaux réalisés", 1)
+    for section in range(work_sections):
+        document.add_heading(f"Lot {section + 1}", 2)
+        for text in paragraphs(rng, PROJECT_WORDS, rng.randint(250, 900)):
+            document.add_paragraph(text)
+    document.add_heading("Annexe : guide utilisateur", 1)
+    for text in paragraphs(rng, GUIDE_SENTENCE.split(), guide_words, prefix="Guide utilisateur : "):
+        document.add_paragraph(text)
+    document.add_heading("Conclusion", 1)
+    for text in paragraphs(rng, PROJECT_WORDS, 200):
+        document.add_paragraph(text)
+    path = os.path.join(directory, f"rapport_{index}.docx")
+    document.save(path)
+    return path
+
+
+def chunking_stats(file_paths, mode: str) -> dict:
+    from fileprocessingtool import FileProcessingTool
+    tool = FileProcessingTool(chunking=mode, outline=True)
+    chunks = straddling = 0
+    for file_chunks in tool._iter_file_chunks(file_paths):
+        file_chunks = [c for c in file_chunks if "error" not in c]
+        if not file_chunks:
+            continue
+        positions = [e["position"] for e in tool.outlines.get(file_chunks[0]["source"], [])]
+        chunks += len(file_chunks)
+        straddling += sum(1 for c in file_chunks
+                          if any(c["start_word"] + (c.get("overlap_words") or 0) < p < c["end_word"] for p in positions))
+    return {"chunks": chunks, "straddling": straddling}
+
+
+def run_guess(file_paths, provider: str, outline: bool) -> dict:
+    from guessstrategytool import GuessStrategyTool
+    from llmmetrics import get_metrics
+    os.environ["DOCUMENT_OUTLINE"] = "1" if outline else "0"
+    metrics = get_metrics()
+    run_id = metrics.start_run(f"outline-{outline}-{time.time_ns()}")
+    tool = GuessStrategyTool(llm_provider=provider, incremental=False)
+    start = time.perf_counter()
+    selected = tool._run(file_paths, [FILE_INFO.format(name=os.path.basename(p)) for p in file_paths], PROJECT_SYNTHESIS)
+    elapsed = time.perf_counter() - start
+    total = metrics.summary(run_id)["total"]
+    return {"selected": set(selected), "wall_time_s": elapsed, "llm_calls": total["calls"],
+            "prompt_tokens": total["prompt_tokens"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Découpage par sections et plan des documents.")
+    parser.add_argument("--files", type=int, default=3, help="Rapports générés.")
+    parser.add_argument("--work-sections", type=int, default=4, help="Sous-sections de travaux par rapport.")
+    parser.add_argument("--guide-words", type=int, default=3000, help="Taille de l'annexe de guide (mots).")
+    parser.add_argument("--provider", default="xai", choices=["xai", "openai"])
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(FakeLLMConfig(latency_s=args.latency)) as server, tempfile.TemporaryDirectory() as workdir:
+        for key in ("XAI", "OPENAI"):
+            os.environ[f"{key}_API_KEY"] = "fake-key"
+            os.environ[f"{key}_BASE_URL"] = server.base_url
+            os.environ[f"{key}_RPM"] = "100000"
+            os.environ[f"{key}_TPM"] = "100000000"
+        os.environ["CHUNKING_MODE"] = "sections"
+        os.environ["DECISION_LOG_PATH"] = ""  # Mesure seule : ni journal ni pré-filtre
+        os.environ["RELEVANCE_MODEL_PATH"] = ""
+        files = [write_report(workdir, i, args.work_sections, args.guide_words) for i in range(args.files)]
+
+        for mode in ("words", "sections"):
+            stats = chunking_stats(files, mode)
+            print(f"découpage {mode:<9} morceaux={stats['chunks']:<4} à cheval sur deux sections={stats['straddling']}")
+
+        cwd = os.getcwd()
+        os.chdir(workdir)  # Les outils écrivent leurs sorties dans le répertoire courant
+        try:
+            baseline = run_guess(files, args.provider, outline=False)
+            with_outline = run_guess(files, args.provider, outline=True)
+        finally:
+            os.chdir(cwd)
+
+    for label, result in (("sans plan", baseline), ("avec plan", with_outline)):
+        print(f"{label:<10} temps={result['wall_time_s']:>6.2f}s appels={result['llm_calls']:<4} "
+              f"tokens prompt={result['prompt_tokens']:<7} morceaux retenus={len(result['selected'])}")
+    lost = baseline["selected"] - with_outline["selected"]
+    print(f"Appels évités : {baseline['llm_calls'] - with_outline['llm_calls']} ; morceaux retenus perdus : {len(lost)}"
+          f"{' ' + str(sorted(lost)) if lost else ''}.")
+
+
+if __name__ == "__main__":
+    main()
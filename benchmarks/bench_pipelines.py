@@ -0,0 +1,269 @@
+"""
+Benchmark de bout en bout des pipelines LLM contre le serveur local fake_openai_server.
+
+Pour chaque scénario (nombre de fichiers × nombre de morceaux par fichier), le script
+génère des fichiers d'entrée, exécute les outils et relève le temps total, le nombre
+d'appels, les percentiles de latence (via llmmetrics) et le débit en morceaux/s.
+
+Utilisation :
+    python benchmarks/bench_pipelines.py
+    python benchmarks/bench_pipelines.py --files 1 4 --chunks 1 10 --latency 0.1 --tokens-per-s 200
+    python benchmarks/bench_pipelines.py --tools work guess --output pipelines.json
+    python benchmarks/bench_pipelines.py --tools work --stall-rate 0.1 --hedging   # p95/p99 avec et sans hedging
+    python benchmarks/bench_pipelines.py --tools work --files 2 --revisions 2       # révisions quasi identiques
+    python benchmarks/bench_pipelines.py --tools work guess --rerun                 # relance incrémentale
+    python benchmarks/bench_pipelines.py --tools work --latency 0.3 --speculation   # morceau N+1 anticipé
+    python benchmarks/bench_pipelines.py --tools work guess --chunks 30 --traversal walk plan   # plan puis parallèle
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeLLMConfig, FakeOpenAIServer  # noqa: E402
+
+FILE_INFO = "Pour le fichier {name}, la position est dossier source. Contenu : spécifications techniques du projet."
+PROJECT_SYNTHESIS = (
+    "Le projet vise à concevoir une plateforme de diffusion d'informations locales en temps réel, "
+    "sans collecte de données personnelles, avec un back-office de publication et des notifications ciblées."
+)
+SENTENCE = ("Nous avons mis en place un pipeline de traitement des notifications qui agrège les flux des "
+            "collectivités, applique les règles de ciblage et mesure les temps de livraison sur mobile. ")
+
+
+def write_input_file(directory: str, index: int, chunks: int, revision_of: int = None) -> str:
+    """
+    Écrit un fichier CSV d'une colonne dont la taille produit `chunks` morceaux
+    avec le découpage par défaut (fenêtres de 700 mots, pas de 600). Le contenu dépend de
+    `index` ; avec revision_of, le fichier reprend le contenu du fichier revision_of avec
+    environ 2 % de mots modifiés (révision d'un même document).
+    """
+    words_needed = 650 if chunks <= 1 else 600 * (chunks - 1) + 300
+    sentence_words = len(SENTENCE.split())
+    lines = max(1, words_needed // sentence_words)
+    rng = random.Random(index if revision_of is None else revision_of)
+    edits = random.Random(1000 + index)
+    path = os.path.join(directory, f"document_{index}.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["contenu"])
+        for line in range(lines):
+            words = SENTENCE.split()
+            rng.shuffle(words)
+            if revision_of is not None:
+                words = [w if edits.random() > 0.02 else "révisé" for w in words]
+            writer.writerow([f"{line} {' '.join(words)}"])
+    return path
+
+
+def run_tool(tool_key: str, file_paths, provider: str, file_infos=None, **tool_options):
+    """
+    Exécute un outil sur les fichiers donnés. tool_options est passé au constructeur des
+    outils de parcours (work, guess), qui sont retournés après exécution.
+    """
+    file_infos = file_infos or [FILE_INFO.format(name=os.path.basename(p)) for p in file_paths]
+    if tool_key == "work":
+        from workdraftingtool import WorkDraftingTool
+        tool = WorkDraftingTool(llm_provider=provider, **tool_options)
+        tool._run(file_paths, file_infos, PROJECT_SYNTHESIS)
+        return tool
+    elif tool_key == "guess":
+        from guessstrategytool import GuessStrategyTool
+        tool = GuessStrategyTool(llm_provider=provider, **tool_options)
+        tool._run(file_paths, file_infos, PROJECT_SYNTHESIS)
+        return tool
+    elif tool_key == "direct":
+        from directdraftingtool import DirectDraftingTool
+        from fileprocessingtool import FileProcessingTool
+        chunks = [c for c in FileProcessingTool()._run(file_paths) if "error" not in c]
+        DirectDraftingTool(llm_provider=provider)._run(
+            file_paths, file_infos, PROJECT_SYNTHESIS, [(c["source"], c["part_id"]) for c in chunks])
+    elif tool_key == "sections":
+        from draftingtool import DraftingTool
+        from innovationanalysistool import InnovationAnalysisTool
+        from marketstudytool import MarketStudyTool
+        innovation = InnovationAnalysisTool()._run(PROJECT_SYNTHESIS, "Citykomi", "Citykomi", None, llm_provider=provider)
+        market = MarketStudyTool()._run(PROJECT_SYNTHESIS, innovation_analysis=innovation, solution_name="Citykomi",
+                                        company_name="Citykomi", llm_provider=provider)
+        drafting = DraftingTool()
+        for section in ("1.1", "1.2", "1.3", "1.5", "1.7"):
+            drafting._run(content_to_draft=market, synthesis=PROJECT_SYNTHESIS, section=section,
+                          solution_name="Citykomi", llm_provider=provider)
+    else:
+        raise ValueError(f"Outil inconnu : {tool_key}")
+
+
+def bench_rerun(tool_key: str, file_paths, n_chunks: int, provider: str, scenario_dir: str) -> dict:
+    """
+    Relance incrémentale dans le même répertoire (même cache runcache) : les informations du
+    premier fichier changent et un fichier est ajouté ; seuls ces deux fichiers sont retraités.
+    """
+    from llmmetrics import get_metrics
+
+    file_paths = file_paths + [write_input_file(scenario_dir, len(file_paths), n_chunks)]
+    file_infos = [FILE_INFO.format(name=os.path.basename(p)) for p in file_paths]
+    file_infos[0] += " Informations complétées par l'utilisateur."
+    metrics = get_metrics()
+    run_id = metrics.start_run(f"{tool_key}-rerun-{time.time_ns()}")
+    cwd = os.getcwd()
+    os.chdir(scenario_dir)
+    start = time.perf_counter()
+    try:
+        run_tool(tool_key, file_paths, provider, file_infos)
+    finally:
+        elapsed = time.perf_counter() - start
+        os.chdir(cwd)
+    total = metrics.summary(run_id)["total"]
+    return {"files": len(file_paths), "wall_time_s": round(elapsed, 3), "llm_calls": total["calls"],
+            "prompt_tokens": total["prompt_tokens"]}
+
+
+def bench_scenario(tool_key: str, n_files: int, n_chunks: int, provider: str, workdir: str, revisions: int = 0,
+                   rerun: bool = False, tool_options: dict = None) -> dict:
+    from llmmetrics import get_metrics
+
+    scenario_dir = tempfile.mkdtemp(prefix=f"{tool_key}_{n_files}x{n_chunks}_", dir=workdir)
+    file_paths = [write_input_file(scenario_dir, i, n_chunks) for i in range(n_files)]
+    # Révisions : copies quasi identiques des premiers fichiers (détectées par chunkdedup)
+    file_paths += [write_input_file(scenario_dir, n_files + i, n_chunks, revision_of=i) for i in range(revisions)]
+
+    metrics = get_metrics()
+    run_id = metrics.start_run(f"{tool_key}-{n_files}x{n_chunks}-{time.time_ns()}")
+    cwd = os.getcwd()
+    os.chdir(scenario_dir)  # Les outils écrivent leurs sorties dans le répertoire courant
+    start = time.perf_counter()
+    try:
+        tool = run_tool(tool_key, file_paths, provider, **(tool_options or {}))
+    finally:
+        elapsed = time.perf_counter() - start
+        os.chdir(cwd)
+
+    total = metrics.summary(run_id)["total"]
+    units = (n_files + revisions) * n_chunks if tool_key != "sections" else total["calls"]
+    result = {
+        "tool": tool_key,
+        "files": n_files,
+        "revisions": revisions,
+        "chunks_per_file": n_chunks,
+        "wall_time_s": round(elapsed, 3),
+        "llm_calls": total["calls"],
+        "llm_errors": total["errors"],
+        "llm_retries": total["retries"],
+        "prompt_tokens": total["prompt_tokens"],
+        "completion_tokens": total["completion_tokens"],
+        "latency_p50_s": total["latency_p50_s"],
+        "latency_p95_s": total["latency_p95_s"],
+        "latency_p99_s": total["latency_p99_s"],
+        "units_per_s": round(units / elapsed, 3) if elapsed else None,
+        "hedging": metrics.hedge_report(run_id),
+    }
+    if tool_key == "work" and tool.speculative:
+        result["speculation"] = dict(tool.speculation_stats)
+    if rerun and tool_key in ("work", "guess"):
+        result["rerun"] = bench_rerun(tool_key, file_paths, n_chunks, provider, scenario_dir)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des pipelines LLM contre un serveur local.")
+    parser.add_argument("--tools", nargs="+", default=["work", "guess", "direct", "sections"],
+                        choices=["work", "guess", "direct", "sections"])
+    parser.add_argument("--files", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--chunks", nargs="+", type=int, default=[1, 5, 10])
+    parser.add_argument("--provider", default="xai", choices=["xai", "openai"])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-s", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Proportion de requêtes bloquées (latence de queue).")
+    parser.add_argument("--stall-latency", type=float, default=2.0)
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="Proportion de réponses JSON tronquées (relance).")
+    parser.add_argument("--revisions", type=int, default=0, help="Ajoute N révisions quasi identiques des premiers fichiers.")
+    parser.add_argument("--rerun", action="store_true",
+                        help="Relance work/guess après modification d'un file_info et ajout d'un fichier.")
+    parser.add_argument("--hedging", action="store_true", help="Active le hedging xAI/OpenAI.")
+    parser.add_argument("--hedging-deadline", type=float, default=None, help="Échéance avant doublon, en s (sinon percentile observé).")
+    parser.add_argument("--speculation", action="store_true",
+                        help="Rejoue work sans puis avec rédaction spéculative du morceau N+1.")
+    parser.add_argument("--skip-every", type=int, default=0,
+                        help="Le serveur saute un morceau sur N (prédictions N+1 fausses).")
+    parser.add_argument("--traversal", nargs="+", default=["walk"], choices=["walk", "plan", "auto"],
+                        help="Modes de parcours de work/guess, rejoués l'un après l'autre.")
+    parser.add_argument("--rpm", type=int, default=100_000, help="Quota requêtes/min simulé côté llmscheduler.")
+    parser.add_argument("--tpm", type=int, default=100_000_000, help="Quota tokens/min simulé côté llmscheduler.")
+    parser.add_argument("--output", default=None, help="Fichier JSON où écrire les résultats.")
+    args = parser.parse_args()
+    if args.hedging and args.speculation:
+        parser.error("--hedging et --speculation se mesurent séparément.")
+
+    config = FakeLLMConfig(latency_s=args.latency, tokens_per_s=args.tokens_per_s, error_rate=args.error_rate,
+                           stall_rate=args.stall_rate, stall_latency_s=args.stall_latency,
+                           invalid_json_rate=args.invalid_json_rate, skip_every=args.skip_every)
+    from llmclient import configure_hedging
+    results = []
+    with FakeOpenAIServer(config) as server, tempfile.TemporaryDirectory() as workdir:
+        for key in ("XAI", "OPENAI"):
+            os.environ[f"{key}_API_KEY"] = "fake-key"
+            os.environ[f"{key}_BASE_URL"] = server.base_url
+            # Par défaut, quotas très larges : on mesure les pipelines, pas le lissage des quotas
+            os.environ[f"{key}_RPM"] = str(args.rpm)
+            os.environ[f"{key}_TPM"] = str(args.tpm)
+
+        for tool_key in args.tools:
+            # Les outils de section ne dépendent pas des fichiers : un seul scénario
+            grid = [(0, 0)] if tool_key == "sections" else [(f, c) for f in args.files for c in args.chunks]
+            for n_files, n_chunks in grid:
+                # Outils de parcours : un passage par mode de parcours demandé (--traversal)
+                for traversal in (args.traversal if tool_key in ("work", "guess") else [None]):
+                    # Avec --hedging (ou --speculation pour work), chaque scénario est rejoué sans puis
+                    # avec l'option pour mesurer le gain
+                    speculation = args.speculation and tool_key == "work"
+                    for enabled in ([False, True] if args.hedging or speculation else [False]):
+                        hedging = args.hedging and enabled
+                        configure_hedging(enabled=hedging, default_deadline_s=args.hedging_deadline)
+                        tool_options = {"traversal": traversal} if traversal else {}
+                        if speculation:
+                            tool_options["speculative"] = enabled
+                        result = bench_scenario(tool_key, n_files, n_chunks, args.provider, workdir, args.revisions,
+                                                args.rerun, tool_options)
+                        result["hedging_enabled"] = hedging
+                        result["traversal"] = traversal
+                        results.append(result)
+                        print(f"{tool_key:<9} fichiers={n_files:<3} morceaux/fichier={n_chunks:<4} "
+                              f"{f'[{traversal}] ' if traversal and len(args.traversal) > 1 else ''}"
+                              f"{'[hedging] ' if hedging else ''}{'[spéculation] ' if speculation and enabled else ''}"
+                              f"temps={result['wall_time_s']:>7.2f}s appels={result['llm_calls']:<4} réessais={result['llm_retries']:<3} "
+                              f"p95={result['latency_p95_s']}s débit={result['units_per_s']}/s")
+                        if "rerun" in result:
+                            rerun = result["rerun"]
+                            print(f"          relance ({rerun['files']} fichiers, 1 modifié, 1 ajouté) : "
+                                  f"temps={rerun['wall_time_s']:.2f}s appels={rerun['llm_calls']} "
+                                  f"tokens prompt={rerun['prompt_tokens']}")
+                    if speculation:
+                        baseline, speculative = results[-2], results[-1]
+                        stats = speculative["speculation"]
+                        print(f"          spéculation : {stats['hits']}/{stats['predictions']} prédictions justes "
+                              f"({stats['hit_rate']:.0%}), {stats['saved_s']:.2f}s de latence économisée, "
+                              f"{stats['misses']} appel(s) écarté(s) ; temps {baseline['wall_time_s']}s → "
+                              f"{speculative['wall_time_s']}s, appels {baseline['llm_calls']} → {speculative['llm_calls']}")
+                    if args.hedging:
+                        baseline, hedged = results[-2]["hedging"], results[-1]["hedging"]
+                        print(f"          hedging : {hedged['hedge_wins']}/{hedged['hedged_calls']} appels gagnés par le doublon, "
+                              f"p95 morceau {baseline['chunk_latency_p95_s']}s → {hedged['chunk_latency_p95_s']}s, "
+                              f"p99 morceau {baseline['chunk_latency_p99_s']}s → {hedged['chunk_latency_p99_s']}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark du pré-filtre local de pertinence (decisionlog, relevancefilter) de bout en bout,
+contre le serveur local fake_openai_server.
+
+    1. GuessStrategyTool évalue un premier lot de fichiers (documents de projet et guides
+       utilisateur, que le serveur juge toujours non pertinents) ; ses décisions sont
+       journalisées dans chunk_decisions.jsonl ;
+    2. le classifieur est entraîné sur ce journal (relevance_cli train), avec son rapport de
+       précision sur les décisions tenues à l'écart ;
+    3. un second lot de fichiers, jamais vus, est évalué sans puis avec le pré-filtre : appels
+       LLM, temps, morceaux écartés et accord des sélections.
+
+Utilisation :
+    python benchmarks/bench_prefilter.py
+    python benchmarks/bench_prefilter.py --project-files 4 --guide-files 4 --chunks 12 --latency 0.1
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipelines import FILE_INFO, PROJECT_SYNTHESIS, write_input_file  # noqa: E402
+from fake_openai_server import FakeLLMConfig, FakeOpenAIServer  # noqa: E402
+
+GUIDE_SENTENCE = ("pour modifier votre profil, ouvrez le menu Paramètres puis cliquez sur Enregistrer. "
+                  "Installez la bibliothèque avec le gestionnaire de paquets puis importez le module. "
+                  "Pour réinitialiser votre mot de passe, saisissez votre adresse et suivez le lien reçu. ")
+
+
+def write_guide_file(directory: str, index: int, chunks: int) -> str:
+    """Guide utilisateur (documentation externe) de la taille de `chunks` morceaux."""
+    words_needed = 650 if chunks <= 1 else 600 * (chunks - 1) + 300
+    rng = random.Random(10_000 + index)
+    path = os.path.join(directory, f"guide_{index}.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["contenu"])
+        for line in range(max(1, words_needed // len(GUIDE_SENTENCE.split()))):
+            words = GUIDE_SENTENCE.split()
+            rng.shuffle(words)  # Lignes toutes différentes : pas de quasi-doubles entre guides
+            writer.writerow([f"{line} Guide utilisateur : {' '.join(words)}"])
+    return path
+
+
+def run_guess(file_paths, provider: str, prefilter: bool) -> dict:
+    from guessstrategytool import GuessStrategyTool
+    from llmmetrics import get_metrics
+    metrics = get_metrics()
+    run_id = metrics.start_run(f"prefilter-{prefilter}-{time.time_ns()}")
+    tool = GuessStrategyTool(llm_provider=provider, incremental=False, prefilter=prefilter)
+    start = time.perf_counter()
+    selected = tool._run(file_paths, [FILE_INFO.format(name=os.path.basename(p)) for p in file_paths], PROJECT_SYNTHESIS)
+    elapsed = time.perf_counter() - start
+    total = metrics.summary(run_id)["total"]
+    return {"selected": set(selected), "wall_time_s": elapsed, "llm_calls": total["calls"],
+            "prompt_tokens": total["prompt_tokens"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-filtre local de pertinence : entraînement puis gain en appels.")
+    parser.add_argument("--project-files", type=int, default=3, help="Documents de projet par lot.")
+    parser.add_argument("--guide-files", type=int, default=3, help="Guides utilisateur par lot.")
+    parser.add_argument("--chunks", type=int, default=10, help="Morceaux par fichier.")
+    parser.add_argument("--provider", default="xai", choices=["xai", "openai"])
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(FakeLLMConfig(latency_s=args.latency)) as server, tempfile.TemporaryDirectory() as workdir:
+        for key in ("XAI", "OPENAI"):
+            os.environ[f"{key}_API_KEY"] = "fake-key"
+            os.environ[f"{key}_BASE_URL"] = server.base_url
+            os.environ[f"{key}_RPM"] = "100000"
+            os.environ[f"{key}_TPM"] = "100000000"
+        log_path = os.path.join(workdir, "chunk_decisions.jsonl")
+        model_path = os.path.join(workdir, "relevance_model.npz")
+        os.environ["DECISION_LOG_PATH"] = log_path
+        os.environ["RELEVANCE_MODEL_PATH"] = model_path
+
+        def batch(offset: int):
+            return ([write_input_file(workdir, offset + i, args.chunks) for i in range(args.project_files)]
+                    + [write_guide_file(workdir, offset + i, args.chunks) for i in range(args.guide_files)])
+
+        cwd = os.getcwd()
+        os.chdir(workdir)  # Les outils écrivent leurs sorties dans le répertoire courant
+        try:
+            # 1. Décisions journalisées sur un premier lot
+            run_guess(batch(0), args.provider, prefilter=False)
+            # 2. Entraînement et rapport de précision
+            from relevance_cli import main as relevance_main
+            start = time.perf_counter()
+            relevance_main(["train", log_path, "--output", model_path])
+            print(f"Entraînement (évaluation comprise) : {time.perf_counter() - start:.2f}s")
+            # 3. Nouveau lot, sans puis avec le pré-filtre (journal désactivé : mesure seule)
+            os.environ["DECISION_LOG_PATH"] = ""
+            files = batch(100)
+            baseline = run_guess(files, args.provider, prefilter=False)
+            filtered = run_guess(files, args.provider, prefilter=True)
+        finally:
+            os.chdir(cwd)
+
+    total_chunks = (args.project_files + args.guide_files) * args.chunks
+    print(f"Nouveau lot : {total_chunks} morceaux, dont {args.guide_files * args.chunks} de guides utilisateur.")
+    for label, result in (("sans pré-filtre", baseline), ("avec pré-filtre", filtered)):
+        print(f"{label:<16} temps={result['wall_time_s']:>6.2f}s appels={result['llm_calls']:<4} "
+              f"tokens prompt={result['prompt_tokens']:<7} morceaux retenus={len(result['selected'])}")
+    lost = baseline["selected"] - filtered["selected"]
+    print(f"Appels évités : {baseline['llm_calls'] - filtered['llm_calls']} ; morceaux retenus perdus : {len(lost)}"
+          f"{' ' + str(sorted(lost)) if lost else ''} ; ajoutés : {len(filtered['selected'] - baseline['selected'])}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark du cache de prompt sur les appels par morceau de WorkDraftingTool et GuessStrategyTool.
+
+Compare deux dispositions du même prompt, envoyées en streaming pour mesurer le temps au
+premier token (TTFT) :
+    - "monolithique" : un seul message utilisateur, données du morceau en tête puis
+      instructions (disposition d'origine : le préfixe change à chaque morceau) ;
+    - "prefixe_stable" : instructions en message système, identiques d'un appel à l'autre,
+      puis les données du morceau (build_chunk_messages des outils).
+
+Relève par morceau les tokens du prompt, la part servie depuis le cache
+(usage.prompt_tokens_details.cached_tokens), le TTFT et le coût estimé.
+
+Utilisation :
+    python benchmarks/bench_prompt_cache.py                                  # serveur local simulé
+    python benchmarks/bench_prompt_cache.py --chunks 20 --prefill-tokens-per-s 1500
+    python benchmarks/bench_prompt_cache.py --cache-min-tokens 256          # fournisseur à seuil de cache bas
+    python benchmarks/bench_prompt_cache.py --real --provider openai         # API réelle (clé requise)
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipelines import FILE_INFO, write_input_file  # noqa: E402
+from fake_openai_server import FakeLLMConfig, FakeOpenAIServer  # noqa: E402
+
+DRAFTING_SYNTHESIS = ("Plateforme de diffusion d'informations locales en temps réel, sans données personnelles, "
+                      "avec back-office de publication et notifications ciblées.")
+GUESS = "Fichier technique décrivant le pipeline de notifications."
+
+
+def build_messages(tool_key: str, layout: str, file_name: str, total_chunks: int, processed, chunk: dict):
+    if tool_key == "work":
+        from workdraftingtool import build_chunk_messages
+    else:
+        from guessstrategytool import build_chunk_messages
+    messages = build_chunk_messages(DRAFTING_SYNTHESIS, file_name, FILE_INFO.format(name=file_name),
+                                    total_chunks, processed, GUESS, chunk)
+    if layout == "monolithique":
+        system, user = messages[0]["content"], messages[1]["content"]
+        return [{"role": "user", "content": f"{user}\n\n{system}"}]
+    return messages
+
+
+def stream_call(client, model: str, messages, max_tokens: int) -> dict:
+    start = time.perf_counter()
+    ttft, usage = None, None
+    stream = client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens,
+                                            temperature=0.5, response_format={"type": "json_object"},
+                                            stream=True, stream_options={"include_usage": True})
+    for event in stream:
+        if ttft is None and event.choices and event.choices[0].delta.content:
+            ttft = time.perf_counter() - start
+        if getattr(event, "usage", None):
+            usage = event.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "ttft_s": ttft if ttft is not None else time.perf_counter() - start,
+        "total_s": time.perf_counter() - start,
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "cached_prompt_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+def bench_layout(client, model: str, tool_key: str, layout: str, chunks) -> dict:
+    from llmmetrics import estimate_cost, percentile
+
+    file_name = chunks[0]["source"]
+    calls = []
+    for index, chunk in enumerate(chunks):
+        processed = list(range(1, index + 1))
+        messages = build_messages(tool_key, layout, file_name, len(chunks), processed, chunk)
+        calls.append(stream_call(client, model, messages, 1000 if tool_key == "work" else 400))
+
+    n = len(calls)
+    prompt = sum(c["prompt_tokens"] for c in calls)
+    cached = sum(c["cached_prompt_tokens"] for c in calls)
+    ttfts = [c["ttft_s"] for c in calls]
+    cost = sum(estimate_cost(model, c["prompt_tokens"], c["completion_tokens"], c["cached_prompt_tokens"]) for c in calls)
+    return {
+        "tool": tool_key,
+        "layout": layout,
+        "chunks": n,
+        "prompt_tokens_per_chunk": round(prompt / n, 1),
+        "uncached_prompt_tokens_per_chunk": round((prompt - cached) / n, 1),
+        "cached_share": round(cached / prompt, 3) if prompt else 0.0,
+        "ttft_p50_s": round(percentile(ttfts, 50), 4),
+        "ttft_p95_s": round(percentile(ttfts, 95), 4),
+        "cost_usd": round(cost, 6),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure du cache de prompt (tokens, TTFT) par disposition du prompt.")
+    parser.add_argument("--tools", nargs="+", default=["work", "guess"], choices=["work", "guess"])
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=2000.0,
+                        help="Débit de prefill simulé des tokens hors cache.")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="Taille minimale d'un préfixe mis en cache (1024 chez OpenAI).")
+    parser.add_argument("--real", action="store_true", help="Utilise l'API réelle du fournisseur (XAI_API_KEY/OPENAI_API_KEY).")
+    parser.add_argument("--provider", default="openai", choices=["xai", "openai"])
+    parser.add_argument("--output", default=None, help="Fichier JSON où écrire les résultats.")
+    args = parser.parse_args()
+
+    from openai import OpenAI
+    from fileprocessingtool import FileProcessingTool
+    from llmclient import provider_credentials
+    from modelregistry import tier_model
+
+    model = tier_model(args.provider, "flagship")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_input_file(workdir, 0, args.chunks)
+        chunks = [c for c in FileProcessingTool()._run([path]) if "error" not in c]
+        for tool_key in args.tools:
+            for layout in ("monolithique", "prefixe_stable"):
+                if args.real:
+                    api_key, base_url = provider_credentials(args.provider)
+                    result = bench_layout(OpenAI(api_key=api_key, base_url=base_url), model, tool_key, layout, chunks)
+                else:
+                    # Un serveur neuf par disposition : cache de prompt vide au départ
+                    config = FakeLLMConfig(latency_s=args.latency, prefill_tokens_per_s=args.prefill_tokens_per_s,
+                                           cache_min_tokens=args.cache_min_tokens)
+                    with FakeOpenAIServer(config) as server:
+                        client = OpenAI(api_key="fake-key", base_url=server.base_url)
+                        result = bench_layout(client, model, tool_key, layout, chunks)
+                results.append(result)
+                print(f"{tool_key:<6} {layout:<15} prompt/morceau={result['prompt_tokens_per_chunk']:>8} "
+                      f"hors cache/morceau={result['uncached_prompt_tokens_per_chunk']:>8} "
+                      f"cache={result['cached_share']:>6.1%} TTFT p50={result['ttft_p50_s']}s "
+                      f"p95={result['ttft_p95_s']}s coût=${result['cost_usd']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
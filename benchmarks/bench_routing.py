@@ -0,0 +1,143 @@
+"""
+Benchmark du routage des modèles par tâche (modelregistry) : tout sur le modèle phare, puis
+synthèse succincte, guess, plan et pertinence des morceaux sur le modèle rapide.
+
+Pour chaque mode, le pipeline guess → direct (évaluation des morceaux puis rédaction des
+morceaux retenus) et l'outil work sont exécutés ; le script relève par mode le temps, les
+appels, les tokens et le coût estimé par modèle (llmmetrics), puis l'accord de sélection des
+morceaux retenus par GuessStrategyTool (Jaccard, précision et rappel du modèle rapide par
+rapport au modèle phare).
+
+Contre le serveur local, les modèles rapides sont simulés (--fast-latency-factor,
+--fast-flip-rate) : l'accord mesuré est celui que l'on a injecté. Avec --live, les outils
+appellent les vraies API (clés XAI_API_KEY / OPENAI_API_KEY) ; l'accord inclut alors la
+variabilité d'échantillonnage (temperature 0.5), à estimer en rejouant le mode phare.
+
+Utilisation :
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --files 3 --chunks 12 --latency 0.2 --fast-latency-factor 0.4 --fast-flip-rate 0.1
+    python benchmarks/bench_routing.py --live --provider openai --files 2 --chunks 5
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipelines import FILE_INFO, PROJECT_SYNTHESIS, write_input_file  # noqa: E402
+from fake_openai_server import FakeLLMConfig, FakeOpenAIServer  # noqa: E402
+
+MODES = (("phare", False), ("routé", True))
+
+
+def run_step(label: str, step):
+    """Exécute une étape dans un run llmmetrics dédié et retourne (résultat, mesures)."""
+    from llmmetrics import get_metrics
+    metrics = get_metrics()
+    run_id = metrics.start_run(f"{label}-{time.time_ns()}")
+    start = time.perf_counter()
+    result = step()
+    elapsed = time.perf_counter() - start
+    summary = metrics.summary(run_id)
+    return result, {
+        "wall_time_s": round(elapsed, 3),
+        "llm_calls": summary["total"]["calls"],
+        "prompt_tokens": summary["total"]["prompt_tokens"],
+        "completion_tokens": summary["total"]["completion_tokens"],
+        "cost_usd": summary["total"]["cost_usd"],
+        "by_model": {model: {key: stats[key] for key in ("calls", "prompt_tokens", "completion_tokens", "cost_usd")}
+                     for model, stats in summary["by_model"].items()},
+    }
+
+
+def bench_mode(routing: bool, file_paths, provider: str) -> dict:
+    from directdraftingtool import DirectDraftingTool
+    from guessstrategytool import GuessStrategyTool
+    from workdraftingtool import WorkDraftingTool
+
+    file_infos = [FILE_INFO.format(name=os.path.basename(p)) for p in file_paths]
+    guess = GuessStrategyTool(llm_provider=provider, incremental=False, model_routing=routing)
+    selected, guess_stats = run_step("guess", lambda: guess._run(file_paths, file_infos, PROJECT_SYNTHESIS))
+    direct = DirectDraftingTool(llm_provider=provider, model_routing=routing)
+    _, direct_stats = run_step("direct", lambda: direct._run(file_paths, file_infos, PROJECT_SYNTHESIS, selected))
+    work = WorkDraftingTool(llm_provider=provider, incremental=False, speculative=False, model_routing=routing)
+    _, work_stats = run_step("work", lambda: work._run(file_paths, file_infos, PROJECT_SYNTHESIS))
+    return {"selected": sorted(selected), "guess": guess_stats, "direct": direct_stats, "work": work_stats}
+
+
+def agreement(reference, candidate) -> dict:
+    """Accord de deux sélections de morceaux ; la référence est celle du modèle phare."""
+    reference, candidate = set(reference), set(candidate)
+    common = len(reference & candidate)
+    union = len(reference | candidate)
+    return {
+        "jaccard": round(common / union, 3) if union else 1.0,
+        "precision": round(common / len(candidate), 3) if candidate else 1.0,
+        "recall": round(common / len(reference), 3) if reference else 1.0,
+        "flagship_only": len(reference - candidate),
+        "fast_only": len(candidate - reference),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modèle phare partout contre routage par tâche.")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--chunks", type=int, default=10, help="Morceaux par fichier.")
+    parser.add_argument("--provider", default="xai", choices=["xai", "openai"])
+    parser.add_argument("--latency", type=float, default=0.1, help="Latence du modèle phare simulé (s).")
+    parser.add_argument("--fast-latency-factor", type=float, default=0.4)
+    parser.add_argument("--fast-flip-rate", type=float, default=0.1,
+                        help="Part des avis de pertinence inversés par le modèle rapide simulé.")
+    parser.add_argument("--live", action="store_true", help="Appelle les vraies API au lieu du serveur local.")
+    parser.add_argument("--output", default=None, help="Fichier JSON où écrire les résultats.")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(latency_s=args.latency, fast_latency_factor=args.fast_latency_factor,
+                           fast_flip_rate=args.fast_flip_rate)
+    results = {}
+    with (contextlib.nullcontext() if args.live else FakeOpenAIServer(config)) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        if server is not None:
+            for key in ("XAI", "OPENAI"):
+                os.environ[f"{key}_API_KEY"] = "fake-key"
+                os.environ[f"{key}_BASE_URL"] = server.base_url
+                # Quotas très larges : on mesure les modèles, pas le lissage des quotas
+                os.environ[f"{key}_RPM"] = "100000"
+                os.environ[f"{key}_TPM"] = "100000000"
+        file_paths = [write_input_file(workdir, i, args.chunks) for i in range(args.files)]
+        cwd = os.getcwd()
+        os.chdir(workdir)  # Les outils écrivent leurs sorties dans le répertoire courant
+        try:
+            for label, routing in MODES:
+                results[label] = bench_mode(routing, file_paths, args.provider)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'mode':<7} {'étape':<7} {'temps s':>8} {'appels':>7} {'tokens prompt':>14} {'tokens compl.':>14} {'coût $':>10}")
+    for label, _ in MODES:
+        for step in ("guess", "direct", "work"):
+            stats = results[label][step]
+            print(f"{label:<7} {step:<7} {stats['wall_time_s']:>8.2f} {stats['llm_calls']:>7} "
+                  f"{stats['prompt_tokens']:>14} {stats['completion_tokens']:>14} {stats['cost_usd']:>10.4f}")
+            for model, model_stats in sorted(stats["by_model"].items()):
+                print(f"{'':<16}{model:<26} {model_stats['calls']:>7} {model_stats['prompt_tokens']:>14} "
+                      f"{model_stats['completion_tokens']:>14} {model_stats['cost_usd']:>10.4f}")
+    accord = agreement(results["phare"]["selected"], results["routé"]["selected"])
+    results["agreement"] = accord
+    print(f"Sélection guess : {len(results['phare']['selected'])} morceau(x) (phare) contre "
+          f"{len(results['routé']['selected'])} (routé) ; Jaccard {accord['jaccard']:.0%}, précision "
+          f"{accord['precision']:.0%}, rappel {accord['recall']:.0%} ({accord['flagship_only']} retenu(s) par le "
+          f"seul modèle phare, {accord['fast_only']} par le seul modèle rapide).")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
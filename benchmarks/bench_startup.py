@@ -0,0 +1,118 @@
+"""
+Benchmark du temps de démarrage : mesure le temps d'import de chaque module.
+
+Chaque module est importé dans un interpréteur neuf (`python -X importtime`),
+ce qui donne un temps à froid comparable d'une exécution à l'autre. Le script
+compare ensuite chaque mesure au budget donné et sort en erreur s'il est dépassé.
+
+Utilisation :
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --budget-ms 300 --output startup.json
+    python benchmarks/bench_startup.py --modules streamlit_app fileprocessingtool
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules du dépôt puis dépendances lourdes qu'ils tirent
+DEFAULT_MODULES = [
+    "fileprocessingtool",
+    "synthesis_tool",
+    "searchtool",
+    "innovationanalysistool",
+    "marketstudytool",
+    "draftingtool",
+    "directdraftingtool",
+    "guessstrategytool",
+    "workdraftingtool",
+    "crewai.tools",
+    "openai",
+    "pandas",
+    "PyPDF2",
+    "docx",
+    "pptx",
+]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)")
+
+
+def measure_import(module: str, runs: int = 3) -> dict:
+    """
+    Importe un module dans un sous-processus et relève son temps d'import cumulé.
+
+    Args:
+        module (str): Nom du module à importer.
+        runs (int): Nombre d'exécutions ; la médiane est retenue.
+
+    Returns:
+        dict: Temps cumulé (ms), nombre de modules chargés et erreur éventuelle.
+    """
+    samples = []
+    loaded = 0
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "erreur inconnue"
+            return {"module": module, "cumulative_ms": None, "modules_loaded": 0, "error": last_line}
+
+        cumulative_us = None
+        loaded = 0
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            loaded += 1
+            # La ligne du module demandé, au niveau le plus haut, porte le cumul
+            if match.group(4) == module and not match.group(3):
+                cumulative_us = int(match.group(2))
+        if cumulative_us is not None:
+            samples.append(cumulative_us / 1000.0)
+
+    samples.sort()
+    median = samples[len(samples) // 2] if samples else None
+    return {"module": module, "cumulative_ms": median, "modules_loaded": loaded, "error": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps d'import par module (démarrage à froid).")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules à mesurer.")
+    parser.add_argument("--runs", type=int, default=3, help="Exécutions par module (médiane retenue).")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Budget maximal par module du dépôt, en ms.")
+    parser.add_argument("--output", default=None, help="Fichier JSON où écrire les résultats.")
+    args = parser.parse_args()
+
+    results = [measure_import(module, args.runs) for module in args.modules]
+
+    over_budget = []
+    print(f"{'module':<26}{'import (ms)':>14}{'modules':>10}")
+    for result in results:
+        if result["error"]:
+            print(f"{result['module']:<26}{'—':>14}{'—':>10}  ({result['error']})")
+            continue
+        print(f"{result['module']:<26}{result['cumulative_ms']:>14.1f}{result['modules_loaded']:>10}")
+        is_repo_module = os.path.exists(os.path.join(REPO_ROOT, f"{result['module']}.py"))
+        if args.budget_ms is not None and is_repo_module and result["cumulative_ms"] > args.budget_ms:
+            over_budget.append(result["module"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "budget_ms": args.budget_ms, "results": results}, f, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+    if over_budget:
+        print(f"Budget de {args.budget_ms} ms dépassé pour : {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Générateur de corpus synthétique pour les benchmarks d'ingestion.
+
+Produit des fichiers PDF, DOCX, XLSX, CSV et PPTX de tailles contrôlées (pages,
+paragraphes, lignes, diapositives) à partir d'un vocabulaire fixe et d'une graine :
+deux exécutions avec les mêmes paramètres donnent les mêmes fichiers.
+
+Utilisation :
+    python benchmarks/corpus_generator.py --output-dir corpus
+    python benchmarks/corpus_generator.py --output-dir corpus --formats pdf docx --buckets small large
+"""
+import argparse
+import csv
+import os
+import random
+
+VOCABULARY = (
+    "projet plateforme notification collectivite utilisateur module service donnees architecture "
+    "developpement prototype test performance integration interface mobile serveur base requete "
+    "algorithme modele evaluation mesure latence securite confidentialite diffusion message canal "
+    "configuration deploiement version analyse resultat difficulte solution approche methode "
+    "experimentation indicateur objectif verrou technique innovation fonctionnalite ecran backoffice"
+).split()
+
+# Paramètres par format et par tranche de taille
+SIZE_BUCKETS = {
+    "pdf": {"small": {"pages": 2}, "medium": {"pages": 20}, "large": {"pages": 120}},
+    "docx": {"small": {"paragraphs": 20}, "medium": {"paragraphs": 200}, "large": {"paragraphs": 1500}},
+    "xlsx": {"small": {"rows": 50}, "medium": {"rows": 1000}, "large": {"rows": 10000}},
+    "csv": {"small": {"rows": 50}, "medium": {"rows": 1000}, "large": {"rows": 20000}},
+    "pptx": {"small": {"slides": 5}, "medium": {"slides": 40}, "large": {"slides": 200}},
+}
+
+WORDS_PER_PAGE = 350
+WORDS_PER_PARAGRAPH = 60
+COLUMNS = 6
+WORDS_PER_SLIDE = 80
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def generate_pdf(path: str, pages: int, words_per_page: int = WORDS_PER_PAGE, seed: int = 0):
+    """
+    Écrit un PDF texte (police Helvetica standard) sans dépendance externe :
+    les objets et la table xref sont construits à la main.
+    """
+    rng = random.Random(seed)
+    objects = []  # Contenu de chaque objet, numérotés à partir de 1
+    page_ids = []
+    font_id = 3
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(None)  # Arbre des pages, rempli après coup
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for page_number in range(pages):
+        words = _words(rng, words_per_page).split()
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream_lines = ["BT", "/F1 10 Tf", "12 TL", "50 790 Td", f"(En-tete rapport - page {page_number + 1}) Tj", "T*"]
+        stream_lines.extend(f"({_pdf_escape(line)}) Tj T*" for line in lines)
+        stream_lines.append("ET")
+        stream = "\n".join(stream_lines).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>").encode())
+        page_ids.append(len(objects))
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def generate_docx(path: str, paragraphs: int, words_per_paragraph: int = WORDS_PER_PARAGRAPH, seed: int = 0):
+    import docx
+    rng = random.Random(seed)
+    document = docx.Document()
+    for index in range(paragraphs):
+        if index % 10 == 0:
+            document.add_heading(f"Section {index // 10 + 1} {_words(rng, 3)}", level=1)
+        document.add_paragraph(_words(rng, words_per_paragraph))
+    document.save(path)
+
+
+def generate_xlsx(path: str, rows: int, columns: int = COLUMNS, seed: int = 0):
+    import pandas as pd
+    rng = random.Random(seed)
+    data = [[_words(rng, 3) if c % 2 == 0 else rng.randint(0, 10_000) for c in range(columns)] for _ in range(rows)]
+    pd.DataFrame(data, columns=[f"colonne_{c}" for c in range(columns)]).to_excel(path, index=False)
+
+
+def generate_csv(path: str, rows: int, columns: int = COLUMNS, seed: int = 0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"colonne_{c}" for c in range(columns)])
+        for _ in range(rows):
+            writer.writerow([_words(rng, 3) if c % 2 == 0 else rng.randint(0, 10_000) for c in range(columns)])
+
+
+def generate_pptx(path: str, slides: int, words_per_slide: int = WORDS_PER_SLIDE, seed: int = 0):
+    from pptx import Presentation
+    rng = random.Random(seed)
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]  # Titre et contenu
+    for index in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Diapositive {index + 1} {_words(rng, 3)}"
+        slide.placeholders[1].text = _words(rng, words_per_slide)
+    presentation.save(path)
+
+
+GENERATORS = {
+    "pdf": generate_pdf,
+    "docx": generate_docx,
+    "xlsx": generate_xlsx,
+    "csv": generate_csv,
+    "pptx": generate_pptx,
+}
+
+
+def generate_corpus(output_dir: str, formats=None, buckets=None, seed: int = 0) -> list:
+    """
+    Génère un fichier par (format, tranche de taille).
+
+    Returns:
+        list: Dictionnaires {format, bucket, path, params}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    generated = []
+    for file_format in formats or list(GENERATORS):
+        for bucket in buckets or list(SIZE_BUCKETS[file_format]):
+            params = SIZE_BUCKETS[file_format][bucket]
+            path = os.path.join(output_dir, f"corpus_{bucket}.{file_format}")
+            GENERATORS[file_format](path, seed=seed, **params)
+            generated.append({"format": file_format, "bucket": bucket, "path": path, "params": params})
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un corpus synthétique de documents.")
+    parser.add_argument("--output-dir", default="corpus")
+    parser.add_argument("--formats", nargs="+", choices=list(GENERATORS), default=None)
+    parser.add_argument("--buckets", nargs="+", choices=["small", "medium", "large"], default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for item in generate_corpus(args.output_dir, args.formats, args.buckets, args.seed):
+        size_kb = os.path.getsize(item["path"]) / 1024
+        print(f"{item['format']:<5} {item['bucket']:<7} {size_kb:>10.1f} Ko  {item['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+Serveur local compatible OpenAI pour les benchmarks (aucun appel payant).
+
+Il répond à `POST /v1/chat/completions` et `POST /v1/responses` avec des réponses
+préparées au format attendu par chaque outil (lignes Travaux/Guess/Prochain morceau,
+Pertinent/Explication, texte libre pour les sections), en simulant :
+    - une latence fixe par requête (latency_s),
+    - un débit de génération (tokens_per_s) qui allonge les réponses longues,
+    - un taux d'erreur (error_rate) renvoyant des 429 ou 500,
+    - des blocages occasionnels (stall_rate, stall_latency_s) qui font la latence de queue,
+    - des réponses JSON invalides (invalid_json_rate) quand le mode JSON est demandé,
+    - le cache de prompt des fournisseurs : les préfixes déjà vus (par blocs de 128 tokens,
+      à partir de 1024) sont comptés dans usage.prompt_tokens_details.cached_tokens et
+      échappent au temps de prefill (prefill_tokens_per_s), qui allonge le temps au premier token,
+    - des modèles rapides (nom contenant "mini") plus rapides (fast_latency_factor) et en
+      désaccord avec le modèle phare sur une part des avis de pertinence (fast_flip_rate).
+    - un parcours qui suit le plan du fichier quand il est fourni : les sections de
+      documentation externe (titre contenant "guide utilisateur") sont sautées.
+
+Les réponses en streaming (stream=True) sont servies en SSE, avec l'usage en dernier
+événement si stream_options.include_usage est demandé.
+
+Utilisation autonome :
+    python benchmarks/fake_openai_server.py --port 8099 --latency 0.2 --tokens-per-s 80
+Puis : XAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_BASE_URL=http://127.0.0.1:8099/v1
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière : ~1,3 token par mot."""
+    return max(1, int(len(text.split()) * 1.3))
+
+
+class FakeLLMConfig:
+    def __init__(self, latency_s: float = 0.05, tokens_per_s: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0, skip_every: int = 0, stall_rate: float = 0.0, stall_latency_s: float = 2.0,
+                 invalid_json_rate: float = 0.0, prefill_tokens_per_s: float = 0.0,
+                 cache_min_tokens: int = 1024, cache_block_tokens: int = 128, fast_latency_factor: float = 1.0,
+                 fast_flip_rate: float = 0.0):
+        self.latency_s = latency_s
+        # Modèles rapides (nom contenant "mini") : latence multipliée par fast_latency_factor, et
+        # avis de pertinence inversé sur une part fast_flip_rate des morceaux (désaccord simulé)
+        self.fast_latency_factor = fast_latency_factor
+        self.fast_flip_rate = fast_flip_rate
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.cache_min_tokens = cache_min_tokens
+        self.cache_block_tokens = cache_block_tokens
+        self.prefix_cache = set()
+        self.invalid_json_rate = invalid_json_rate
+        self.stall_rate = stall_rate
+        self.stall_latency_s = stall_latency_s
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        # Si > 0, le parcours saute un morceau sur skip_every (simule un guess qui élague)
+        self.skip_every = skip_every
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+
+def _last_user_content(messages) -> str:
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content or ""
+    return ""
+
+
+def _all_content(messages) -> str:
+    parts = []
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+        elif content:
+            parts.append(content)
+    return "\n".join(parts)
+
+
+def cached_prefix_tokens(messages, config: FakeLLMConfig) -> int:
+    """
+    Simule le cache de prompt : tokens du plus long préfixe (par blocs) déjà vu dans une
+    requête précédente, 0 sous cache_min_tokens. Les blocs de la requête sont mémorisés.
+    """
+    words = " ".join(f"{m.get('role')}: {_all_content([m])}" for m in messages or []).split()
+    block_words = max(1, int(config.cache_block_tokens / 1.3))
+    digest = hashlib.sha1()
+    prefix_hashes = []
+    for start in range(0, len(words) - block_words + 1, block_words):
+        digest.update(" ".join(words[start:start + block_words]).encode("utf-8"))
+        prefix_hashes.append(digest.hexdigest())
+    with config.lock:
+        cached_blocks = 0
+        for prefix_hash in prefix_hashes:
+            if prefix_hash not in config.prefix_cache:
+                break
+            cached_blocks += 1
+        config.prefix_cache.update(prefix_hashes)
+    cached = int(cached_blocks * block_words * 1.3)
+    return cached if cached >= config.cache_min_tokens else 0
+
+
+def _traversal_position(prompt: str):
+    """Retrouve (morceau courant, total) dans un prompt de parcours."""
+    current = re.search(r"Morceau (\d+)\s*:", prompt)
+    total = re.search(r"(?:Nombre total de morceaux|total chunks)\s*:\s*(\d+)", prompt)
+    return (int(current.group(1)) if current else 1, int(total.group(1)) if total else 1)
+
+
+def is_fast_model(model: str) -> bool:
+    return "mini" in (model or "")
+
+
+# Morceaux de documentation externe (guides utilisateur) : toujours jugés non pertinents
+DOC_MARKER = "guide utilisateur"
+
+
+def _pertinent(prompt: str, current: int, model: str, config: FakeLLMConfig) -> str:
+    """Avis de pertinence d'un morceau : un sur trois non pertinent, ainsi que la documentation
+    externe, inversé pour une part déterministe (par fichier et morceau) des morceaux quand le
+    modèle est rapide."""
+    pertinent = current % 3 != 0 and DOC_MARKER not in _chunk_text(prompt).lower()
+    if is_fast_model(model) and config.fast_flip_rate > 0:
+        name = re.search(r"fichier '([^']*)'", prompt)
+        key = f"{name.group(1) if name else ''}#{current}".encode("utf-8")
+        if zlib.crc32(key) % 1000 < config.fast_flip_rate * 1000:
+            pertinent = not pertinent
+    return "oui" if pertinent else "non"
+
+
+def _chunk_text(prompt: str) -> str:
+    """Texte du morceau évalué (après 'Morceau N :'), sans le plan du fichier ni les consignes."""
+    current = re.search(r"Morceau \d+\s*:", prompt)
+    return prompt[current.end():] if current else prompt
+
+
+def _skipped_sections(prompt: str) -> List[Tuple[int, int]]:
+    """Intervalles de morceaux des sections de documentation externe listées dans le plan du fichier."""
+    plan = prompt.split("Plan du fichier (sections et morceaux) :", 1)
+    if len(plan) < 2:
+        return []
+    ranges = []
+    for line in plan[1].split("Voici le morceau", 1)[0].splitlines():
+        title, _, parts = line.rpartition(" : morceaux ")
+        if DOC_MARKER in title.lower():
+            for bounds in parts.split(", "):
+                first, _, last = bounds.partition("-")
+                if first.strip().isdigit():
+                    ranges.append((int(first), int(last or first)))
+    return ranges
+
+
+def _next_part(current: int, total: int, config: FakeLLMConfig, prompt: str = ""):
+    """Morceau suivant ; un plan du fichier permet de sauter les sections de documentation externe."""
+    step = 2 if config.skip_every and current % config.skip_every == 0 else 1
+    nxt = current + step
+    for first, last in sorted(_skipped_sections(prompt)):
+        if first <= nxt <= last:
+            nxt = last + 1
+    return nxt if nxt <= total else "fin"
+
+
+def canned_json_answer(messages, config: FakeLLMConfig, model: str = "") -> str:
+    """
+    Réponse en mode JSON (response_format json_object) pour les boucles de parcours.
+    Une proportion invalid_json_rate des réponses est tronquée, pour exercer la relance.
+    """
+    prompt = _all_content(messages)
+    current, total = _traversal_position(prompt)
+    if '"morceaux"' in prompt:
+        # Plan de parcours : les mêmes morceaux que le parcours adaptatif simulé
+        payload = {
+            "morceaux": [p for p in range(1, total + 1) if not (config.skip_every and p > 1 and (p - 1) % config.skip_every == 0)],
+            "guess": "Fichier majoritairement technique.",
+        }
+    elif '"pertinent"' in prompt:
+        pertinent = _pertinent(prompt, current, model, config)
+        payload = {
+            "pertinent": pertinent,
+            "explication": f"Le morceau {current} décrit {'des travaux réalisés' if pertinent == 'oui' else 'une documentation externe'}.",
+            "guess": "Fichier majoritairement technique.",
+            "prochain_morceau": _next_part(current, total, config, prompt),
+        }
+    else:
+        payload = {
+            "travaux": "pas rédigé" if DOC_MARKER in _chunk_text(prompt).lower() else (
+                f"Nous avons conçu et validé le module décrit dans le morceau {current}.\n\n"
+                f"Nous avons ensuite levé les difficultés d'intégration rencontrées avec l'existant."),
+            "guess": "Fichier pertinent, les morceaux suivants décrivent la suite des travaux.",
+            "prochain_morceau": _next_part(current, total, config, prompt),
+        }
+    answer = json.dumps(payload, ensure_ascii=False)
+    with config.lock:
+        invalid = config.random.random() < config.invalid_json_rate
+    return answer[: len(answer) // 2] if invalid else answer
+
+
+def canned_answer(messages, config: FakeLLMConfig, model: str = "") -> str:
+    """
+    Construit une réponse au format attendu par l'outil qui a produit le prompt.
+    """
+    prompt = _all_content(messages)
+    if "Prochain morceau" in prompt and "Travaux:" in prompt:
+        current, total = _traversal_position(prompt)
+        return (
+            f"Travaux: Nous avons conçu et validé le module décrit dans le morceau {current}, "
+            f"en levant les difficultés d'intégration rencontrées avec l'existant.\n"
+            f"Guess: Fichier pertinent, les morceaux suivants décrivent la suite des travaux.\n"
+            f"Prochain morceau: {_next_part(current, total, config, prompt)}"
+        )
+    if "Prochain morceau" in prompt and "Pertinent:" in prompt:
+        current, total = _traversal_position(prompt)
+        pertinent = _pertinent(prompt, current, model, config)
+        return (
+            f"Pertinent: {pertinent}\n"
+            f"Explication: Le morceau {current} décrit {'des travaux réalisés' if pertinent == 'oui' else 'une documentation externe'}.\n"
+            f"Guess: Fichier majoritairement technique.\n"
+            f"Prochain morceau: {_next_part(current, total, config, prompt)}"
+        )
+    if "version succincte" in prompt:
+        return "Projet de plateforme de diffusion d'informations locales, axé sur la personnalisation et la confidentialité."
+    if "estimez la pertinence" in prompt:
+        answer = "Fichier probablement pertinent : il décrit des fonctionnalités techniques développées dans le projet."
+        if "Pertinence : N/10" in prompt:
+            # Note déterministe par nom de fichier, pour exercer l'ordonnancement sous budget
+            name = re.search(r"nom du fichier : '([^']*)'", prompt)
+            answer += f"\nPertinence : {sum(map(ord, name.group(1) if name else '')) % 8 + 2}/10"
+        return answer
+    words = ("Nous avons développé une approche originale combinant plusieurs briques techniques "
+             "afin de répondre au besoin identifié, en surmontant des verrous de performance. ").split()
+    return " ".join(words * 6)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):  # Silencieux : les benchmarks mesurent, ils ne journalisent pas
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        config: FakeLLMConfig = self.server.config
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        with config.lock:
+            config.requests += 1
+            fail = config.random.random() < config.error_rate
+            stall = config.random.random() < config.stall_rate
+            status = config.random.choice([429, 500]) if fail else 200
+            if fail:
+                config.errors += 1
+
+        is_chat = self.path.rstrip("/").endswith("/chat/completions")
+        messages = request.get("messages", []) if is_chat else []
+        prompt_tokens = estimate_tokens(_all_content(messages)) if is_chat else 0
+        cached_tokens = cached_prefix_tokens(messages, config) if is_chat and not fail else 0
+        prefill_s = (prompt_tokens - cached_tokens) / config.prefill_tokens_per_s if config.prefill_tokens_per_s > 0 else 0.0
+
+        latency_s = config.latency_s * (config.fast_latency_factor if is_fast_model(request.get("model")) else 1.0)
+        time.sleep(latency_s + prefill_s + (config.stall_latency_s if stall else 0.0))
+        if fail:
+            self._send_json(status, {"error": {"message": "Erreur simulée", "type": "fake_error", "code": status}},
+                            headers={"Retry-After": "0"} if status == 429 else None)
+            return
+
+        if is_chat:
+            json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+            model = request.get("model", "")
+            answer = canned_json_answer(messages, config, model) if json_mode else canned_answer(messages, config, model)
+            completion_tokens = estimate_tokens(answer)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens,
+                     "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+            if request.get("stream"):
+                self._stream_chat(request, answer, usage)
+                return
+            self._simulate_generation(answer)
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake-model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": usage,
+            })
+        elif self.path.rstrip("/").endswith("/responses"):
+            query = request.get("input", "")
+            answer = f"Résultats simulés pour la recherche : {query[:80]}. Solution A, Solution B, Solution C."
+            self._simulate_generation(answer)
+            input_tokens = estimate_tokens(query if isinstance(query, str) else json.dumps(query))
+            output_tokens = estimate_tokens(answer)
+            self._send_json(200, {
+                "id": f"resp_{uuid.uuid4().hex[:12]}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": request.get("model", "fake-model"),
+                "status": "completed",
+                "output": [{"type": "message", "id": f"msg_{uuid.uuid4().hex[:12]}", "status": "completed",
+                            "role": "assistant",
+                            "content": [{"type": "output_text", "text": answer, "annotations": []}]}],
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                          "total_tokens": input_tokens + output_tokens},
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Route inconnue : {self.path}"}})
+
+    def _stream_chat(self, request: dict, answer: str, usage: dict):
+        """Réponse SSE : un événement par mot, au débit tokens_per_s, puis l'usage si demandé."""
+        config: FakeLLMConfig = self.server.config
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "fake-model")
+
+        def event(choices, extra=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": choices}
+            payload.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        words = answer.split(" ")
+        delay = 1.3 / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+        for index, word in enumerate(words):
+            text = word if index == 0 else f" {word}"
+            delta = {"role": "assistant", "content": text} if index == 0 else {"content": text}
+            event([{"index": 0, "delta": delta, "finish_reason": None}])
+            if delay:
+                time.sleep(delay)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], {"usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _simulate_generation(self, answer: str):
+        config: FakeLLMConfig = self.server.config
+        if config.tokens_per_s > 0:
+            time.sleep(estimate_tokens(answer) / config.tokens_per_s)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Un client qui abandonne sa requête (hedging, timeout) n'est pas une erreur du serveur
+        pass
+
+
+class FakeOpenAIServer:
+    """
+    Serveur lancé dans un thread, utilisable comme gestionnaire de contexte :
+
+        with FakeOpenAIServer(FakeLLMConfig(latency_s=0.1)) as server:
+            os.environ["XAI_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, config: FakeLLMConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeLLMConfig()
+        self.httpd = _QuietHTTPServer((host, port), FakeOpenAIHandler)
+        self.httpd.config = self.config
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local compatible OpenAI pour benchmarks.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latence fixe par requête (s).")
+    parser.add_argument("--tokens-per-s", type=float, default=0.0, help="Débit de génération simulé (0 = instantané).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 429/500.")
+    parser.add_argument("--skip-every", type=int, default=0, help="Saute un morceau tous les N morceaux.")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Proportion de requêtes bloquées.")
+    parser.add_argument("--stall-latency", type=float, default=2.0, help="Durée d'un blocage (s).")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="Proportion de réponses JSON tronquées.")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=0.0,
+                        help="Débit de prefill des tokens hors cache (0 = instantané).")
+    parser.add_argument("--fast-latency-factor", type=float, default=1.0, help="Latence des modèles rapides (facteur).")
+    parser.add_argument("--fast-flip-rate", type=float, default=0.0,
+                        help="Part des avis de pertinence inversés par les modèles rapides.")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(FakeLLMConfig(args.latency, args.tokens_per_s, args.error_rate, skip_every=args.skip_every,
+                                            stall_rate=args.stall_rate, stall_latency_s=args.stall_latency,
+                                            invalid_json_rate=args.invalid_json_rate,
+                                            prefill_tokens_per_s=args.prefill_tokens_per_s,
+                                            fast_latency_factor=args.fast_latency_factor,
+                                            fast_flip_rate=args.fast_flip_rate),
+                              port=args.port)
+    print(f"Serveur prêt sur {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
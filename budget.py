@@ -0,0 +1,123 @@
+import os
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from llmmetrics import get_metrics
+from llmscheduler import estimate_request_tokens
+
+# Budget global d'un outil (appels LLM, tokens, temps) : les fichiers les plus pertinents
+# d'après leur guess initial passent en premier, les morceaux de priorité 'Basse' sont
+# différés en fin de parcours, et l'outil s'arrête proprement quand le budget est épuisé.
+
+# Consigne ajoutée au prompt du guess initial pour obtenir une note exploitable
+RELEVANCE_INSTRUCTION = "Terminez par une ligne 'Pertinence : N/10' (0 = sans rapport avec le projet, 10 = central)."
+DEFAULT_RELEVANCE = 5.0
+
+_SCORE_RE = re.compile(r"pertinence\s*:?\s*(\d+(?:[.,]\d+)?)\s*/\s*10", re.IGNORECASE)
+_SCORE_LINE_RE = re.compile(r"\n?\s*\**pertinence\s*:?\s*\d+(?:[.,]\d+)?\s*/\s*10\**\s*\.?\s*$", re.IGNORECASE)
+# Repli quand le LLM ne donne pas de note : indices lexicaux du guess
+_LOW_HINTS = ("non pertinent", "peu pertinent", "pas pertinent", "aucun lien", "sans rapport", "hors sujet")
+_HIGH_HINTS = ("très pertinent", "hautement pertinent", "directement lié", "essentiel", "central")
+
+
+def relevance_score(guess: str) -> float:
+    """
+    Note de pertinence (0 à 10) d'un guess initial : la note 'Pertinence : N/10' si le LLM
+    l'a donnée, sinon une estimation par mots-clés, sinon DEFAULT_RELEVANCE.
+    """
+    match = _SCORE_RE.search(guess or "")
+    if match:
+        return max(0.0, min(10.0, float(match.group(1).replace(",", "."))))
+    lowered = (guess or "").lower()
+    if any(hint in lowered for hint in _LOW_HINTS):
+        return 2.0
+    if any(hint in lowered for hint in _HIGH_HINTS):
+        return 8.0
+    return DEFAULT_RELEVANCE
+
+
+def strip_relevance_line(guess: str) -> str:
+    """Guess sans sa ligne de note finale (la note sert à l'ordonnancement, pas au prompt)."""
+    return _SCORE_LINE_RE.sub("", guess or "").strip()
+
+
+def _env_number(name: str, cast):
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+
+class RunBudget:
+    """
+    Budget d'une exécution d'outil, mesuré sur les appels enregistrés par llmmetrics avec son
+    scope : l'outil passe scope=budget.scope à chaque appel, et deux exécutions simultanées
+    (sessions, workers) ne comptent pas les appels l'une de l'autre. Sans limite (toutes à
+    None), le budget est inactif : allows() est toujours vrai et l'ordre des fichiers est conservé.
+
+    Limites par défaut lues dans BUDGET_MAX_CALLS, BUDGET_MAX_TOKENS et BUDGET_MAX_SECONDS.
+    """
+
+    def __init__(self, tool: str, max_calls: Optional[int] = None, max_tokens: Optional[int] = None,
+                 max_seconds: Optional[float] = None):
+        self.tool = tool
+        self.max_calls = max_calls if max_calls is not None else _env_number("BUDGET_MAX_CALLS", int)
+        self.max_tokens = max_tokens if max_tokens is not None else _env_number("BUDGET_MAX_TOKENS", int)
+        self.max_seconds = max_seconds if max_seconds is not None else _env_number("BUDGET_MAX_SECONDS", float)
+        self.started_at = time.time()
+        self.scope = f"{tool}-{uuid.uuid4().hex[:12]}"
+        self._start = time.monotonic()
+        self.exhausted_reason: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return any(limit is not None for limit in (self.max_calls, self.max_tokens, self.max_seconds))
+
+    def spent(self) -> dict:
+        """Consommation depuis le début : appels, tokens, secondes, latence moyenne d'un appel."""
+        records = get_metrics().records(scope=self.scope)
+        return {
+            "calls": len(records),
+            "tokens": sum(r.prompt_tokens + r.completion_tokens for r in records),
+            "seconds": time.monotonic() - self._start,
+            "mean_call_s": sum(r.wall_time_s for r in records) / len(records) if records else 0.0,
+        }
+
+    def allows(self, messages: List[dict] = None, max_tokens: int = 0, pending_calls: int = 0,
+               pending_tokens: int = 0) -> bool:
+        """
+        Vrai si un appel de plus (estimé à partir de ses messages et de max_tokens) tient dans
+        le budget. Au premier refus, la raison est conservée dans exhausted_reason.
+
+        Args:
+            pending_calls, pending_tokens: Appels lancés en parallèle et pas encore enregistrés
+                par llmmetrics, avec leur estimation de tokens, comptés comme déjà dépensés.
+        """
+        if not self.active:
+            return True
+        if self.exhausted_reason:
+            return False
+        spent = self.spent()
+        calls = spent["calls"] + pending_calls
+        tokens = spent["tokens"] + pending_tokens
+        if self.max_calls is not None and calls + 1 > self.max_calls:
+            self.exhausted_reason = f"{calls}/{self.max_calls} appels"
+        elif self.max_tokens is not None and tokens + estimate_request_tokens(messages, max_tokens) > self.max_tokens:
+            self.exhausted_reason = f"{tokens}/{self.max_tokens} tokens"
+        elif self.max_seconds is not None and spent["seconds"] + spent["mean_call_s"] > self.max_seconds:
+            self.exhausted_reason = f"{spent['seconds']:.1f}/{self.max_seconds:g} s"
+        return self.exhausted_reason is None
+
+    def rank(self, file_names: List[str], scores: Dict[str, float]) -> List[str]:
+        """Fichiers du plus pertinent au moins pertinent (ordre d'origine si le budget est inactif)."""
+        if not self.active:
+            return list(file_names)
+        return sorted(file_names, key=lambda name: -scores.get(name, DEFAULT_RELEVANCE))
+
+    def summary(self) -> str:
+        spent = self.spent()
+        limits = ", ".join(f"{label} ≤ {value:g}" for label, value in (
+            ("appels", self.max_calls), ("tokens", self.max_tokens), ("s", self.max_seconds)) if value is not None)
+        status = f"épuisé ({self.exhausted_reason})" if self.exhausted_reason else "respecté"
+        return (f"Budget {status} [{limits}] : {spent['calls']} appel(s), {spent['tokens']} tokens, "
+                f"{spent['seconds']:.1f} s.")
@@ -0,0 +1,77 @@
+from typing import List, Literal, Union
+from pydantic import BaseModel, Field, field_validator
+
+# Réponses structurées (mode JSON) des boucles de parcours des morceaux de
+# WorkDraftingTool et GuessStrategyTool. Le nombre total de morceaux du fichier est
+# passé dans le contexte de validation : model_validate_json(texte, context={"total_chunks": n}).
+
+
+class ChunkTraversalDecision(BaseModel):
+    guess: str = Field(description="Nouveau guess sur le fichier")
+    prochain_morceau: Union[int, Literal["fin"]] = Field(description="Numéro du prochain morceau ou 'fin'")
+
+    @field_validator("prochain_morceau", mode="before")
+    @classmethod
+    def _normalize_next_part(cls, value):
+        if isinstance(value, str):
+            value = value.strip().strip("'\"").lower()
+            return int(value) if value.isdigit() else value
+        return value
+
+    @field_validator("prochain_morceau")
+    @classmethod
+    def _check_next_part_range(cls, value, info):
+        total_chunks = (info.context or {}).get("total_chunks")
+        if isinstance(value, int) and total_chunks and not 1 <= value <= total_chunks:
+            raise ValueError(f"doit être un numéro entre 1 et {total_chunks} ou 'fin'")
+        return value
+
+
+class WorkChunkDecision(ChunkTraversalDecision):
+    travaux: str = Field(description="Travaux rédigés (plusieurs paragraphes possibles) ou 'pas rédigé'")
+
+
+class GuessChunkDecision(ChunkTraversalDecision):
+    pertinent: Literal["oui", "non"] = Field(description="Le morceau décrit-il des travaux réalisés ?")
+    explication: str = Field(default="", description="Raison de la décision (max 40 mots)")
+
+    @field_validator("pertinent", mode="before")
+    @classmethod
+    def _normalize_pertinent(cls, value):
+        if isinstance(value, bool):
+            return "oui" if value else "non"
+        return value.strip().lower() if isinstance(value, str) else value
+
+
+class TraversalPlan(BaseModel):
+    """Plan de parcours d'un fichier (mode plan) : morceaux à traiter, choisis sur la table des matières."""
+    morceaux: List[int] = Field(description="Numéros des morceaux à traiter")
+    guess: str = Field(default="", description="Guess sur le fichier au vu de la table des matières")
+
+    @field_validator("morceaux", mode="before")
+    @classmethod
+    def _normalize_parts(cls, value):
+        if isinstance(value, (int, str)):
+            value = [value]
+        return [int(v) if isinstance(v, str) and v.strip().isdigit() else v for v in value]
+
+    @field_validator("morceaux")
+    @classmethod
+    def _check_parts(cls, value, info):
+        # Numéros hors limites écartés plutôt que rejetés : le reste du plan reste exploitable
+        total_chunks = (info.context or {}).get("total_chunks")
+        return sorted({v for v in value if not total_chunks or 1 <= v <= total_chunks})
+
+
+# Consignes de format ajoutées aux prompts (les clés doivent correspondre aux modèles ci-dessus)
+WORK_JSON_FORMAT = (
+    '{"travaux": "texte rédigé ou \'pas rédigé\'", "guess": "nouveau guess", '
+    '"prochain_morceau": numéro ou "fin"}'
+)
+GUESS_JSON_FORMAT = (
+    '{"pertinent": "oui" ou "non", "explication": "raison de la décision (max 40 mots)", '
+    '"guess": "nouveau guess (max 80 mots)", "prochain_morceau": numéro ou "fin"}'
+)
+PLAN_JSON_FORMAT = (
+    '{"morceaux": [numéros des morceaux à traiter], "guess": "guess sur le fichier (max 80 mots)"}'
+)
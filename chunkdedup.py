@@ -0,0 +1,129 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Détection des morceaux quasi identiques entre fichiers (révisions successives d'un même
+# document) par MinHash + LSH : les outils sautent un morceau dont le double a déjà été
+# traité, au lieu de payer deux fois le même contenu.
+
+# Seuil de similarité (Jaccard estimé sur les shingles de mots) ; 0 désactive la détection
+DEFAULT_THRESHOLD = float(os.getenv("CHUNK_DEDUP_THRESHOLD", 0.8))
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+ChunkKey = Tuple[str, int]
+
+
+class MinHasher:
+    """
+    Signatures MinHash de num_perm valeurs sur les shingles de shingle_size mots.
+    Les permutations (a·x + b) mod p sont tirées d'une graine fixe : signatures reproductibles.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        hashes = {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) % _MERSENNE_PRIME
+                  for i in range(max(1, len(words) - size + 1))}
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self.shingles(text)
+        # (num_perm, n_shingles) : produits < 2^62, sans débordement en uint64
+        permuted = (np.outer(self._a, shingles) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+
+class ChunkDeduplicator:
+    """
+    Index LSH (bands × rows = num_perm) : un morceau est comparé aux seuls morceaux qui
+    partagent au moins une bande de signature, puis retenu comme double si la similarité
+    estimée (part des valeurs MinHash égales) atteint le seuil.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self._signatures: Dict[ChunkKey, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[ChunkKey]] = {}
+
+    def add(self, key: ChunkKey, text: str) -> Optional[ChunkKey]:
+        """
+        Indexe un morceau et retourne le morceau d'un autre fichier, indexé plus tôt, dont il est
+        le quasi-double (le plus similaire), ou None.
+        """
+        signature = self.hasher.signature(text)
+        band_keys = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        candidates = {other for band_key in band_keys for other in self._buckets.get(band_key, []) if other[0] != key[0]}
+        best, best_similarity = None, self.threshold
+        for other in sorted(candidates):
+            similarity = float(np.mean(self._signatures[other] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = other, similarity
+        self._signatures[key] = signature
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(key)
+        return best
+
+
+def find_duplicates(store, sources: List[str], threshold: float = DEFAULT_THRESHOLD) -> Dict[ChunkKey, ChunkKey]:
+    """
+    Parcourt les morceaux d'un ChunkStore, fichier par fichier dans l'ordre de `sources`,
+    et associe chaque quasi-double au premier morceau équivalent rencontré.
+
+    Returns:
+        dict: {(fichier, part_id) du double: (fichier, part_id) du morceau d'origine}.
+    """
+    if not threshold:
+        return {}
+    deduplicator = ChunkDeduplicator(threshold)
+    duplicates = {}
+    for source in sources:
+        for chunk in store.iter_chunks(source):
+            key = (source, chunk["part_id"])
+            original = deduplicator.add(key, chunk["text"] or "")
+            if original is not None:
+                duplicates[key] = duplicates.get(original, original)
+    return duplicates
+
+
+class DedupReport:
+    """Bilan des appels évités grâce aux doubles, à journaliser en fin d'outil."""
+
+    def __init__(self, duplicates: Dict[ChunkKey, ChunkKey]):
+        self.duplicates = duplicates
+        self.skipped: List[Tuple[ChunkKey, ChunkKey]] = []
+
+    def skip(self, key: ChunkKey) -> bool:
+        """Enregistre l'appel évité pour `key` ; retourne False si `key` n'est pas un double."""
+        if key not in self.duplicates:
+            return False
+        self.skipped.append((key, self.duplicates[key]))
+        return True
+
+    def as_dict(self) -> dict:
+        return {
+            "near_duplicates": len(self.duplicates),
+            "calls_saved": len(self.skipped),
+            "skipped": [{"chunk": f"{k[0]}#{k[1]}", "original": f"{o[0]}#{o[1]}"} for k, o in self.skipped],
+        }
+
+    def summary(self) -> str:
+        return (f"Doublons : {len(self.duplicates)} morceau(x) quasi identique(s) entre fichiers, "
+                f"{len(self.skipped)} appel(s) LLM évité(s).")
@@ -0,0 +1,167 @@
+import re
+from typing import List
+
+import numpy as np
+
+# Aperçus locaux des morceaux (sans LLM, sur CPU) : mots-clés TF-IDF et phrases clés choisies
+# par TextRank. Ils remplacent les 700 mots bruts d'un morceau dans les prompts compacts (table
+# des matières du mode plan, évaluations par lot) et sont enregistrés avec les morceaux.
+
+KEYWORDS = 6
+KEY_SENTENCES = 2
+MAX_SENTENCE_WORDS = 40
+DAMPING = 0.85
+# Morceaux traités ensemble par TextRank (matrice de similarité des phrases du lot)
+BATCH_CHUNKS = 64
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+STOPWORDS = frozenset("""
+    les des une est sont pour par avec dans sur aux ces cette ses son sa leur leurs qui que quoi dont
+    pas plus moins tout tous toute toutes comme mais donc car ainsi aussi bien très peu sans sous
+    entre vers chez elle elles ils nous vous été être avoir fait faire peut doit sont ont avait
+    était lors afin alors après avant encore déjà même autre autres chaque notre nos votre vos
+    cet celui celle ceux celles dont ici the and for with that this from are was were have has
+    not but all can will its their which when what into also been than then them these those
+""".split())
+
+
+def _tokens(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+def _new_text(chunk: dict) -> str:
+    """Texte propre au morceau : sans le recouvrement avec le morceau précédent."""
+    words = (chunk.get("text") or "").split()
+    overlap = chunk.get("overlap_words", 0) or 0
+    return " ".join(words[overlap:] if len(words) > overlap else words)
+
+
+def _sentences(text: str) -> List[str]:
+    sentences = []
+    for sentence in _SENTENCE_RE.split(text):
+        words = sentence.split()
+        if len(words) >= 4:
+            sentences.append(" ".join(words[:MAX_SENTENCE_WORDS]) + ("…" if len(words) > MAX_SENTENCE_WORDS else ""))
+    return sentences
+
+
+def _textrank(similarity: np.ndarray, iterations: int = 30) -> np.ndarray:
+    """Scores TextRank (PageRank pondéré) de chaque ligne d'une matrice de similarité bloc-diagonale."""
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weight, out=np.zeros_like(similarity), where=out_weight > 0)
+    scores = np.ones(len(similarity), dtype=np.float32)
+    for _ in range(iterations):
+        scores = (1 - DAMPING) + DAMPING * (transition.T @ scores)
+    return scores
+
+
+def digest_chunks(chunks: List[dict], keywords: int = KEYWORDS, sentences: int = KEY_SENTENCES) -> List[dict]:
+    """
+    Aperçus des morceaux d'un fichier : TF-IDF calculé sur l'ensemble des morceaux du fichier
+    (un morceau = un document), phrases clés par TextRank sur les phrases de chaque morceau.
+
+    Args:
+        chunks (list): Morceaux d'un même fichier (sortie de FileProcessingTool), texte compris.
+        keywords (int): Nombre de mots-clés par morceau.
+        sentences (int): Nombre de phrases clés par morceau, dans l'ordre du texte.
+
+    Returns:
+        list: Un dictionnaire {source, part_id, keywords, summary} par morceau, dans l'ordre reçu.
+    """
+    chunks = [c for c in chunks if "error" not in c]
+    if not chunks:
+        return []
+    texts = [_new_text(c) for c in chunks]
+
+    # TF-IDF creux : couples (morceau, terme) uniques et leurs occurrences, sans matrice dense
+    doc_tokens = [_tokens(t) for t in texts]
+    all_tokens = [w for tokens in doc_tokens for w in tokens]
+    vocabulary, term_ids = np.unique(np.array(all_tokens, dtype=object), return_inverse=True) if all_tokens \
+        else (np.array([], dtype=object), np.array([], dtype=np.int64))
+    doc_ids = np.repeat(np.arange(len(chunks)), [len(tokens) for tokens in doc_tokens])
+    pairs, counts = np.unique(doc_ids * max(len(vocabulary), 1) + term_ids, return_counts=True)
+    pair_docs, pair_terms = np.divmod(pairs, max(len(vocabulary), 1))
+    idf = np.log((1 + len(chunks)) / (1 + np.bincount(pair_terms, minlength=len(vocabulary)))) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[pair_terms]
+    # Mots-clés : meilleurs poids par morceau (tri par morceau puis poids décroissant)
+    order = np.lexsort((-weights, pair_docs))
+    starts = np.searchsorted(pair_docs[order], np.arange(len(chunks)))
+    ends = np.searchsorted(pair_docs[order], np.arange(len(chunks)), side="right")
+    top_terms = [vocabulary[pair_terms[order[s:min(e, s + keywords)]]].tolist() for s, e in zip(starts, ends)]
+
+    # Phrases clés : TextRank par lot de morceaux, similarité cosinus des vecteurs TF-IDF des phrases
+    summaries = []
+    term_index = {term: i for i, term in enumerate(vocabulary.tolist())}
+    for batch_start in range(0, len(chunks), BATCH_CHUNKS):
+        batch = range(batch_start, min(batch_start + BATCH_CHUNKS, len(chunks)))
+        chunk_sentences = [_sentences(texts[i]) for i in batch]
+        owners = np.repeat(np.arange(len(chunk_sentences)), [len(s) for s in chunk_sentences])
+        flat = [s for group in chunk_sentences for s in group]
+        if not flat:
+            summaries.extend(" ".join(texts[i].split()[:MAX_SENTENCE_WORDS]) for i in batch)
+            continue
+        rows, cols = [], []
+        for row, sentence in enumerate(flat):
+            ids = [term_index[w] for w in _tokens(sentence) if w in term_index]
+            rows.extend([row] * len(ids))
+            cols.extend(ids)
+        batch_terms, local_cols = np.unique(np.array(cols, dtype=np.int64), return_inverse=True)
+        matrix = np.zeros((len(flat), max(len(batch_terms), 1)), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.int64), local_cols), 1.0)
+        matrix = np.log1p(matrix) * (idf[batch_terms] if len(batch_terms) else 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+        # Similarités limitées aux phrases d'un même morceau (matrice bloc-diagonale)
+        similarity = (matrix @ matrix.T) * (owners[:, None] == owners[None, :])
+        scores = _textrank(similarity)
+        for local, group in enumerate(chunk_sentences):
+            if not group:
+                summaries.append(" ".join(texts[batch_start + local].split()[:MAX_SENTENCE_WORDS]))
+                continue
+            indices = np.flatnonzero(owners == local)
+            best = np.sort(indices[np.argsort(-scores[indices], kind="stable")[:sentences]])
+            summaries.append(" ".join(flat[i] for i in best))
+
+    return [{"source": chunk["source"], "part_id": chunk["part_id"], "keywords": terms, "summary": summary}
+            for chunk, terms, summary in zip(chunks, top_terms, summaries)]
+
+
+def table_of_contents(chunk_store, source: str, summary: bool = True) -> str:
+    """
+    Table des matières compacte d'un fichier : une ligne par morceau avec sa taille, sa
+    priorité, ses mots-clés et ses phrases clés (aperçus du magasin, sinon premiers mots).
+    Si le document a un plan (documentoutline), chaque titre précède le morceau qui ouvre sa
+    section, avec tous les morceaux de la section : une section entière peut être écartée.
+
+    Args:
+        chunk_store: Magasin des morceaux (ChunkStore).
+        source (str): Nom du fichier.
+        summary (bool): Inclure les phrases clés (sinon mots-clés seuls, plus compact).
+
+    Returns:
+        str: Une ligne par morceau, par part_id croissant.
+    """
+    from documentoutline import part_ranges, visible_entries
+    digests = chunk_store.digests(source)
+    headings_by_part = {}
+    for entry in visible_entries(chunk_store.outline(source)):
+        headings_by_part.setdefault(entry["part_ids"][0], []).append(entry)
+    lines = []
+    for meta in chunk_store.metadata(source):
+        for entry in headings_by_part.get(meta["part_id"], []):
+            lines.append(f"{'#' * entry['level']} {entry['title']} (morceaux {part_ranges(entry['part_ids'])})")
+        size = (meta.get("end_word") or 0) - (meta.get("start_word") or 0)
+        priority = ", priorité basse" if meta.get("priority") == "Basse" else ""
+        digest = digests.get(meta["part_id"])
+        if digest is None:
+            chunk = chunk_store.get(source, meta["part_id"])
+            content = " ".join(_new_text(chunk).split()[:24]) or "vide"
+        else:
+            content = f"[{', '.join(digest['keywords'])}]"
+            if summary and digest["summary"]:
+                content += f" {digest['summary']}"
+        lines.append(f"Morceau {meta['part_id']} ({size} mots{priority}) : {content}")
+    return "\n".join(lines)
+
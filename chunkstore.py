@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+from typing import Dict, Iterator, List, Optional
+
+# Magasin de morceaux sur disque (SQLite) : les outils y écrivent les morceaux au fil du
+# découpage puis les relisent un par un. Seuls les morceaux en cours de traitement sont en
+# mémoire, quel que soit le nombre ou la taille des fichiers du projet.
+
+CHUNK_COLUMNS = ("source", "part_id", "priority", "start_word", "end_word", "overlap_words", "token_count")
+
+
+def _remove_file(path: str):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+
+class ChunkStore:
+    """
+    Morceaux indexés par (source, part_id) : clé primaire SQLite, accès direct sans parcours.
+
+    Les métadonnées (priorité, positions, tokens) se lisent sans le texte ; le texte n'est
+    chargé que par get() ou text(). Sans chemin, la base est un fichier temporaire supprimé
+    à la fermeture (ou à la libération de l'objet).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._temporary = path is None
+        if self._temporary:
+            handle, path = tempfile.mkstemp(prefix="chunks_", suffix=".sqlite")
+            os.close(handle)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF" if self._temporary else "PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " source TEXT NOT NULL, part_id INTEGER NOT NULL, priority TEXT,"
+            " start_word INTEGER, end_word INTEGER, overlap_words INTEGER, token_count INTEGER,"
+            " text TEXT NOT NULL, PRIMARY KEY (source, part_id)) WITHOUT ROWID"
+        )
+        # Aperçus des morceaux (chunkdigest) : mots-clés séparés par des virgules, phrases clés
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            " source TEXT NOT NULL, part_id INTEGER NOT NULL, keywords TEXT NOT NULL, summary TEXT NOT NULL,"
+            " PRIMARY KEY (source, part_id)) WITHOUT ROWID"
+        )
+        # Plan des fichiers (documentoutline) : titres dans l'ordre du document et leurs part_id
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outline ("
+            " source TEXT NOT NULL, rank INTEGER NOT NULL, position INTEGER, level INTEGER NOT NULL,"
+            " title TEXT NOT NULL, part_ids TEXT NOT NULL, PRIMARY KEY (source, rank)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._finalizer = weakref.finalize(self, ChunkStore._cleanup, self._conn, path, self._temporary)
+
+    @staticmethod
+    def _cleanup(conn, path: str, temporary: bool):
+        conn.close()
+        if temporary:
+            _remove_file(path)
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_chunks(self, chunks: List[dict]):
+        """Enregistre (ou remplace) des morceaux produits par FileProcessingTool."""
+        rows = [tuple(chunk.get(column) for column in CHUNK_COLUMNS) + (chunk.get("text") or "",)
+                for chunk in chunks if "error" not in chunk]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO chunks ({', '.join(CHUNK_COLUMNS)}, text) "
+                f"VALUES ({', '.join('?' * (len(CHUNK_COLUMNS) + 1))})", rows)
+            self._conn.commit()
+
+    def add_digests(self, digests: List[dict]):
+        """Enregistre (ou remplace) des aperçus produits par chunkdigest.digest_chunks."""
+        rows = [(d["source"], d["part_id"], ",".join(d["keywords"]), d["summary"]) for d in digests]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO digests (source, part_id, keywords, summary) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def digests(self, source: str) -> Dict[int, dict]:
+        """Aperçus des morceaux d'un fichier par part_id : {keywords, summary} (vide s'ils n'ont pas été calculés)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT part_id, keywords, summary FROM digests WHERE source = ?",
+                                      (source,)).fetchall()
+        return {part_id: {"keywords": keywords.split(",") if keywords else [], "summary": summary}
+                for part_id, keywords, summary in rows}
+
+    def add_outline(self, source: str, entries: List[dict]):
+        """Enregistre (ou remplace) le plan d'un fichier produit par documentoutline.outline_entries."""
+        rows = [(source, rank, e.get("position"), e["level"], e["title"], json.dumps(e["part_ids"]))
+                for rank, e in enumerate(entries)]
+        with self._lock:
+            self._conn.execute("DELETE FROM outline WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT INTO outline (source, rank, position, level, title, part_ids) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def outline(self, source: str) -> List[dict]:
+        """Plan d'un fichier : {position, level, title, part_ids} dans l'ordre du document (vide sans titres)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, level, title, part_ids FROM outline WHERE source = ? ORDER BY rank",
+                (source,)).fetchall()
+        return [{"position": position, "level": level, "title": title, "part_ids": json.loads(part_ids)}
+                for position, level, title, part_ids in rows]
+
+    def delete_source(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM digests WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM outline WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def get(self, source: str, part_id: int) -> Optional[dict]:
+        """Morceau complet (texte compris), ou None s'il n'existe pas."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(CHUNK_COLUMNS)}, text FROM chunks WHERE source = ? AND part_id = ?",
+                (source, part_id)).fetchone()
+        if row is None:
+            return None
+        chunk = dict(zip(CHUNK_COLUMNS, row[:-1]))
+        chunk["text"] = row[-1]
+        return chunk
+
+    def text(self, source: str, part_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM chunks WHERE source = ? AND part_id = ?",
+                                     (source, part_id)).fetchone()
+        return row[0] if row else None
+
+    def metadata(self, source: str) -> List[dict]:
+        """Métadonnées des morceaux d'un fichier, par part_id croissant, sans leur texte."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(CHUNK_COLUMNS)} FROM chunks WHERE source = ? ORDER BY part_id",
+                (source,)).fetchall()
+        return [dict(zip(CHUNK_COLUMNS, row)) for row in rows]
+
+    def iter_chunks(self, source: Optional[str] = None) -> Iterator[dict]:
+        """Parcourt les morceaux (texte compris) un par un, sans tout charger."""
+        ids = ([(source, m["part_id"]) for m in self.metadata(source)] if source is not None
+               else [(s, m["part_id"]) for s in self.sources() for m in self.metadata(s)])
+        for chunk_source, part_id in ids:
+            chunk = self.get(chunk_source, part_id)
+            if chunk is not None:
+                yield chunk
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT source FROM chunks ORDER BY source")]
+
+    def count(self, source: Optional[str] = None) -> int:
+        with self._lock:
+            if source is None:
+                return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM chunks WHERE source = ?", (source,)).fetchone()[0]
+
+    def counts_by_source(self) -> Dict[str, int]:
+        """Nombre de morceaux par fichier."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT source, COUNT(*) FROM chunks GROUP BY source"))
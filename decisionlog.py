@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+# Journal des décisions par morceau des outils de parcours (WorkDraftingTool, GuessStrategyTool) :
+# une ligne JSON par morceau jugé par le LLM (rédigé ou 'pas rédigé', pertinent ou non) ou
+# sauté par le parcours, avec le texte du morceau. global_history.log ne contient pas les textes
+# des morceaux ; ce journal en fait un jeu de données étiqueté pour relevancefilter.
+# Il recopie le contenu des documents des clients : il n'est tenu que sur demande.
+
+# Chemin du journal (par exemple sous un répertoire de données) ; vide par défaut : pas d'enregistrement
+DEFAULT_PATH = os.getenv("DECISION_LOG_PATH", "")
+
+# Origine d'une étiquette : réponse du LLM sur le morceau, ou morceau jamais choisi par le parcours
+JUDGED = "judged"
+SKIPPED = "skipped"
+
+
+class DecisionLog:
+    """Journal JSONL en ajout seul, partagé par les threads d'une exécution."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def open_default(cls) -> Optional["DecisionLog"]:
+        """Journal au chemin DECISION_LOG_PATH, ou None s'il n'est pas défini ou inaccessible."""
+        path = os.getenv("DECISION_LOG_PATH", DEFAULT_PATH)
+        if not path:
+            return None
+        try:
+            return cls(path)
+        except OSError:
+            return None
+
+    def record(self, tool: str, source: str, part_id: int, text: str, relevant: bool, kind: str = JUDGED,
+               model: str = None):
+        """
+        Ajoute une décision.
+
+        Args:
+            tool (str): Outil qui a pris la décision.
+            source (str), part_id (int): Morceau concerné.
+            text (str): Texte du morceau.
+            relevant (bool): Morceau rédigé (WorkDraftingTool) ou jugé pertinent (GuessStrategyTool).
+            kind (str): JUDGED (réponse du LLM sur ce morceau) ou SKIPPED (jamais choisi par le parcours).
+            model (str, optional): Modèle qui a jugé le morceau.
+        """
+        line = json.dumps({"ts": time.time(), "tool": tool, "source": source, "part_id": part_id,
+                           "label": int(relevant), "kind": kind, "model": model, "text": text},
+                          ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def mine_decisions(paths: Iterable[str], include_skipped: bool = False, tools: Iterable[str] = None) -> Tuple[List[str], List[int]]:
+    """
+    Jeu de données étiqueté à partir d'un ou plusieurs journaux de décisions.
+
+    Un même texte jugé plusieurs fois (relances, révisions identiques) ne compte qu'une fois,
+    avec sa décision la plus récente ; une décision du LLM prime sur un saut du parcours.
+
+    Args:
+        paths (iterable): Journaux JSONL (les lignes illisibles sont ignorées).
+        include_skipped (bool): Compter les morceaux sautés par le parcours comme non pertinents
+            (étiquette faible : le LLM ne les a pas lus).
+        tools (iterable, optional): Outils retenus (par défaut : tous).
+
+    Returns:
+        tuple: (textes, étiquettes) avec 1 = pertinent, 0 = non pertinent.
+    """
+    tools = set(tools) if tools else None
+    by_text = {}  # empreinte du texte -> ((décision du LLM, horodatage), texte, étiquette)
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if tools and entry.get("tool") not in tools:
+                    continue
+                if entry.get("kind") == SKIPPED and not include_skipped:
+                    continue
+                text = (entry.get("text") or "").strip()
+                if not text:
+                    continue
+                key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                rank = (entry.get("kind") != SKIPPED, entry.get("ts", 0.0))
+                if key not in by_text or rank >= by_text[key][0]:
+                    by_text[key] = (rank, text, int(entry.get("label", 0)))
+    texts = [text for _, text, _ in by_text.values()]
+    labels = [label for _, _, label in by_text.values()]
+    return texts, labels
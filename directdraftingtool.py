@@ -1,48 +1,72 @@
 from crewai.tools import BaseTool
+from pydantic import Field
 from openai import OpenAI
+from llmclient import chat_completion
 import os
 import logging
 import sys
-from typing import List, Tuple
-from fileprocessingtool import FileProcessingTool
-
-# Configuration explicite du logging
-logging.getLogger('').handlers = []
+from typing import List, Optional, Tuple
+from fileprocessingtool import FileProcessingTool, chunk_payload, document_name
+from chunkstore import ChunkStore
+from chunkdedup import DedupReport, find_duplicates
+from modelregistry import route_models, routing_enabled
+from artifacts import RunArtifacts
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.propagate = False
 
-logger.handlers = []
+# Configuration explicite du logging, différée au premier outil instancié :
+# l'import du module ne touche ni aux handlers ni à global_history.log.
+def configure_logging():
+    if logger.handlers:
+        return
+    logging.getLogger('').handlers = []
+
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    # Utiliser StreamHandler sans sys.stdout pour Colab
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
 
-# Utiliser StreamHandler sans sys.stdout pour Colab
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+    file_handler = logging.FileHandler("global_history.log", mode='w', encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
 
-file_handler = logging.FileHandler("global_history.log", mode='w', encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+    logger.info("Configuration du logging en cours...")
+    log_and_print("Logging configuré avec succès. Si ce message n'apparaît pas, il y a un problème avec le logging.")
+    logger.info("Configuration du logging terminée.")
 
 # Fonction pour logger sans duplication
 def log_and_print(message, level="info"):
     getattr(logger, level)(message)  # Utilise uniquement logger
 
-logger.info("Configuration du logging en cours...")
-log_and_print("Logging configuré avec succès. Si ce message n'apparaît pas, il y a un problème avec le logging.")
-logger.info("Configuration du logging terminée.")
-
 class DirectDraftingTool(BaseTool):
     name: str = "direct_drafting_tool"
     description: str = "Outil pour rédiger directement des travaux à partir de chunks spécifiés par l'utilisateur."
     llm_provider: str = "The LLM provider"
+    # Routage par tâche (modelregistry) : synthèse succincte sur le modèle rapide, rédaction sur
+    # le modèle phare. Désactivé : modèle phare partout.
+    model_routing: bool = Field(default_factory=routing_enabled)
+    # Répertoire des artefacts (artifacts) ; None : un répertoire neuf par exécution sous ARTIFACTS_ROOT
+    output_dir: Optional[str] = None
+    # Hedging xAI/OpenAI de cet outil (llmclient) ; None : réglage du processus (LLM_HEDGING)
+    hedging: Optional[bool] = None
     
-    def __init__(self, llm_provider: str = "xai"):
+    def __init__(self, llm_provider: str = "xai", model_routing: Optional[bool] = None, output_dir: Optional[str] = None,
+                 hedging: Optional[bool] = None):
         super().__init__()
+        configure_logging()
         self.llm_provider = llm_provider.lower()
+        if model_routing is not None:
+            self.model_routing = model_routing
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if hedging is not None:
+            self.hedging = hedging
         log_and_print(f"Outil initialisé avec llm_provider : {self.llm_provider}")
 
     def _run(self, file_paths: List[str], file_infos: List[str], project_synthesis: str, user_chunks_to_draft: List[Tuple[str, int]]) -> str:
@@ -51,18 +75,17 @@ class DirectDraftingTool(BaseTool):
         # Étape 1 : Configurer le LLM
         if self.llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
-            model_id = "grok-3-beta"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
         else:
             api_key = os.getenv("OPENAI_API_KEY")
             base_url = None
-            model_id = "gpt-4o"
         if not api_key:
             log_and_print(f"Clé API pour {self.llm_provider.upper()}_API_KEY non définie.", "error")
             return "Erreur : Clé API non définie."
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        log_and_print(f"LLM configuré avec provider : {self.llm_provider}")
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
+        models = route_models(self.llm_provider, ("condensation", "drafting"), self.model_routing)
+        log_and_print(f"LLM configuré avec provider : {self.llm_provider}, modèles : {models}")
 
         # Étape 2 : Générer une synthèse succincte pour guider la rédaction
         synthesis_prompt = (
@@ -71,8 +94,10 @@ class DirectDraftingTool(BaseTool):
             f"Cette synthèse doit refléter les objectifs clés sans détails superflus."
         )
         try:
-            response = client.chat.completions.create(
-                model=model_id,
+            response = chat_completion(
+                client, self.name, self.llm_provider,
+                hedging=self.hedging,
+                model=models["condensation"],
                 messages=[{"role": "user", "content": synthesis_prompt}],
                 max_tokens=60,
                 temperature=0.3
@@ -84,30 +109,34 @@ class DirectDraftingTool(BaseTool):
             drafting_synthesis = "Projet axé sur des objectifs stratégiques et techniques, nécessitant une analyse ciblée."
 
         # Étape 3 : Extraire et découper tous les fichiers avec FileProcessingTool
-        file_processor = FileProcessingTool()
-        all_chunks = file_processor._run(file_paths)
-        log_and_print(f"Extraction des chunks terminée. Nombre total de chunks : {len(all_chunks)}")
+        file_processor = FileProcessingTool(model=models["drafting"])  # Tokens des morceaux comptés pour le modèle de rédaction
+        chunk_store = ChunkStore()  # Morceaux écrits sur disque au fil du découpage, relus un par un
+        for error in file_processor.process_to_store(file_paths, chunk_store):
+            log_and_print(f"Erreur dans chunk : {error}", "warning")
+
+        # Étape 4 : Nombre de morceaux par fichier (les textes restent dans le magasin)
+        chunks_by_file = chunk_store.counts_by_source()
+        log_and_print(f"Extraction des chunks terminée. Nombre total de chunks : {sum(chunks_by_file.values())}")
 
-        if not all_chunks or all(chunk.get("error") for chunk in all_chunks):
+        if not chunks_by_file:
             log_and_print("Aucun fichier n’a pu être traité.", "error")
+            chunk_store.close()
             return "Erreur : Aucun fichier n’a pu être traité."
-
-        # Étape 4 : Organiser les morceaux par fichier
-        chunks_by_file = {}
-        for chunk in all_chunks:
-            if "error" in chunk:
-                log_and_print(f"Erreur dans chunk : {chunk['error']}", "warning")
-                continue
-            file_name = chunk["source"]
-            if file_name not in chunks_by_file:
-                chunks_by_file[file_name] = []
-            chunks_by_file[file_name].append(chunk)
         log_and_print(f"Organisation des chunks par fichier terminée. Fichiers trouvés : {list(chunks_by_file.keys())}")
 
+        # Quasi-doubles entre fichiers (révisions d'un même document) : un morceau dont le double
+        # a déjà été traité avec succès est sauté
+        sources = [document_name(p) for p in file_paths if document_name(p) in chunks_by_file]
+        dedup = DedupReport(find_duplicates(chunk_store, sources))
+        handled_chunks = set()  # (fichier, part_id) traités avec succès
+        if dedup.duplicates:
+            log_and_print(f"{len(dedup.duplicates)} morceau(x) quasi identique(s) à un morceau d'un autre fichier.")
+
         # Étape 5 : Initialiser les travaux
         works_text = []
         previous_travaux = ""  # Pour assurer la continuité entre les chunks
-        file_info_dict = {os.path.basename(file_path): info for file_path, info in zip(file_paths, file_infos)}  # Associer file_infos par nom de fichier
+        previous_part = None  # (fichier, part_id) du dernier morceau rédigé
+        file_info_dict = {document_name(file_path): info for file_path, info in zip(file_paths, file_infos)}  # Associer file_infos par nom de fichier
 
         # Étape 6 : Rédiger les chunks spécifiés par l'utilisateur
         for file_name, part_id in user_chunks_to_draft:
@@ -116,15 +145,24 @@ class DirectDraftingTool(BaseTool):
                 works_text.append(f"--- Aucun contenu pour {file_name} ---")
                 continue
 
-            file_chunks = chunks_by_file[file_name]
-            # Trouver le chunk correspondant à part_id
-            current_chunk = next((chunk for chunk in file_chunks if chunk['part_id'] == part_id), None)
+            original = dedup.duplicates.get((file_name, part_id))
+            if original in handled_chunks and dedup.skip((file_name, part_id)):
+                # Morceau demandé par l'utilisateur : la sortie renvoie à la rédaction de l'original
+                log_and_print(f"Morceau {part_id} de {file_name} quasi identique à {original[0]}#{original[1]}, déjà rédigé : appel évité.")
+                works_text.append(f"--- Morceau {part_id} de {file_name} quasi identique à la partie {original[1]} de "
+                                  f"{original[0]} : voir Travaux (source : {original[0]}, partie {original[1]}) ---")
+                continue
+
+            # Accès direct au chunk par (fichier, part_id)
+            current_chunk = chunk_store.get(file_name, part_id)
             if not current_chunk:
                 log_and_print(f"Morceau {part_id} non trouvé pour {file_name}", "warning")
                 works_text.append(f"--- Morceau {part_id} non trouvé pour {file_name} ---")
                 continue
 
-            chunk_text = current_chunk['text'].strip() if current_chunk['text'] else "Morceau vide"
+            # Morceau consécutif au précédent rédigé : le recouvrement déjà envoyé est omis
+            previous_part_id = previous_part[1] if previous_part and previous_part[0] == file_name else None
+            chunk_text = chunk_payload(current_chunk, previous_part_id).strip() or "Morceau vide"
             log_and_print(f"Rédaction du morceau {part_id} pour {file_name}.", "debug")
 
             # Récupérer les informations du fichier
@@ -147,8 +185,11 @@ class DirectDraftingTool(BaseTool):
                 f"Ne décrivez pas le contenu du morceau, transformez-le en travaux réalisés. Évitez les introductions ou commentaires généraux."
             )
             try:
-                response = client.chat.completions.create(
-                    model=model_id,
+                response = chat_completion(
+                    client, self.name, self.llm_provider,
+                    hedging=self.hedging,
+                    chunk_id=f"{file_name}#{part_id}",
+                    model=models["drafting"],
                     messages=[{"role": "user", "content": prompt}],
                     max_tokens=1000,
                     temperature=0.5
@@ -163,21 +204,25 @@ class DirectDraftingTool(BaseTool):
 
                 # Mettre à jour previous_travaux pour la continuité
                 previous_travaux = works
+                previous_part = (file_name, part_id)
+                handled_chunks.add((file_name, part_id))
 
             except Exception as e:
                 log_and_print(f"Erreur lors de la rédaction du morceau {part_id} pour {file_name} : {str(e)}", "error")
                 works_text.append(f"Erreur lors de la rédaction du morceau {part_id} pour {file_name} : {str(e)}")
 
+        chunk_store.close()
+        log_and_print(dedup.summary())
+
         # Vérifier si works_text est vide avant écriture
         if not works_text:
             log_and_print("Aucun travaux rédigé pour aucun fichier.", "warning")
             works_text.append("Aucun travaux rédigé pour les fichiers traités.")
 
-        # Écrire les travaux dans un fichier unique
+        # Écrire les travaux dans le répertoire de l'exécution (écriture atomique)
         try:
-            with open("works_output.txt", "w", encoding="utf-8") as f:
-                f.write("\n\n".join(works_text))
-            log_and_print("Travaux écrits dans works_output.txt")
+            output_path = RunArtifacts.for_run(self.name, self.output_dir).write_text("works_output.txt", "\n\n".join(works_text))
+            log_and_print(f"Travaux écrits dans {output_path}")
         except Exception as e:
             log_and_print(f"Erreur lors de l'écriture dans works_output.txt : {str(e)}", "error")
 
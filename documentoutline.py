@@ -0,0 +1,118 @@
+import re
+from typing import List
+
+# Plan d'un document (titres des styles Word, signets d'un PDF, titres des diapositives) relié
+# aux morceaux : chaque titre est situé dans le texte nettoyé, puis associé aux part_id des
+# morceaux qui couvrent sa section (sous-sections comprises). Les outils de parcours voient ce
+# plan et peuvent écarter une section entière sans en échantillonner les morceaux.
+
+# Fenêtre de recherche d'un titre autour de sa position estimée (en mots)
+SEARCH_WINDOW_WORDS = 400
+# Entrées au plus dans le plan envoyé au LLM (les niveaux les plus fins sont retirés au-delà)
+MAX_OUTLINE_ENTRIES = 40
+
+_NORMALIZE_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def _normalize(word: str) -> str:
+    return _NORMALIZE_RE.sub("", word.lower())
+
+
+def locate_headings(words: List[str], headings: List[dict], raw_words: int) -> List[dict]:
+    """
+    Position (en mots) de chaque titre dans le texte nettoyé.
+
+    Le nettoyage retire des mots (gabarits répétés, césures) : la position d'un titre dans le
+    texte brut (raw_word) est ramenée à l'échelle du texte nettoyé, puis le titre est cherché
+    autour de cette estimation, après le titre précédent (un sommaire en début de document ne
+    capte donc pas les titres). Un titre introuvable garde la position estimée.
+
+    Args:
+        words (list): Mots du texte nettoyé.
+        headings (list): Titres {title, level, raw_word} dans l'ordre du document.
+        raw_words (int): Nombre de mots du texte brut.
+
+    Returns:
+        list: Titres {title, level, position}, positions croissantes.
+    """
+    normalized = [_normalize(w) for w in words]
+    scale = len(words) / raw_words if raw_words else 1.0
+    located, floor = [], 0
+    for heading in headings:
+        target = [t for t in (_normalize(w) for w in heading["title"].split()) if t]
+        if not target:
+            continue
+        estimate = min(len(words), max(floor, int(heading.get("raw_word", 0) * scale)))
+        position = estimate
+        start = max(floor, estimate - SEARCH_WINDOW_WORDS)
+        end = min(len(words) - len(target) + 1, estimate + SEARCH_WINDOW_WORDS)
+        # Occurrence la plus proche de l'estimation
+        candidates = [i for i in range(start, max(start, end)) if normalized[i:i + len(target)] == target]
+        if candidates:
+            position = min(candidates, key=lambda i: abs(i - estimate))
+        located.append({"title": " ".join(heading["title"].split()), "level": heading.get("level", 1),
+                        "position": position})
+        floor = position
+    return located
+
+
+def outline_entries(headings: List[dict], chunks: List[dict]) -> List[dict]:
+    """
+    Plan d'un fichier : pour chaque titre, les morceaux dont le texte nouveau (hors recouvrement
+    avec le morceau précédent) tombe dans sa section. Une section va jusqu'au titre suivant de
+    niveau égal ou supérieur.
+
+    Args:
+        headings (list): Titres situés par locate_headings.
+        chunks (list): Morceaux du fichier (start_word, end_word, overlap_words, part_id).
+
+    Returns:
+        list: Entrées {position, level, title, part_ids} dans l'ordre du document.
+    """
+    chunks = [c for c in chunks if "error" not in c]
+    total = max((c["end_word"] for c in chunks), default=0)
+    entries = []
+    for index, heading in enumerate(headings):
+        end = next((h["position"] for h in headings[index + 1:] if h["level"] <= heading["level"]), total)
+        part_ids = [c["part_id"] for c in chunks
+                    if max(heading["position"], c["start_word"] + (c.get("overlap_words") or 0)) < min(end, c["end_word"])]
+        if part_ids:
+            entries.append({"position": heading["position"], "level": heading["level"], "title": heading["title"],
+                            "part_ids": part_ids})
+    return entries
+
+
+def part_ranges(part_ids: List[int]) -> str:
+    """Numéros de morceaux compactés en intervalles : [3, 4, 5, 8] -> '3-5, 8'."""
+    ranges = []
+    for part_id in sorted(set(part_ids)):
+        if ranges and part_id == ranges[-1][1] + 1:
+            ranges[-1][1] = part_id
+        else:
+            ranges.append([part_id, part_id])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def visible_entries(entries: List[dict], max_entries: int = MAX_OUTLINE_ENTRIES) -> List[dict]:
+    """Entrées du plan montrées au LLM : au-delà de max_entries titres, les niveaux les plus fins sont retirés."""
+    if not entries:
+        return []
+    levels = sorted({e["level"] for e in entries})
+    while len(levels) > 1 and sum(1 for e in entries if e["level"] <= levels[-1]) > max_entries:
+        levels.pop()
+    return [e for e in entries if e["level"] <= levels[-1]][:max_entries]
+
+
+def format_outline(entries: List[dict], max_entries: int = MAX_OUTLINE_ENTRIES) -> str:
+    """
+    Plan compact pour un prompt : une ligne par titre, indentée selon son niveau, avec ses
+    morceaux (voir visible_entries pour les plans trop longs).
+
+    Returns:
+        str: Plan du fichier, ou chaîne vide s'il n'a pas de titres.
+    """
+    kept = visible_entries(entries, max_entries)
+    if not kept:
+        return ""
+    top = min(e["level"] for e in kept)
+    return "\n".join(f"{'  ' * (e['level'] - top)}{e['title']} : morceaux {part_ranges(e['part_ids'])}" for e in kept)
@@ -1,5 +1,6 @@
 from crewai.tools import BaseTool
 from openai import OpenAI
+from llmclient import chat_completion
 from typing import Optional
 import os
 from searchtool import SearchTool
@@ -8,7 +9,7 @@ class DraftingTool(BaseTool):
     name: str = "drafting_tool"  # Nom de l'outil avec annotation de type
     description: str = "Outil pour rédiger des sections spécifiques d'un rapport (1.1, 1.2, 1.3, 1.5, 1.6, 1.7) ou un texte général en suivant un style donné."  # Description mise à jour
 
-    def _run(self, content_to_draft: str = "", synthesis: str = "", section: str = "general", solution_name: str = "", company_name: str = "", example_text: Optional[str] = None, llm_provider: str = "xai") -> str:
+    def _run(self, content_to_draft: str = "", synthesis: str = "", section: str = "general", solution_name: str = "", company_name: str = "", example_text: Optional[str] = None, llm_provider: str = "xai", hedging: Optional[bool] = None) -> str:
         """
         Rédige une section spécifique d'un rapport ou un texte général en suivant un style donné.
         Args:
@@ -19,6 +20,7 @@ class DraftingTool(BaseTool):
             company_name (str, optional): Nom de l'entreprise (pour 1.6).
             example_text (str, optional): Exemple de rédaction pour imiter le style (si fourni).
             llm_provider (str): Fournisseur du LLM ("xai" ou "openai"). Par défaut "xai".
+            hedging (bool, optional): Hedging xAI/OpenAI pour cet appel. Par défaut, réglage du processus.
         Returns:
             str: Texte rédigé pour la section demandée ou texte général.
         """
@@ -26,7 +28,7 @@ class DraftingTool(BaseTool):
         # Configure le client selon le fournisseur
         if llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
             model_id = "grok-3-beta"  # Modèle générique pour xAI
         else:  # openai
             api_key = os.getenv("OPENAI_API_KEY")
@@ -35,7 +37,7 @@ class DraftingTool(BaseTool):
         if not api_key:
             return f"Erreur : Clé API pour {llm_provider.upper()}_API_KEY non définie dans les variables d'environnement"
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
 
         # Étape 1 : Recherche web pour la section 1.6 si nécessaire
         web_data = ""
@@ -145,7 +147,9 @@ class DraftingTool(BaseTool):
 
         # Étape 3 : Appel au LLM pour rédiger
         try:
-            drafting_response = client.chat.completions.create(
+            drafting_response = chat_completion(
+                client, self.name, llm_provider,
+                hedging=hedging,
                 model=model_id,
                 messages=[
                     {"role": "system", "content": "Vous êtes un rédacteur professionnel spécialisé dans les rapports stratégiques."},
@@ -1,88 +1,269 @@
 from crewai.tools import BaseTool
-import PyPDF2
-import docx
-import pandas as pd
-from pptx import Presentation  # Correction de l'importation
+from pydantic import Field
+from tokencount import count_tokens
+from documentoutline import locate_headings, outline_entries
+import bisect
+import io
 import os
+import re
+
+# Les parseurs de formats (PyPDF2, python-docx, pandas, python-pptx) sont importés
+# à la demande dans _extract_text : seul le format rencontré est chargé.
+
+# Un document est soit un chemin de fichier, soit un fichier en mémoire : couple (nom, contenu)
+# où le contenu est en octets (bytes, memoryview de getbuffer()) ou un objet fichier binaire
+# (BytesIO, UploadedFile de Streamlit). Le nom donne le format et sert de source aux morceaux.
+
+
+def document_name(document) -> str:
+    """Nom d'un document : nom du fichier du chemin, ou nom du fichier en mémoire."""
+    if isinstance(document, (str, os.PathLike)):
+        return os.path.basename(document)
+    return os.path.basename(document[0])
+
+
+def open_document(document):
+    """
+    Source lisible par les parseurs : le chemin lui-même, ou un flux binaire rembobiné
+    (un fichier en mémoire peut être relu plusieurs fois : empreinte, extraction).
+    """
+    if isinstance(document, (str, os.PathLike)):
+        return document
+    data = document[1]
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(data)
+    data.seek(0)
+    return data
 
 class FileProcessingTool(BaseTool):
     name: str = "file_processing_tool"
     description: str = "Outil pour convertir des fichiers variés (PDF, Word, Excel, PPT) en texte brut et les découper en morceaux."
+    # Découpage : "words" (fenêtres de 700 mots), "tokens" (budget de tokens du modèle cible) ou
+    # "sections" (fenêtres de 700 mots alignées sur les titres du document, "words" sans titres),
+    # choisi par défaut via la variable d'environnement CHUNKING_MODE
+    chunking: str = Field(default_factory=lambda: os.getenv("CHUNKING_MODE", "words"))
+    model: str = "grok-3-beta"  # Modèle dont le tokenizer compte les tokens des morceaux
+    target_tokens: int = 1000
+    overlap_tokens: int = 150
+    snap_to_sentences: bool = True
+    # Nettoyage entre extraction et découpage (gabarits répétés, césures, Unicode, espaces)
+    clean_text: bool = True
+    cleaning_stats: dict = Field(default_factory=dict)  # Statistiques du nettoyage par fichier
+    # Aperçus locaux (mots-clés TF-IDF, phrases clés) enregistrés avec les morceaux par process_to_store
+    digests: bool = True
+    # Plan du document (titres Word, signets PDF, titres des diapositives) relié aux part_id,
+    # conservé par fichier dans outlines et enregistré avec les morceaux par process_to_store
+    outline: bool = Field(default_factory=lambda: os.getenv("DOCUMENT_OUTLINE", "1") != "0")
+    outlines: dict = Field(default_factory=dict)
 
     def _run(self, file_paths: list) -> list:
         """
         Convertit des fichiers en texte brut et les découpe en morceaux.
 
         Args:
-            file_paths (list): Liste des chemins vers les fichiers à traiter.
+            file_paths (list): Liste des documents à traiter : chemins ou fichiers en mémoire (nom, contenu).
 
         Returns:
             list: Liste de dictionnaires contenant les morceaux de texte avec métadonnées.
         """
         processed_chunks = []
+        for file_chunks in self._iter_file_chunks(file_paths):
+            processed_chunks.extend(file_chunks)
+        return processed_chunks
+
+    def process_to_store(self, file_paths: list, store) -> list:
+        """
+        Variante de _run qui écrit les morceaux dans un ChunkStore, fichier par fichier :
+        seul le texte du fichier en cours de découpage est en mémoire.
 
+        Args:
+            file_paths (list): Liste des documents à traiter : chemins ou fichiers en mémoire (nom, contenu).
+            store (ChunkStore): Magasin de morceaux à alimenter.
+
+        Returns:
+            list: Messages d'erreur des fichiers non traités.
+        """
+        errors = []
+        for file_chunks in self._iter_file_chunks(file_paths):
+            errors.extend(chunk["error"] for chunk in file_chunks if "error" in chunk)
+            store.add_chunks(file_chunks)
+            if self.outline and file_chunks and "error" not in file_chunks[0]:
+                store.add_outline(file_chunks[0]["source"], self.outlines.get(file_chunks[0]["source"], []))
+            if self.digests:
+                from chunkdigest import digest_chunks  # numpy chargé seulement si les aperçus sont calculés
+                store.add_digests(digest_chunks(file_chunks))
+        return errors
+
+    def _iter_file_chunks(self, file_paths: list):
+        """Produit, fichier par fichier, la liste de ses morceaux (ou un dictionnaire d'erreur)."""
         for file_path in file_paths:
-            if not os.path.exists(file_path):
-                processed_chunks.append({"error": f"Fichier non trouvé : {file_path}"})
+            if isinstance(file_path, (str, os.PathLike)) and not os.path.exists(file_path):
+                yield [{"error": f"Fichier non trouvé : {file_path}"}]
                 continue
 
-            file_name = os.path.basename(file_path)
-            text = self._extract_text(file_path, file_name)
+            file_name = document_name(file_path)
+            headings = [] if self.outline or self.chunking == "sections" else None
+            text = self._extract_clean_text(file_path, file_name, headings)
 
             if not text:
-                processed_chunks.append({"error": f"Échec de l'extraction pour : {file_name}. Vérifiez le format ou l'intégrité du fichier."})
+                yield [{"error": f"Échec de l'extraction pour : {file_name}. Vérifiez le format ou l'intégrité du fichier."}]
                 continue
 
-            chunks = self._chunk_text(text, file_name)
-            processed_chunks.extend(chunks)
+            if self.chunking == "tokens":
+                chunks = self._chunk_by_tokens(text, file_name)
+            elif self.chunking == "sections" and headings:
+                chunks = self._chunk_by_sections(text, file_name, headings)
+            else:
+                chunks = self._chunk_text(text, file_name)
+            if self.outline and headings:
+                self.outlines[file_name] = outline_entries(headings, chunks)
+            yield chunks
 
-        return processed_chunks
-
-    def _extract_text(self, file_path: str, file_name: str) -> str:
+    def _extract_text(self, file_path, file_name: str) -> str:
         """
         Extrait le texte brut d'un fichier selon son type.
         """
-        if file_path.endswith(('.pdf', '.PDF')):
+        return "\n".join(self._extract_pages(file_path, file_name)).strip()
+
+    def extract_text(self, document) -> str:
+        """
+        Texte brut d'un document, sans découpage ni nettoyage.
+
+        Args:
+            document: Chemin, ou fichier en mémoire (nom, octets ou objet fichier binaire).
+
+        Returns:
+            str: Texte extrait (vide en cas d'échec ou de format non supporté).
+        """
+        return self._extract_text(document, document_name(document))
+
+    def _extract_pages(self, file_path, file_name: str, headings: list = None) -> list:
+        """
+        Extrait le texte brut d'un fichier page par page (PDF) ou diapositive par diapositive (PPTX) ;
+        les formats continus (DOCX, Excel/CSV) donnent une seule page. Liste vide en cas d'échec.
+        file_path est un chemin ou un fichier en mémoire (nom, contenu) ; le format vient de file_name.
+        Si headings est une liste, elle reçoit les titres du document {title, level, page, word} :
+        signets du PDF, paragraphes de style Titre/Heading du DOCX, titres des diapositives ; page
+        est l'indice dans la liste retournée, word la position du titre dans sa page (si connue).
+        """
+        source = open_document(file_path)
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension == '.pdf':
             try:
-                with open(file_path, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
-                    text = "".join(page.extract_text() for page in reader.pages if page.extract_text())
+                import PyPDF2
+                reader = PyPDF2.PdfReader(source)
+                texts = [page.extract_text() for page in reader.pages]
+                kept = [index for index, page_text in enumerate(texts) if page_text]
+                pages = [texts[index] for index in kept]
+                if headings is not None:
+                    headings.extend(self._pdf_headings(reader, kept))
             except Exception as e:
                 print(f"Erreur lors de l'extraction du PDF {file_name} : {str(e)}")
-                text = ""
-        elif file_path.endswith(('.docx', '.DOCX')):
+                pages = []
+        elif extension == '.docx':
             try:
-                doc = docx.Document(file_path)
-                text = "\n".join(paragraph.text for paragraph in doc.paragraphs)
+                import docx
+                doc = docx.Document(source)
+                pages = ["\n".join(paragraph.text for paragraph in doc.paragraphs)]
+                if headings is not None:
+                    word = 0
+                    for paragraph in doc.paragraphs:
+                        level = _heading_level(paragraph.style.name if paragraph.style is not None else "")
+                        if level and paragraph.text.strip():
+                            headings.append({"title": paragraph.text.strip(), "level": level, "page": 0, "word": word})
+                        word += len(paragraph.text.split())
             except Exception as e:
                 print(f"Erreur lors de l'extraction du DOCX {file_name} : {str(e)}")
-                text = ""
-        elif file_path.endswith(('.xlsx', '.xls', '.csv')):
+                pages = []
+        elif extension in ('.xlsx', '.xls', '.csv'):
             try:
-                df = pd.read_excel(file_path) if file_path.endswith(('.xlsx', '.xls')) else pd.read_csv(file_path)
-                text = "\n".join(" ".join(map(str, row)) for row in df.values)
+                import pandas as pd
+                df = pd.read_excel(source) if extension in ('.xlsx', '.xls') else pd.read_csv(source)
+                pages = ["\n".join(" ".join(map(str, row)) for row in df.values)]
             except Exception as e:
                 print(f"Erreur lors de l'extraction du fichier Excel/CSV {file_name} : {str(e)}")
-                text = ""
-        elif file_path.endswith(('.pptx', '.PPTX')):
+                pages = []
+        elif extension == '.pptx':
             try:
-                ppt = Presentation(file_path)
-                text = ""
+                from pptx import Presentation
+                ppt = Presentation(source)
+                pages = []
                 for slide in ppt.slides:
+                    slide_text = ""
                     for shape in slide.shapes:
                         if hasattr(shape, "text_frame") and shape.text_frame:
-                            text += shape.text_frame.text + "\n"
+                            slide_text += shape.text_frame.text + "\n"
+                    title = slide.shapes.title
+                    if headings is not None and title is not None and title.has_text_frame and title.text_frame.text.strip():
+                        headings.append({"title": title.text_frame.text.strip(), "level": 1, "page": len(pages)})
+                    pages.append(slide_text)
             except Exception as e:
                 print(f"Erreur lors de l'extraction du PPTX {file_name} : {str(e)}")
-                text = ""
+                pages = []
+        else:
+            pages = []
+        return pages
+
+    @staticmethod
+    def _pdf_headings(reader, kept: list) -> list:
+        """
+        Signets d'un PDF, à plat avec leur niveau d'imbrication. Un signet qui pointe vers une
+        page sans texte est rattaché à la page avec texte suivante.
+        """
+        headings = []
+
+        def walk(items, level):
+            for item in items:
+                if isinstance(item, list):
+                    walk(item, level + 1)  # Enfants du signet précédent
+                    continue
+                try:
+                    page = reader.get_destination_page_number(item)
+                except Exception:
+                    continue
+                title = str(getattr(item, "title", "") or "").strip()
+                if title and page is not None and page >= 0:
+                    headings.append({"title": title, "level": level, "page": min(bisect.bisect_left(kept, page), len(kept) - 1)})
+
+        try:
+            walk(reader.outline, 1)
+        except Exception:
+            return []
+        return headings if kept else []
+
+    def _extract_clean_text(self, file_path, file_name: str, headings: list = None) -> str:
+        """
+        Extrait puis nettoie le texte (voir textcleaning.clean_pages) si clean_text est actif ;
+        les statistiques du nettoyage sont conservées dans cleaning_stats[file_name].
+        Si headings est une liste, elle reçoit les titres du document situés dans le texte
+        retourné (documentoutline.locate_headings) : {title, level, position} en mots.
+        """
+        pages = self._extract_pages(file_path, file_name, headings)
+        if not self.clean_text:
+            text = "\n".join(pages).strip()
         else:
-            text = ""
-        return text.strip()
+            from textcleaning import clean_pages
+            text, stats = clean_pages(pages, self.model)
+            self.cleaning_stats[file_name] = stats
+            if stats["words_removed"]:
+                print(f"Nettoyage de {file_name} : {stats['words_removed']} mots ({stats['tokens_removed']} tokens) retirés, "
+                      f"{stats['boilerplate_lines']} ligne(s) répétée(s), {stats['hyphenations_fixed']} césure(s) recollée(s).")
+        if headings:
+            # Position de chaque titre dans le texte brut (début de sa page, plus sa position dans la page)
+            page_offsets = [0]
+            for page in pages:
+                page_offsets.append(page_offsets[-1] + len(page.split()))
+            for heading in headings:
+                heading["raw_word"] = page_offsets[heading["page"]] + (heading.get("word") or 0)
+            headings[:] = locate_headings(text.split(), headings, page_offsets[-1])
+        return text
 
     def _chunk_text(self, text: str, file_name: str) -> list:
         """
-        Découpe le texte en morceaux selon les règles : < 700 mots → tout prendre ; sinon 700 mots max avec chevauchement de 100 mots.
+        Découpe le texte en morceaux selon les règles : < 700 mots → tout prendre ; sinon fenêtres de 700 mots tous les 600 mots, reculées de 100 mots (200 mots communs avec le morceau précédent).
         Priorité 'Basse' pour les morceaux < 150 mots.
+        Chaque morceau porte sa position en mots (start_word, end_word) et le nombre de ses premiers
+        mots déjà présents à la fin du morceau précédent (overlap_words), utilisé par chunk_payload.
         """
         chunks = []
         words = text.split()
@@ -96,7 +277,11 @@ class FileProcessingTool(BaseTool):
                 "text": chunk_text,
                 "part_id": 1,
                 "priority": priority,
-                "source": file_name
+                "source": file_name,
+                "start_word": 0,
+                "end_word": total_words,
+                "overlap_words": 0,
+                "token_count": count_tokens(chunk_text, self.model)
             })
         else:
             for i in range(0, total_words, 600):
@@ -108,15 +293,170 @@ class FileProcessingTool(BaseTool):
 
                 priority = "Basse" if chunk_length < 150 else None
 
+                # Recouvrement avec le morceau précédent : mots [start_idx, fin du précédent)
+                overlap_words = max(0, chunks[-1]["end_word"] - start_idx) if chunks else 0
+
                 chunks.append({
                     "text": chunk_text,
                     "part_id": len(chunks) + 1,
                     "priority": priority,
-                    "source": file_name
+                    "source": file_name,
+                    "start_word": start_idx,
+                    "end_word": end_idx,
+                    "overlap_words": overlap_words,
+                    "token_count": count_tokens(chunk_text, self.model)
                 })
 
         return chunks
 
+    def _chunk_by_sections(self, text: str, file_name: str, headings: list, max_words: int = 700,
+                           step_words: int = 600) -> list:
+        """
+        Découpe le texte en morceaux alignés sur les sections : chaque morceau commence à un titre
+        (ou au début du document). Une section courte (< 150 mots) est regroupée avec sa voisine
+        tant que le groupe tient en max_words mots, pour éviter les morceaux minuscules ; les
+        autres sections restent séparées, pour qu'une section entière puisse être écartée. Une
+        section plus longue que max_words est découpée comme _chunk_text
+        (fenêtres de max_words mots tous les step_words mots, recouvrement à l'intérieur de la
+        section seulement). Priorité 'Basse' pour les morceaux < 150 mots.
+        """
+        words = text.split()
+        total_words = len(words)
+        bounds = sorted({0, total_words} | {h["position"] for h in headings if 0 < h["position"] < total_words})
+        # Groupes de sections consécutives : [début, fin) en mots
+        groups = []
+        for start, end in zip(bounds, bounds[1:]):
+            if (groups and end - groups[-1][0] <= max_words
+                    and min(end - start, groups[-1][1] - groups[-1][0]) < 150):
+                groups[-1][1] = end
+            else:
+                groups.append([start, end])
+
+        chunks = []
+        for group_start, group_end in groups:
+            i = group_start
+            while True:
+                start_idx = max(group_start, i - (max_words - step_words))
+                end_idx = min(i + max_words, group_end)
+                chunk_text = " ".join(words[start_idx:end_idx])
+                chunk_length = end_idx - start_idx
+                chunks.append({
+                    "text": chunk_text,
+                    "part_id": len(chunks) + 1,
+                    "priority": "Basse" if chunk_length < 150 else None,
+                    "source": file_name,
+                    "start_word": start_idx,
+                    "end_word": end_idx,
+                    # Recouvrement seulement à l'intérieur d'une section : un morceau qui ouvre une section n'en a pas
+                    "overlap_words": max(0, chunks[-1]["end_word"] - start_idx) if chunks else 0,
+                    "token_count": count_tokens(chunk_text, self.model)
+                })
+                if end_idx >= group_end:
+                    break
+                i += step_words
+
+        return chunks
+
+    def _chunk_by_tokens(self, text: str, file_name: str) -> list:
+        """
+        Découpe le texte en morceaux d'au plus target_tokens tokens (tokenizer du modèle cible),
+        avec un recouvrement d'au plus overlap_tokens tokens entre morceaux consécutifs.
+        Si snap_to_sentences est actif, les coupures tombent en fin de phrase ; une phrase plus
+        longue que le budget est découpée en mots. Priorité 'Basse' pour les morceaux < 150 mots.
+        """
+        words = text.split()
+        units = self._token_units(words)  # (premier mot, fin exclue, tokens)
+        chunks = []
+        i = 0
+        while i < len(units):
+            j, tokens = i, 0
+            while j < len(units) and (j == i or tokens + units[j][2] <= self.target_tokens):
+                tokens += units[j][2]
+                j += 1
+            start_idx, end_idx = units[i][0], units[j - 1][1]
+            chunk_text = " ".join(words[start_idx:end_idx])
+            chunk_length = end_idx - start_idx
+            chunks.append({
+                "text": chunk_text,
+                "part_id": len(chunks) + 1,
+                "priority": "Basse" if chunk_length < 150 else None,
+                "source": file_name,
+                "start_word": start_idx,
+                "end_word": end_idx,
+                "overlap_words": max(0, chunks[-1]["end_word"] - start_idx) if chunks else 0,
+                "token_count": count_tokens(chunk_text, self.model)
+            })
+            if j >= len(units):
+                break
+            # Le morceau suivant reprend les dernières unités, dans la limite de overlap_tokens
+            k, overlap = j, 0
+            while k - 1 > i and overlap + units[k - 1][2] <= self.overlap_tokens:
+                k -= 1
+                overlap += units[k][2]
+            i = k
+
+        return chunks
+
+    def _token_units(self, words: list) -> list:
+        """
+        Unités insécables du découpage par tokens : phrases (ou mots) avec leur nombre de tokens.
+        Les phrases plus longues que target_tokens sont ramenées à des mots.
+        """
+        if self.snap_to_sentences:
+            spans, start = [], 0
+            for index, word in enumerate(words):
+                if word.rstrip("»\"')]").endswith((".", "!", "?", "…")):
+                    spans.append((start, index + 1))
+                    start = index + 1
+            if start < len(words):
+                spans.append((start, len(words)))
+        else:
+            spans = [(index, index + 1) for index in range(len(words))]
+
+        units = []
+        for start, end in spans:
+            tokens = count_tokens(" " + " ".join(words[start:end]), self.model)
+            if tokens <= self.target_tokens or end - start == 1:
+                units.append((start, end, tokens))
+            else:
+                units.extend((index, index + 1, count_tokens(" " + words[index], self.model)) for index in range(start, end))
+        return units
+
+_HEADING_STYLE_RE = re.compile(r"^(?:heading|titre)\s*(\d+)$", re.IGNORECASE)
+
+
+def _heading_level(style_name: str) -> int:
+    """Niveau d'un style de paragraphe Word : 'Heading 2' / 'Titre 2' -> 2, 'Title' / 'Titre' -> 1, sinon 0."""
+    name = (style_name or "").strip()
+    match = _HEADING_STYLE_RE.match(name)
+    if match:
+        return max(1, int(match.group(1)))
+    return 1 if name.lower() in ("title", "titre") else 0
+
+
+def chunk_payload(chunk: dict, previous_part_id=None, context_words: int = 20) -> str:
+    """
+    Texte à envoyer au LLM pour un morceau. Si le morceau précédent (part_id - 1) vient d'être
+    traité, son recouvrement a déjà été envoyé : seuls les mots nouveaux partent, précédés d'une
+    courte référence aux derniers mots du recouvrement pour garder la continuité.
+
+    Args:
+        chunk (dict): Morceau produit par FileProcessingTool._chunk_text.
+        previous_part_id (int, optional): Morceau traité juste avant dans le même fichier.
+        context_words (int): Nombre de mots du recouvrement rappelés en référence.
+
+    Returns:
+        str: Texte complet du morceau, ou référence + texte nouveau.
+    """
+    text = chunk.get("text") or ""
+    overlap = chunk.get("overlap_words", 0)
+    if not overlap or previous_part_id != chunk.get("part_id", 0) - 1:
+        return text
+    words = text.split()
+    context = " ".join(words[max(0, overlap - context_words):overlap])
+    return (f"[Suite directe du morceau {previous_part_id} : les {overlap} premiers mots, déjà envoyés avec lui, "
+            f"sont omis ; ils se terminent par « {context} »]\n" + " ".join(words[overlap:]))
+
 # Exemple d'utilisation (corrigé)
 # tool = FileProcessingTool()
 # # file_paths = ["Notice_Projet.pdf", "MGDIS - Aiden DATA.pptx"]
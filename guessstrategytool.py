@@ -1,49 +1,146 @@
 from crewai.tools import BaseTool
+from pydantic import Field
 from openai import OpenAI
+from llmclient import chat_completion, structured_chat_completion
+from chunkdecisions import GUESS_JSON_FORMAT, GuessChunkDecision, TraversalPlan
+from llmscheduler import is_fatal
 import os
 import logging
 import sys
-import re
-from typing import List, Tuple
-from fileprocessingtool import FileProcessingTool
-
-# Configuration explicite du logging
-logging.getLogger('').handlers = []
+from typing import List, Optional, Tuple
+from fileprocessingtool import FileProcessingTool, chunk_payload, document_name
+from chunkstore import ChunkStore
+from chunkdedup import DedupReport, find_duplicates
+from runcache import RunCache, file_fingerprint
+from budget import RELEVANCE_INSTRUCTION, RunBudget, relevance_score, strip_relevance_line
+from traversalplan import PLAN_MAX_TOKENS, run_plan, use_plan
+from chunkdigest import table_of_contents
+from documentoutline import format_outline
+from modelregistry import route_models, routing_enabled
+from decisionlog import SKIPPED, DecisionLog
+from relevancefilter import DEFAULT_THRESHOLD, RelevanceClassifier
+from artifacts import RunArtifacts
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.propagate = False
 
-logger.handlers = []
+# Configuration explicite du logging, différée au premier outil instancié :
+# l'import du module ne touche ni aux handlers ni à global_history.log.
+def configure_logging():
+    if logger.handlers:
+        return
+    logging.getLogger('').handlers = []
+
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    # Utiliser StreamHandler sans sys.stdout pour Colab
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
 
-# Utiliser StreamHandler sans sys.stdout pour Colab
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+    file_handler = logging.FileHandler("global_history.log", mode='w', encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
 
-file_handler = logging.FileHandler("global_history.log", mode='w', encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+    logger.info("Configuration du logging en cours...")
+    log_and_print("Logging configuré avec succès. Si ce message n'apparaît pas, il y a un problème avec le logging.")
+    logger.info("Configuration du logging terminée.")
 
 # Fonction pour logger sans duplication
 def log_and_print(message, level="info"):
     getattr(logger, level)(message)  # Utilise uniquement logger
 
-logger.info("Configuration du logging en cours...")
-log_and_print("Logging configuré avec succès. Si ce message n'apparaît pas, il y a un problème avec le logging.")
-logger.info("Configuration du logging terminée.")
+# Instructions du prompt par morceau, communes à tous les appels : envoyées en message
+# système, en tête de requête, pour profiter du cache de prompt des fournisseurs.
+GUESS_CHUNK_INSTRUCTIONS = (
+    "Vous êtes un analyste de projet.\n"
+    "**Objectif** : Tri des chunks pour identifier ceux qui contiennent des informations sur les travaux réalisés dans le projet. "
+    "Ignorez les contenus non pertinents comme les documentations externes, ou cahiers de charge ou tout autre fichier ou chunk non liés aux travaux du projet.\n"
+    "**Stratégie de parcours** : Élaborez une stratégie efficace, surtout pour les fichiers longs (>10 chunks). Vous pouvez :\n"
+    "- Sauter des chunks selon le guess.\n"
+    "- Revenir en arrière selon le guess.\n"
+    "- Arrêter rapidement ('fin') si le fichier semble non pertinent.\n"
+    "**Instructions importantes** : Retournez uniquement un objet JSON de cette forme :\n"
+    f"{GUESS_JSON_FORMAT}\n"
+    "Prochain morceau : numéro entre 1 et le nombre total de morceaux, ou 'fin'.\n"
+    "Étape 1 : Déterminez si ce chunk contient des éléments liés aux travaux réalisés.\n"
+    "Étape 2 : Expliquez brièvement.\n"
+    "Étape 3 : Mettez à jour le guess.\n"
+    "Étape 4 : Choisissez le prochain morceau stratégiquement.\n"
+    "Si un plan du fichier (sections et morceaux) est fourni, servez-vous-en : sautez directement les sections sans lien avec le projet (annexes, guides, documentations externes).\n"
+)
+
+
+def build_chunk_messages(drafting_synthesis: str, file_name: str, file_info: str, total_chunks: int,
+                         processed: List[int], guess: str, chunk: dict, previous_part_id: int = None,
+                         outline: str = "") -> List[dict]:
+    """
+    Construit les messages d'un appel par morceau : préfixe système stable (instructions et
+    synthèse succincte) puis les données variables du morceau à évaluer.
+    Si previous_part_id est le morceau précédent, seul le texte nouveau est envoyé (chunk_payload).
+    outline est le plan du fichier (format_outline), omis si le document n'a pas de titres.
+    """
+    system = f"{GUESS_CHUNK_INSTRUCTIONS}\nLa synthèse succincte du projet est : {drafting_synthesis}."
+    outline_block = f"Plan du fichier (sections et morceaux) :\n{outline}\n" if outline else ""
+    user = (
+        f"Vous travaillez sur le fichier '{file_name}' (total chunks : {total_chunks}).\n"
+        f"Informations sur le fichier : {file_info}.\n"
+        f"Guess actuel sur le fichier : {guess}.\n"
+        f"Morceaux déjà analysés : {processed}.\n"
+        f"{outline_block}"
+        f"Voici le morceau à évaluer :\n"
+        f"Morceau {chunk['part_id']} : {chunk_payload(chunk, previous_part_id).strip() or 'Morceau vide'}"
+    )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
 
 class GuessStrategyTool(BaseTool):
     name: str = "guess_strategy_tool"
     description: str = "Outil pour évaluer la pertinence des chunks et élaborer une stratégie de parcours des documents."
     llm_provider: str = "The LLM provider"
+    incremental: bool = True  # Réutilise les résultats des fichiers inchangés depuis la dernière exécution
+    # Budget global de l'exécution (None : sans limite, ou BUDGET_MAX_CALLS/TOKENS/SECONDS)
+    max_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    # Parcours : "walk" (adaptatif, un appel par saut), "plan" (plan sur la table des matières puis
+    # évaluation en parallèle) ou "auto" (plan pour les fichiers d'au moins PLAN_MIN_CHUNKS morceaux)
+    traversal: str = Field(default_factory=lambda: os.getenv("TRAVERSAL_MODE", "walk"))
+    # Routage par tâche (modelregistry) : tous les appels de l'outil (synthèse succincte, guess,
+    # plan, pertinence des morceaux) sur le modèle rapide. Désactivé : modèle phare partout.
+    model_routing: bool = Field(default_factory=routing_enabled)
+    # Pré-filtre local (relevancefilter) : morceaux jugés non pertinents écartés sans appel LLM,
+    # si un modèle a été entraîné (RELEVANCE_MODEL_PATH). RELEVANCE_PREFILTER=0 le désactive.
+    prefilter: bool = Field(default_factory=lambda: os.getenv("RELEVANCE_PREFILTER", "1") != "0")
+    # Répertoire des artefacts (artifacts) ; None : un répertoire neuf par exécution sous ARTIFACTS_ROOT
+    output_dir: Optional[str] = None
+    # Hedging xAI/OpenAI de cet outil (llmclient) ; None : réglage du processus (LLM_HEDGING)
+    hedging: Optional[bool] = None
     
-    def __init__(self, llm_provider: str = "xai"):
+    def __init__(self, llm_provider: str = "xai", incremental: bool = True, max_calls: Optional[int] = None,
+                 max_tokens: Optional[int] = None, max_seconds: Optional[float] = None, traversal: Optional[str] = None,
+                 model_routing: Optional[bool] = None, prefilter: Optional[bool] = None,
+                 output_dir: Optional[str] = None, hedging: Optional[bool] = None):
         super().__init__()
+        configure_logging()
         self.llm_provider = llm_provider.lower()
+        self.incremental = incremental
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        if traversal is not None:
+            self.traversal = traversal
+        if model_routing is not None:
+            self.model_routing = model_routing
+        if prefilter is not None:
+            self.prefilter = prefilter
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if hedging is not None:
+            self.hedging = hedging
         log_and_print(f"Outil initialisé avec llm_provider : {self.llm_provider}")
 
     def _run(self, file_paths: List[str], file_infos: List[str], project_synthesis: str) -> List[Tuple[str, int]]:
@@ -52,191 +149,380 @@ class GuessStrategyTool(BaseTool):
         # Étape 1 : Configurer le LLM
         if self.llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
-            model_id = "grok-3-beta"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
         else:
             api_key = os.getenv("OPENAI_API_KEY")
             base_url = None
-            model_id = "gpt-4o"
         if not api_key:
             log_and_print(f"Clé API pour {self.llm_provider.upper()}_API_KEY non définie.", "error")
             return []
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        log_and_print(f"LLM configuré avec provider : {self.llm_provider}")
-
-        # Étape 2 : Générer une synthèse succincte pour guider l'évaluation
-        synthesis_prompt = (
-            f"Vous êtes un expert en synthèse de projets. À partir de cette synthèse détaillée : '{project_synthesis}', "
-            f"créez une version succincte et percutante (maximum 50 mots) pour guider l'évaluation de pertinence des fichiers. "
-            f"Cette synthèse doit refléter les objectifs clés sans détails superflus."
-        )
-        try:
-            response = client.chat.completions.create(
-                model=model_id,
-                messages=[{"role": "user", "content": synthesis_prompt}],
-                max_tokens=60,
-                temperature=0.3
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
+        # Le modèle de rédaction n'est pas appelé ici : son tokenizer découpe les fichiers comme
+        # DirectDraftingTool, pour que les part_id retenus désignent les mêmes morceaux
+        models = route_models(self.llm_provider, ("condensation", "guess", "planning", "relevance", "drafting"),
+                              self.model_routing)
+        log_and_print(f"LLM configuré avec provider : {self.llm_provider}, modèles : {models}")
+        # Budget de l'exécution : les appels de cet outil comptent à partir d'ici
+        budget = RunBudget(self.name, self.max_calls, self.max_tokens, self.max_seconds)
+
+        # Cache des résultats par fichier (relance incrémentale), tenu si RUN_CACHE_PATH est défini
+        run_cache = RunCache.open_default() if self.incremental else None
+        # Décisions par morceau journalisées (jeu d'entraînement du pré-filtre), pré-filtre s'il est entraîné
+        decision_log = DecisionLog.open_default()
+        classifier = RelevanceClassifier.open_default() if self.prefilter else None
+        prefiltered_count = 0
+        if classifier:
+            log_and_print(f"Pré-filtre de pertinence chargé (seuil {DEFAULT_THRESHOLD:g}).")
+
+        # Étape 2 : Générer une synthèse succincte pour guider l'évaluation (réutilisée tant que la
+        # synthèse du projet ne change pas, pour garder des empreintes de fichiers stables)
+        drafting_synthesis = run_cache.get_synthesis(self.name, self.llm_provider, models["condensation"], project_synthesis) if run_cache else None
+        if drafting_synthesis:
+            log_and_print(f"Synthèse succincte réutilisée : {drafting_synthesis}")
+        else:
+            synthesis_prompt = (
+                f"Vous êtes un expert en synthèse de projets. À partir de cette synthèse détaillée : '{project_synthesis}', "
+                f"créez une version succincte et percutante (maximum 50 mots) pour guider l'évaluation de pertinence des fichiers. "
+                f"Cette synthèse doit refléter les objectifs clés sans détails superflus."
             )
-            drafting_synthesis = response.choices[0].message.content.strip()
-            log_and_print(f"Synthèse succincte générée : {drafting_synthesis}")
-        except Exception as e:
-            log_and_print(f"Erreur lors de la génération de la synthèse succincte : {str(e)}", "error")
-            drafting_synthesis = "Projet axé sur des objectifs stratégiques et techniques, nécessitant une analyse ciblée."
+            try:
+                response = chat_completion(
+                    client, self.name, self.llm_provider,
+                    hedging=self.hedging,
+                    scope=budget.scope,
+                    model=models["condensation"],
+                    messages=[{"role": "user", "content": synthesis_prompt}],
+                    max_tokens=60,
+                    temperature=0.3
+                )
+                drafting_synthesis = response.choices[0].message.content.strip()
+                log_and_print(f"Synthèse succincte générée : {drafting_synthesis}")
+                if run_cache:
+                    run_cache.put_synthesis(self.name, self.llm_provider, models["condensation"], project_synthesis, drafting_synthesis)
+            except Exception as e:
+                log_and_print(f"Erreur lors de la génération de la synthèse succincte : {str(e)}", "error")
+                drafting_synthesis = "Projet axé sur des objectifs stratégiques et techniques, nécessitant une analyse ciblée."
 
         # Étape 3 : Extraire et découper tous les fichiers avec FileProcessingTool
-        file_processor = FileProcessingTool()
-        all_chunks = file_processor._run(file_paths)
-        log_and_print(f"Extraction des chunks terminée. Nombre total de chunks : {len(all_chunks)}")
+        file_processor = FileProcessingTool(model=models["drafting"])  # Même découpage que l'outil de rédaction
+        chunk_store = ChunkStore()  # Morceaux écrits sur disque au fil du découpage, relus un par un
+        for error in file_processor.process_to_store(file_paths, chunk_store):
+            log_and_print(f"Erreur dans chunk : {error}", "warning")
 
-        if not all_chunks or all(chunk.get("error") for chunk in all_chunks):
+        # Étape 4 : Nombre de morceaux par fichier (les textes restent dans le magasin)
+        chunks_by_file = chunk_store.counts_by_source()
+        log_and_print(f"Extraction des chunks terminée. Nombre total de chunks : {sum(chunks_by_file.values())}")
+
+        if not chunks_by_file:
             log_and_print("Aucun fichier n’a pu être traité.", "error")
+            chunk_store.close()
+            if run_cache:
+                run_cache.close()
+            if decision_log:
+                decision_log.close()
             return []
-
-        # Étape 4 : Organiser les morceaux par fichier
-        chunks_by_file = {}
-        for chunk in all_chunks:
-            if "error" in chunk:
-                log_and_print(f"Erreur dans chunk : {chunk['error']}", "warning")
-                continue
-            file_name = os.path.basename(chunk["source"])  # Utiliser le nom original du fichier
-            if file_name not in chunks_by_file:
-                chunks_by_file[file_name] = []
-            chunks_by_file[file_name].append(chunk)
         log_and_print(f"Organisation des chunks par fichier terminée. Fichiers trouvés : {list(chunks_by_file.keys())}")
 
+        # Quasi-doubles entre fichiers (révisions d'un même document) : un morceau dont le double
+        # a déjà été traité avec succès est sauté
+        sources = [document_name(p) for p in file_paths if document_name(p) in chunks_by_file]
+        dedup = DedupReport(find_duplicates(chunk_store, sources))
+        handled_chunks = set()  # (fichier, part_id) traités avec succès
+        if dedup.duplicates:
+            log_and_print(f"{len(dedup.duplicates)} morceau(x) quasi identique(s) à un morceau d'un autre fichier.")
+
         # Étape 5 : Initialiser les structures
         file_guesses = {}  # Stocke les guesses pour chaque fichier
+        file_scores = {}  # Pertinence estimée par le guess initial (ordre de traitement sous budget)
         processed_chunks = {}  # Stocke les chunks déjà analysés
-        chunks_to_draft = []  # Liste des (file_name, part_id) à envoyer pour rédaction
+        deferred_chunks = {}  # Morceaux de priorité 'Basse' remis en fin de parcours (sous budget)
+        file_pertinent = {}  # part_id pertinents par fichier, assemblés dans l'ordre des fichiers
+        reused_files = set()  # Fichiers dont le résultat précédent est réutilisé
+        pending_files = []  # (file_name, file_info, fingerprint) des fichiers à parcourir
+        failed_files = set()
+        truncated_files = set()  # Parcours interrompu par le budget : résultat non mis en cache
+        depends_on = {}  # Fichiers dont un morceau double a permis de sauter un appel
+        last_part_ids = {}  # Dernier morceau traité avec succès (son recouvrement a été envoyé)
+        file_outlines = {}  # Plan du fichier (sections et morceaux) joint aux appels par morceau
 
-        # Étape 6 : Boucle sur les fichiers avec zip(file_paths, file_infos)
+        # Étape 6 : Fichiers inchangés, puis guess initial de chaque fichier à parcourir
         for file_path, file_info in zip(file_paths, file_infos):
-            file_name = os.path.basename(file_path)  # Utiliser le nom original du fichier
+            file_name = document_name(file_path)  # Nom original (chemin ou fichier en mémoire)
             log_and_print(f"Nom de fichier extrait de file_path : {file_name}", "debug")
             if file_name not in chunks_by_file:
                 log_and_print(f"Aucun contenu trouvé pour le fichier : {file_name}", "warning")
                 continue
 
-            file_chunks = chunks_by_file[file_name]
-            total_chunks = len(file_chunks)
-            if file_name not in processed_chunks:
-                processed_chunks[file_name] = []
+            # Fichier inchangé depuis la dernière exécution : morceaux pertinents réutilisés, si les
+            # fichiers dont il a sauté des doubles sont eux aussi inchangés
+            fingerprint = file_fingerprint(
+                file_path, file_info=file_info, synthesis=drafting_synthesis, provider=self.llm_provider,
+                models=models, chunking=file_processor.chunking, clean_text=file_processor.clean_text,
+                traversal=self.traversal, outline=file_processor.outline,
+                prefilter=f"{classifier.fingerprint}@{DEFAULT_THRESHOLD:g}" if classifier else None
+            ) if run_cache else None
+            cached = run_cache.lookup(self.name, file_name, fingerprint) if run_cache else None
+            if cached is not None and set(cached["depends_on"]) <= reused_files:
+                file_pertinent[file_name] = list(cached["pertinent"])
+                handled_chunks.update((file_name, part_id) for part_id in cached["handled"])
+                reused_files.add(file_name)
+                log_and_print(f"{file_name} inchangé depuis la dernière exécution : évaluation réutilisée.")
+                continue
+            file_pertinent[file_name] = []
+            processed_chunks[file_name] = []
+            deferred_chunks[file_name] = []
+            depends_on[file_name] = set()
+            last_part_ids[file_name] = None
+            file_outlines[file_name] = format_outline(chunk_store.outline(file_name))
 
-            # Guess initial pour le fichier
+            # Guess initial pour le fichier (avec une note de pertinence sous budget, pour ordonner les fichiers)
             initial_prompt = (
                 f"Vous êtes un analyste de projet. À partir de la synthèse du projet : '{project_synthesis}', "
                 f"du nom du fichier : '{file_name}', et des informations suivantes : {file_info}, "
                 f"estimez la pertinence de ce fichier pour rédiger des travaux réalisés dans le projet. "
                 f"Fournissez une estimation (max 90 mots) en expliquant si le fichier contient des éléments "
                 f"techniques, stratégiques ou directement liés aux travaux réalisés, ou s'il est non pertinent (ex. documentation d'une librarie python ou autre solution, cahier de charge non lié, etc. tout ce qui ne renseigne pas sur ce qui a été fait dans le projet)."
+                f"{' ' + RELEVANCE_INSTRUCTION if budget.active else ''}"
             )
+            messages = [{"role": "user", "content": initial_prompt}]
+            if not budget.allows(messages, 200):
+                log_and_print(f"{file_name} non évalué : budget épuisé.", "warning")
+                truncated_files.add(file_name)
+                continue
             try:
-                response = client.chat.completions.create(
-                    model=model_id,
-                    messages=[{"role": "user", "content": initial_prompt}],
+                response = chat_completion(
+                    client, self.name, self.llm_provider,
+                    hedging=self.hedging,
+                    scope=budget.scope,
+                    chunk_id=file_name,
+                    model=models["guess"],
+                    messages=messages,
                     max_tokens=200,
                     temperature=0.5
                 )
                 current_guess = response.choices[0].message.content.strip()
-                file_guesses[file_name] = current_guess
+                file_guesses[file_name] = strip_relevance_line(current_guess)
+                file_scores[file_name] = relevance_score(current_guess)
                 log_and_print(f"Guess initial pour {file_name} : {current_guess}")
             except Exception as e:
                 log_and_print(f"Erreur guess initial pour {file_name} : {str(e)}", "error")
+                failed_files.add(file_name)
                 continue
+            pending_files.append((file_name, file_info, fingerprint))
+
+        def next_unprocessed(file_name: str, part_id: int):
+            """Premier morceau après part_id ni analysé ni différé, ou 'fin'."""
+            skipped = set(processed_chunks[file_name]) | set(deferred_chunks[file_name])
+            return next((p for p in range(part_id + 1, chunks_by_file[file_name] + 1) if p not in skipped), "fin")
+
+        def prefiltered(file_name: str, part_id: int, chunk: dict) -> bool:
+            """Vrai si le pré-filtre écarte le morceau (non pertinent, sans appel LLM)."""
+            nonlocal prefiltered_count
+            if not classifier or not classifier.is_irrelevant(chunk.get("text") or ""):
+                return False
+            processed_chunks[file_name].append(part_id)
+            prefiltered_count += 1
+            log_and_print(f"Morceau {part_id} de {file_name} écarté par le pré-filtre de pertinence : appel évité.", "debug")
+            return True
+
+        def call_chunk(file_name: str, part_id: int, messages: List[dict]):
+            return structured_chat_completion(
+                client, self.name, self.llm_provider, GuessChunkDecision,
+                hedging=self.hedging,
+                scope=budget.scope,
+                chunk_id=f"{file_name}#{part_id}",
+                validation_context={"total_chunks": chunks_by_file[file_name]},
+                model=models["relevance"],
+                messages=messages,
+                max_tokens=400,
+                temperature=0.5
+            )
 
-            # Boucle pour analyser les morceaux et élaborer une stratégie
+        def record_decision(file_name: str, part_id: int, decision: GuessChunkDecision, result: str):
+            """Enregistre la réponse validée d'un morceau : guess mis à jour, morceau retenu s'il est pertinent."""
+            log_and_print(f"Réponse LLM pour morceau {part_id} : {result}")
+            file_guesses[file_name] = decision.guess.strip() or file_guesses[file_name]
+            last_part_ids[file_name] = part_id
+            handled_chunks.add((file_name, part_id))
+            if decision_log:
+                decision_log.record(self.name, file_name, part_id, chunk_store.text(file_name, part_id),
+                                    decision.pertinent == "oui", model=models["relevance"])
+
+            # Si pertinent, ajouter le chunk à rédiger
+            if decision.pertinent == "oui":
+                file_pertinent[file_name].append(part_id)
+                log_and_print(f"Morceau {part_id} de {file_name} marqué comme pertinent pour rédaction.")
+
+        def record_error(file_name: str, part_id: int, e: Exception):
+            log_and_print(f"Erreur lors de l'évaluation du morceau {part_id} pour {file_name} : {str(e)}", "error")
+            failed_files.add(file_name)
+
+        def assess_chunk(file_name: str, file_info: str, part_id: int, final_pass: bool = False):
+            """
+            Évalue un morceau et retourne le prochain morceau à analyser ('fin' pour arrêter le
+            fichier), ou None si le budget ne permet pas l'appel. Hors passe finale, un morceau
+            de priorité 'Basse' est différé quand un budget est fixé.
+            """
+            total_chunks = chunks_by_file[file_name]
+            current_chunk = chunk_store.get(file_name, part_id)
+            if budget.active and not final_pass and current_chunk.get("priority") == "Basse":
+                if part_id not in deferred_chunks[file_name]:
+                    deferred_chunks[file_name].append(part_id)
+                    log_and_print(f"Morceau {part_id} de {file_name} de priorité basse : différé.", "debug")
+                return next_unprocessed(file_name, part_id)
+            original = dedup.duplicates.get((file_name, part_id))
+            if original in handled_chunks and dedup.skip((file_name, part_id)):
+                processed_chunks[file_name].append(part_id)
+                log_and_print(f"Morceau {part_id} de {file_name} quasi identique à {original[0]}#{original[1]}, déjà traité : appel évité.")
+                depends_on[file_name].add(original[0])
+                return next_unprocessed(file_name, part_id)
+            if prefiltered(file_name, part_id, current_chunk):
+                return next_unprocessed(file_name, part_id)
+
+            # Évaluer la pertinence du chunk : instructions fixes (préfixe mis en cache) puis données du morceau
+            messages = build_chunk_messages(drafting_synthesis, file_name, file_info, total_chunks,
+                                            processed_chunks[file_name] + [part_id], file_guesses[file_name],
+                                            current_chunk, previous_part_id=last_part_ids[file_name],
+                                            outline=file_outlines[file_name])
+            if not budget.allows(messages, 400):
+                return None
+            processed_chunks[file_name].append(part_id)
+            log_and_print(f"Traitement du morceau {part_id} pour {file_name}.", "debug")
+            try:
+                decision, result = call_chunk(file_name, part_id, messages)
+                record_decision(file_name, part_id, decision, result)
+                return decision.prochain_morceau
+
+            except Exception as e:
+                record_error(file_name, part_id, e)
+                # Après les réessais de llmscheduler, on continue au morceau suivant non analysé
+                return "fin" if is_fatal(e) else next_unprocessed(file_name, part_id)
+
+        def plan_file(file_name: str, file_info: str):
+            """
+            Mode plan (traversalplan.run_plan) : un appel choisit les morceaux à évaluer sur la table
+            des matières du fichier, puis ces morceaux sont évalués en parallèle.
+
+            Returns:
+                bool: True si le plan a été exécuté jusqu'au bout, False si le budget l'a
+                interrompu, None si le plan n'a pas pu être obtenu (parcours adaptatif à la place).
+            """
+            total_chunks = chunks_by_file[file_name]
+
+            def call_plan(messages: List[dict]) -> TraversalPlan:
+                plan, _ = structured_chat_completion(
+                    client, self.name, self.llm_provider, TraversalPlan,
+                    hedging=self.hedging,
+                    scope=budget.scope,
+                    chunk_id=f"{file_name}#plan",
+                    validation_context={"total_chunks": total_chunks},
+                    model=models["planning"],
+                    messages=messages,
+                    max_tokens=PLAN_MAX_TOKENS,
+                    temperature=0.3
+                )
+                return plan
+
+            def prepare_chunk(part_id: int, planned: List[int], guess: str):
+                original = dedup.duplicates.get((file_name, part_id))
+                if original in handled_chunks and dedup.skip((file_name, part_id)):
+                    processed_chunks[file_name].append(part_id)
+                    depends_on[file_name].add(original[0])
+                    return None
+                chunk = chunk_store.get(file_name, part_id)
+                if prefiltered(file_name, part_id, chunk):
+                    return None
+                # Appels parallèles indépendants : morceau complet, recouvrement compris
+                return build_chunk_messages(drafting_synthesis, file_name, file_info, total_chunks, planned, guess,
+                                            chunk, previous_part_id=None, outline=file_outlines[file_name])
+
+            complete, file_guesses[file_name] = run_plan(
+                budget, "évaluer s'ils décrivent des travaux réalisés dans le projet", drafting_synthesis, file_name, file_info, total_chunks,
+                file_guesses[file_name], table_of_contents(chunk_store, file_name), call_plan, prepare_chunk, 400,
+                call_chunk, record_decision, record_error, processed_chunks[file_name], log_and_print)
+            return complete
+
+        # Étape 7 : Parcours des fichiers, les plus pertinents d'abord si un budget est fixé
+        file_order = budget.rank([name for name, _, _ in pending_files], file_scores)
+        pending_by_name = {name: (file_info, fingerprint) for name, file_info, fingerprint in pending_files}
+        if budget.active:
+            log_and_print("Ordre de traitement sous budget : " + ", ".join(
+                f"{name} ({file_scores[name]:g}/10)" for name in file_order))
+        for file_name in file_order:
+            file_info = pending_by_name[file_name][0]
+            total_chunks = chunks_by_file[file_name]
+            if use_plan(self.traversal, total_chunks):
+                planned = plan_file(file_name, file_info)
+                if planned is not None:
+                    if not planned:
+                        truncated_files.add(file_name)
+                    continue
             next_part_id = 1
             while next_part_id and next_part_id != "fin" and (isinstance(next_part_id, int) or next_part_id.isdigit()) and 1 <= int(next_part_id) <= total_chunks:
+                next_part_id = int(next_part_id)
                 if next_part_id in processed_chunks[file_name]:
                     log_and_print(f"Morceau {next_part_id} déjà analysé pour {file_name}", "warning")
                     break
+                next_part_id = assess_chunk(file_name, file_info, next_part_id)
+                if next_part_id is None:
+                    truncated_files.add(file_name)
+                    break
 
-                current_chunk = file_chunks[next_part_id - 1]
-                processed_chunks[file_name].append(next_part_id)
-                log_and_print(f"Traitement du morceau {next_part_id} pour {file_name}.", "debug")
-
-                # Évaluer la pertinence du chunk avec une stratégie efficace
-                prompt = (
-                    f"Vous êtes un analyste de projet. La synthèse succincte du projet est : {drafting_synthesis}.\n"
-                    f"Vous travaillez sur le fichier '{file_name}' (total chunks : {total_chunks}).\n"
-                    f"Informations sur le fichier : {file_info}.\n"
-                    f"Guess actuel sur le fichier : {file_guesses[file_name]}.\n"
-                    f"Morceaux déjà analysés : {processed_chunks[file_name]}.\n"
-                    f"Voici le morceau à évaluer :\n"
-                    f"Morceau {current_chunk['part_id']} : {current_chunk['text'].strip() if current_chunk['text'] else 'Morceau vide'}\n\n"
-                    f"**Objectif** : Tri des chunks pour identifier ceux qui contiennent des informations sur les travaux réalisés dans le projet. "
-                    f"Ignorez les contenus non pertinents comme les documentations externes, ou cahiers de charge ou tout autre fichier ou chunk non liés aux travaux du projet.\n"
-                    f"**Stratégie de parcours** : Élaborez une stratégie efficace, surtout pour les fichiers longs (>10 chunks). Vous pouvez :\n"
-                    f"- Sauter des chunks selon le guess.\n"
-                    f"- Revenir en arrière selon le guess.\n"
-                    f"- Arrêter rapidement ('fin') si le fichier semble non pertinent.\n"
-                    f"**Instructions importantes** : Retournez une réponse dans ce format exact :\n"
-                    f"Pertinent: oui ou non\n"
-                    f"Explication: raison de la décision (max 40 mots)\n"
-                    f"Guess: nouveau guess (max 80 mots)\n"
-                    f"Prochain morceau: numéro entre 1 et {total_chunks} ou 'fin'\n"
-                    f"Étape 1 : Déterminez si ce chunk contient des éléments liés aux travaux réalisés.\n"
-                    f"Étape 2 : Expliquez brièvement.\n"
-                    f"Étape 3 : Mettez à jour le guess.\n"
-                    f"Étape 4 : Choisissez le prochain morceau stratégiquement."
-                )
-                try:
-                    response = client.chat.completions.create(
-                        model=model_id,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=400,
-                        temperature=0.5
-                    )
-                    result = response.choices[0].message.content.strip()
-                    log_and_print(f"Réponse LLM pour morceau {next_part_id} : {result}")
-
-                    # Parser la réponse
-                    lines = result.split("\n")
-                    pertinent = "non"
-                    new_guess = file_guesses[file_name]
-                    next_part = None
-
-                    for line in lines:
-                        line = line.strip()
-                        if line.lower().startswith("pertinent:"):
-                            pertinent = line.replace("Pertinent:", "").replace("Pertinent :", "").strip().lower()
-                        elif re.match(r"Guess\s*:\s*.+", line):
-                            match = re.match(r"Guess\s*:\s*(.+)", line)
-                            if match:
-                                new_guess = match.group(1).strip()
-                                file_guesses[file_name] = new_guess
-                        elif re.match(r"Prochain morceau\s*:\s*\w+", line):
-                            match = re.match(r"Prochain morceau\s*:\s*(\w+)", line)
-                            if match:
-                                next_part_str = match.group(1).strip()
-                                next_part = int(next_part_str) if next_part_str.isdigit() else next_part_str
-                            else:
-                                log_and_print(f"Format inattendu pour 'Prochain morceau' : {line}", "warning")
-                                next_part = "fin"  # Par défaut si mal formaté
-
-                    if next_part is None:
-                        log_and_print(f"Échec du parsing de 'Prochain morceau' pour {file_name}, morceau {next_part_id}. Réponse : {result}", "error")
-                        next_part = "fin"
-
-                    # Si pertinent, ajouter le chunk à rédiger
-                    if pertinent == "oui":
-                        chunks_to_draft.append((file_name, next_part_id))
-                        log_and_print(f"Morceau {next_part_id} de {file_name} marqué comme pertinent pour rédaction.")
-
-                    next_part_id = next_part
-
-                except Exception as e:
-                    log_and_print(f"Erreur lors de l'évaluation du morceau {next_part_id} pour {file_name} : {str(e)}", "error")
-                    next_part_id = "fin"
-
-        # Étape 7 : Sauvegarder les chunks pertinents dans un fichier pour l'utilisateur
+        # Étape 8 : Morceaux différés, dans le budget restant
+        for file_name in file_order:
+            for part_id in deferred_chunks[file_name]:
+                if part_id in processed_chunks[file_name]:
+                    continue
+                if assess_chunk(file_name, pending_by_name[file_name][0], part_id, final_pass=True) is None:
+                    truncated_files.add(file_name)
+                    break
+
+        # Résultats des fichiers entièrement parcourus mis en cache pour la prochaine exécution
+        if run_cache:
+            for file_name in file_order:
+                if file_name in failed_files or file_name in truncated_files:
+                    continue
+                run_cache.store(self.name, file_name, pending_by_name[file_name][1], {
+                    "pertinent": file_pertinent[file_name],
+                    "handled": sorted(part_id for source, part_id in handled_chunks if source == file_name),
+                    "depends_on": sorted(depends_on[file_name]),
+                })
+
+        # Morceaux jamais choisis par le parcours des fichiers terminés : étiquettes faibles du journal
+        if decision_log:
+            for file_name in file_order:
+                if file_name in failed_files or file_name in truncated_files:
+                    continue
+                for part_id in range(1, chunks_by_file[file_name] + 1):
+                    if part_id not in processed_chunks[file_name]:
+                        decision_log.record(self.name, file_name, part_id, chunk_store.text(file_name, part_id),
+                                            False, kind=SKIPPED)
+            decision_log.close()
+        if classifier:
+            log_and_print(f"Pré-filtre de pertinence : {prefiltered_count} morceau(x) écarté(s) sans appel LLM.")
+
+        chunk_store.close()
+        log_and_print(dedup.summary())
+        if run_cache:
+            run_cache.close()
+            log_and_print(f"Relance incrémentale : {len(reused_files)} fichier(s) réutilisé(s) sur {len(sources)}.")
+
+        # Morceaux pertinents dans l'ordre des fichiers ; sous budget, dans l'ordre des morceaux (différés inclus)
+        chunks_to_draft = [(file_name, part_id) for file_name, part_ids in file_pertinent.items()
+                           for part_id in (sorted(part_ids) if budget.active else part_ids)]
+        if budget.active:
+            log_and_print(budget.summary())
+            if budget.exhausted_reason:
+                log_and_print(f"Budget épuisé ({budget.exhausted_reason}) : résultat partiel, fichier(s) non terminé(s) : "
+                              f"{', '.join(sorted(truncated_files))}.", "warning")
+
+        # Étape 9 : Sauvegarder les chunks pertinents pour l'utilisateur, dans le répertoire de l'exécution
         if chunks_to_draft:
             try:
-                with open("chunks_to_draft.txt", "w", encoding="utf-8") as f:
-                    for file_name, part_id in chunks_to_draft:
-                        f.write(f"{file_name},{part_id}\n")
-                log_and_print(f"Chunks pertinents sauvegardés dans chunks_to_draft.txt : {chunks_to_draft}")
+                output_path = RunArtifacts.for_run(self.name, self.output_dir).write_text(
+                    "chunks_to_draft.txt", "".join(f"{file_name},{part_id}\n" for file_name, part_id in chunks_to_draft))
+                log_and_print(f"Chunks pertinents sauvegardés dans {output_path} : {chunks_to_draft}")
             except Exception as e:
                 log_and_print(f"Erreur lors de la sauvegarde dans chunks_to_draft.txt : {str(e)}", "error")
 
@@ -1,5 +1,6 @@
 from crewai.tools import BaseTool
 from openai import OpenAI
+from llmclient import chat_completion
 from typing import Optional
 import os
 from searchtool import SearchTool
@@ -8,7 +9,7 @@ class InnovationAnalysisTool(BaseTool):
     name: str = "innovation_analysis_tool"  # Nom de l'outil avec annotation de type
     description: str = "Outil pour analyser si une solution est innovante par rapport au marché en utilisant des données du site de la solution si fourni."  # Description mise à jour
 
-    def _run(self, synthesis: str, solution_name: str, company_name: str, website_url: Optional[str] = None, llm_provider: str = "xai") -> str:
+    def _run(self, synthesis: str, solution_name: str, company_name: str, website_url: Optional[str] = None, llm_provider: str = "xai", hedging: Optional[bool] = None) -> str:
         """
         Analyse si la solution décrite dans la synthèse est innovante par rapport au marché.
         Args:
@@ -17,6 +18,7 @@ class InnovationAnalysisTool(BaseTool):
             company_name (str): Nom de l'entreprise (ex. "Ekonsilio").
             website_url (str, optional): URL du site de la solution (ex. "www.ekonsilio.com"). Si None, aucune recherche n'est effectuée.
             llm_provider (str): Fournisseur du LLM ("xai" ou "openai"). Par défaut "xai".
+            hedging (bool, optional): Hedging xAI/OpenAI pour cet appel. Par défaut, réglage du processus.
         Returns:
             str: Analyse sous forme de texte structuré.
         """
@@ -24,7 +26,7 @@ class InnovationAnalysisTool(BaseTool):
         # Configure le client selon le fournisseur
         if llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
             model_id = "grok-3-beta"  # Modèle générique pour xAI, à ajuster si nécessaire
         else:  # openai
             api_key = os.getenv("OPENAI_API_KEY")
@@ -33,7 +35,7 @@ class InnovationAnalysisTool(BaseTool):
         if not api_key:
             return f"Erreur : Clé API pour {llm_provider.upper()}_API_KEY non définie dans les variables d'environnement"
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
 
         # Étape 1 : Recherche sur le site de la solution si un URL est fourni
         website_info = ""
@@ -78,7 +80,9 @@ class InnovationAnalysisTool(BaseTool):
         )
 
         try:
-            analysis_response = client.chat.completions.create(
+            analysis_response = chat_completion(
+                client, self.name, llm_provider,
+                hedging=hedging,
                 model=model_id,
                 messages=[
                     {"role": "system", "content": "Vous êtes un analyste stratégique spécialisé dans l'innovation technologique."},
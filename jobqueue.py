@@ -0,0 +1,184 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional
+
+# File de tâches durable sur SQLite, partageable entre machines via un système de fichiers
+# commun : les workers prennent une tâche avec un bail (lease) à durée limitée, le renouvellent
+# pendant l'exécution puis la terminent. Un worker disparu laisse expirer son bail et la tâche
+# est reprise par un autre ; les tâches sont idempotentes (sorties réécrites, cache de relance).
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+DEFAULT_LEASE_S = float(os.getenv("JOB_LEASE_S", 300))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+_COLUMNS = ("id", "key", "kind", "payload", "after", "status", "attempts", "max_attempts",
+            "lease_owner", "lease_expires", "result", "error", "created", "updated")
+
+
+def worker_id() -> str:
+    """Identifiant unique d'un worker : machine, processus et suffixe aléatoire."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """
+    Tâches identifiées par une clé unique (enqueue idempotent), avec dépendances (`after` :
+    clés des tâches à terminer avant), bail renouvelable et nombre de tentatives borné.
+
+    Sur un système de fichiers réseau (NFS, SMB), le mode WAL de SQLite n'est pas fiable :
+    utiliser wal=False (journal classique, verrous de fichier).
+    """
+
+    def __init__(self, path: str, wal: bool = True, busy_timeout_s: float = 30.0):
+        self.path = path
+        # isolation_level=None : transactions explicites (BEGIN IMMEDIATE) pour la prise de bail
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_s, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL, after TEXT NOT NULL DEFAULT '[]', status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+            " lease_owner TEXT, lease_expires REAL, result TEXT, error TEXT,"
+            " created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def enqueue(self, key: str, kind: str, payload: dict, after: List[str] = None,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> bool:
+        """
+        Ajoute une tâche ; sans effet si une tâche de même clé existe déjà.
+
+        Returns:
+            bool: True si la tâche a été ajoutée.
+        """
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO jobs (key, kind, payload, after, status, max_attempts, created, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, kind, json.dumps(payload, ensure_ascii=False), json.dumps(after or []), PENDING,
+             max_attempts, now, now))
+        return cursor.rowcount == 1
+
+    def lease(self, owner: str, lease_s: float = DEFAULT_LEASE_S, kinds: List[str] = None) -> Optional[dict]:
+        """
+        Prend la plus ancienne tâche disponible : en attente, ou dont le bail a expiré, et dont
+        toutes les dépendances sont terminées. Une tâche qui a épuisé ses tentatives (bail
+        expiré) passe en échec, comme celles dont une dépendance a échoué.
+
+        Returns:
+            dict: La tâche (payload décodé), ou None si aucune n'est disponible.
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?)"
+                " ORDER BY id", (PENDING, LEASED, now)).fetchall()
+            statuses = None
+            for row in rows:
+                job = dict(zip(_COLUMNS, row))
+                if kinds and job["kind"] not in kinds:
+                    continue
+                if job["attempts"] >= job["max_attempts"]:
+                    self._set_failed(job["id"], f"Bail expiré après {job['attempts']} tentative(s).", now)
+                    continue
+                after = json.loads(job["after"])
+                if after:
+                    if statuses is None:
+                        statuses = dict(self._conn.execute("SELECT key, status FROM jobs"))
+                    if any(statuses.get(dep) == FAILED for dep in after):
+                        self._set_failed(job["id"], "Une tâche dont elle dépend a échoué.", now)
+                        statuses[job["key"]] = FAILED
+                        continue
+                    if any(statuses.get(dep) != DONE for dep in after):
+                        continue
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated = ?"
+                    " WHERE id = ?", (LEASED, owner, now + lease_s, now, job["id"]))
+                self._conn.execute("COMMIT")
+                job.update(status=LEASED, attempts=job["attempts"] + 1, lease_owner=owner,
+                           lease_expires=now + lease_s, payload=json.loads(job["payload"]), after=after)
+                return job
+            self._conn.execute("COMMIT")
+            return None
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _set_failed(self, job_id: int, error: str, now: float):
+        self._conn.execute("UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated = ? WHERE id = ?",
+                           (FAILED, error, now, job_id))
+
+    def renew(self, job_id: int, owner: str, lease_s: float = DEFAULT_LEASE_S) -> bool:
+        """Prolonge le bail ; False si le worker ne le détient plus (expiré et repris)."""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+            (now + lease_s, now, job_id, LEASED, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, result: dict = None) -> bool:
+        """
+        Termine la tâche. Sans effet (False) si le bail a été perdu : la tâche a été reprise
+        par un autre worker, dont le résultat fera foi.
+        """
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, updated = ?"
+            " WHERE id = ? AND status = ? AND lease_owner = ?",
+            (DONE, json.dumps(result or {}, ensure_ascii=False), time.time(), job_id, LEASED, owner))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str, retry: bool = True) -> bool:
+        """
+        Signale un échec : la tâche repart en attente tant qu'il reste des tentatives (et que
+        retry est vrai), sinon elle passe en échec définitif.
+        """
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = CASE WHEN ? AND attempts < max_attempts THEN ? ELSE ? END,"
+            " error = ?, lease_owner = NULL, lease_expires = NULL, updated = ?"
+            " WHERE id = ? AND status = ? AND lease_owner = ?",
+            (retry, PENDING, FAILED, error, time.time(), job_id, LEASED, owner))
+        return cursor.rowcount == 1
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["after"] = json.loads(job["after"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        """Nombre de tâches par statut."""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return counts
+
+    def unfinished(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, LEASED)).fetchone()[0]
+
+    def results(self) -> List[dict]:
+        """Résultats des tâches terminées."""
+        rows = self._conn.execute("SELECT result FROM jobs WHERE status = ? ORDER BY id", (DONE,))
+        return [json.loads(result or "{}") for (result,) in rows]
+
+    def failures(self) -> List[dict]:
+        rows = self._conn.execute("SELECT key, attempts, error FROM jobs WHERE status = ? ORDER BY id", (FAILED,))
+        return [{"key": key, "attempts": attempts, "error": error} for key, attempts, error in rows]
@@ -0,0 +1,332 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Optional
+from openai import OpenAI
+from pydantic import ValidationError
+from llmmetrics import get_metrics, percentile
+from llmscheduler import estimate_request_tokens, get_scheduler
+from modelregistry import model_tier, tier_model
+
+# Point de passage unique des appels LLM des outils : chaque appel passe par
+# l'ordonnanceur du fournisseur (quotas, réessais, concurrence adaptative), puis est
+# chronométré et ses tokens (`response.usage`) sont enregistrés dans llmmetrics.
+
+
+# Accès aux fournisseurs ; les modèles de chaque fournisseur sont dans modelregistry.MODELS
+PROVIDERS = {
+    "xai": {"api_key_env": "XAI_API_KEY", "base_url_env": "XAI_BASE_URL", "base_url": "https://api.x.ai/v1"},
+    "openai": {"api_key_env": "OPENAI_API_KEY", "base_url_env": "OPENAI_BASE_URL", "base_url": None},
+}
+
+# Hedging : si le fournisseur primaire n'a pas répondu au bout du percentile `percentile`
+# de ses latences observées (ou de default_deadline_s tant qu'il y a moins de min_samples
+# mesures), un doublon part chez l'autre fournisseur ; la première réponse gagne.
+# Activable par la variable d'environnement LLM_HEDGING=1 ou par configure_hedging() pour tout le
+# processus (scripts, benchmarks), ou appel par appel (paramètre hedging, option des outils).
+HEDGING = {
+    "enabled": os.getenv("LLM_HEDGING", "").lower() in ("1", "true", "oui"),
+    "percentile": float(os.getenv("LLM_HEDGING_PERCENTILE", 95)),
+    "min_samples": 10,
+    "default_deadline_s": float(os.getenv("LLM_HEDGING_DEADLINE", 20)),
+}
+
+
+class HedgeCancelled(Exception):
+    """Levée dans la requête perdante d'un appel doublé."""
+
+
+class StructuredOutputError(Exception):
+    """Réponse JSON toujours invalide après la relance."""
+
+    def __init__(self, message: str, raw: str):
+        super().__init__(message)
+        self.raw = raw
+
+
+def configure_hedging(enabled: Optional[bool] = None, percentile_deadline: Optional[float] = None,
+                      default_deadline_s: Optional[float] = None):
+    """
+    Active/désactive le hedging et règle son échéance pour tout le processus. Une application
+    multi-sessions (Streamlit) passe plutôt hedging aux outils, appel par appel.
+    """
+    if enabled is not None:
+        HEDGING["enabled"] = enabled
+    if percentile_deadline is not None:
+        HEDGING["percentile"] = percentile_deadline
+    if default_deadline_s is not None:
+        HEDGING["default_deadline_s"] = default_deadline_s
+
+
+def provider_credentials(provider: str):
+    """Retourne (api_key, base_url) d'un fournisseur d'après l'environnement."""
+    config = PROVIDERS[provider]
+    base_url = os.getenv(config["base_url_env"], config["base_url"]) if config["base_url"] else None
+    return os.getenv(config["api_key_env"]), base_url
+
+
+class _ClientPool:
+    """
+    Clients OpenAI réutilisables pour le hedging. Créer un client coûte cher (contexte TLS) :
+    les clients des requêtes terminées sont remis dans le pool, seuls ceux fermés pour
+    annuler une requête perdante sont remplacés.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, api_key: str, base_url: Optional[str]) -> OpenAI:
+        key = (api_key, base_url)
+        with self._lock:
+            if self._idle.get(key):
+                return self._idle[key].pop()
+        return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def release(self, client: OpenAI, api_key: str, base_url: Optional[str]):
+        key = (api_key, base_url)
+        with self._lock:
+            self._idle.setdefault(key, []).append(client)
+
+
+_client_pool = _ClientPool()
+
+
+def _other_provider(provider: str) -> str:
+    return "openai" if provider == "xai" else "xai"
+
+
+def hedge_deadline(tool: str, provider: str) -> float:
+    observed = get_metrics().latencies(tool, provider, HEDGING["min_samples"])
+    if not observed:
+        return HEDGING["default_deadline_s"]
+    return percentile(observed, HEDGING["percentile"])
+
+
+def usage_tokens(response) -> dict:
+    """Tokens d'un appel Chat Completions : prompt, complétion et part du prompt servie depuis le cache."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_prompt_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+
+def chat_completion(client, tool: str, provider: str, chunk_id: Optional[str] = None, hedging: Optional[bool] = None,
+                    scope: Optional[str] = None, **kwargs):
+    """
+    Appelle `client.chat.completions.create(**kwargs)` via l'ordonnanceur du fournisseur
+    en enregistrant la mesure de l'appel.
+
+    Args:
+        client: Client OpenAI (ou compatible) déjà configuré, idéalement avec max_retries=0
+            pour laisser les réessais à l'ordonnanceur.
+        tool (str): Nom de l'outil appelant (ex. "work_drafting_tool").
+        provider (str): Fournisseur LLM ("xai" ou "openai").
+        chunk_id (str, optional): Identifiant du morceau traité (ex. "fichier.pdf#3").
+        hedging (bool, optional): Hedging de cet appel ; None : réglage du processus (HEDGING).
+        scope (str, optional): Exécution à laquelle rattacher la mesure (RunBudget.scope).
+        **kwargs: Paramètres transmis tels quels à l'API (model, messages, max_tokens...).
+
+    Returns:
+        La réponse de l'API, inchangée. Les exceptions (après réessais) sont enregistrées puis relevées.
+    """
+    hedging = HEDGING["enabled"] if hedging is None else hedging
+    if hedging and provider in PROVIDERS and os.getenv(PROVIDERS[_other_provider(provider)]["api_key_env"]):
+        return _hedged_chat_completion(client, tool, provider, chunk_id, scope, **kwargs)
+
+    attempt_errors = []
+    estimated = estimate_request_tokens(kwargs.get("messages"), kwargs.get("max_tokens", 0), kwargs.get("model"))
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        response = get_scheduler(provider).call(
+            lambda: client.chat.completions.create(**kwargs), estimated, attempt_errors)
+    except Exception as e:
+        get_metrics().record(tool, provider, kwargs.get("model", ""), chunk_id, started_at,
+                             time.perf_counter() - start, success=False, error=str(e),
+                             attempts=max(1, len(attempt_errors)), scope=scope)
+        raise
+    get_metrics().record(
+        tool, provider, kwargs.get("model", ""), chunk_id, started_at,
+        time.perf_counter() - start,
+        attempts=len(attempt_errors) + 1,
+        scope=scope,
+        **usage_tokens(response),
+    )
+    return response
+
+
+def _hedged_chat_completion(client, tool: str, provider: str, chunk_id: Optional[str] = None, scope: Optional[str] = None,
+                            **kwargs):
+    """
+    Variante doublée de chat_completion : le primaire part seul ; s'il n'a pas répondu à
+    l'échéance (ou s'il échoue), un doublon part chez l'autre fournisseur. La première
+    réponse valide gagne ; le perdant est annulé en fermant son client dédié.
+    """
+    hedge_provider = _other_provider(provider)
+    estimated = estimate_request_tokens(kwargs.get("messages"), kwargs.get("max_tokens", 0), kwargs.get("model"))
+    deadline = hedge_deadline(tool, provider)
+    credentials = {
+        "primary": (client.api_key, str(client.base_url)),
+        "hedge": provider_credentials(hedge_provider),
+    }
+    clients = {role: _client_pool.acquire(*creds) for role, creds in credentials.items()}
+    requests = {
+        "primary": (provider, kwargs),
+        # Doublon sur le modèle de même niveau (rapide ou phare) : le routage par tâche est conservé
+        "hedge": (hedge_provider, dict(kwargs, model=tier_model(hedge_provider, model_tier(provider, kwargs.get("model", ""))))),
+    }
+
+    cancelled = threading.Event()
+
+    def attempt(role: str):
+        attempt_provider, attempt_kwargs = requests[role]
+
+        def call():
+            if cancelled.is_set():  # Perdant annulé : pas de réessai auprès de l'ordonnanceur
+                raise HedgeCancelled(f"Requête {role} annulée : l'autre fournisseur a répondu.")
+            return clients[role].chat.completions.create(**attempt_kwargs)
+
+        return get_scheduler(attempt_provider).call(call, estimated)
+
+    def submit(role: str) -> Future:
+        # Thread démon plutôt qu'un ThreadPoolExecutor : une lecture socket bloquée du
+        # perdant ne doit pas retenir l'arrêt de l'interpréteur
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(attempt(role))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"llm-hedge-{role}", daemon=True).start()
+        return future
+
+    started_at = time.time()
+    start = time.perf_counter()
+    futures = {submit("primary"): "primary"}
+    winner, response, last_error = None, None, None
+    try:
+        done, _ = wait(futures, timeout=deadline)
+        if done and next(iter(done)).exception() is None:
+            winner, response = "primary", next(iter(done)).result()
+        else:
+            if done:
+                last_error = next(iter(done)).exception()
+            futures[submit("hedge")] = "hedge"
+            pending = {f for f in futures if not f.done()}
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None and winner is None:
+                        winner, response = futures[future], future.result()
+                    elif future.exception() is not None:
+                        last_error = future.exception()
+    finally:
+        cancelled.set()
+        for role, role_client in clients.items():
+            future = next((f for f, r in futures.items() if r == role), None)
+            if future is not None and not future.done():
+                role_client.close()  # Ferme les connexions du perdant ; sa réponse sera ignorée
+            else:
+                _client_pool.release(role_client, *credentials[role])
+
+    elapsed = time.perf_counter() - start
+    if winner is None:
+        get_metrics().record(tool, provider, kwargs.get("model", ""), chunk_id, started_at, elapsed,
+                             success=False, error=str(last_error), hedge_winner="none", scope=scope)
+        raise last_error
+    winner_provider, winner_kwargs = requests[winner]
+    get_metrics().record(
+        tool, winner_provider, winner_kwargs.get("model", ""), chunk_id, started_at, elapsed,
+        hedge_winner=winner,
+        scope=scope,
+        **usage_tokens(response),
+    )
+    loser = "hedge" if winner == "primary" else "primary"
+    loser_future = next((f for f, r in futures.items() if r == loser), None)
+    if loser_future is not None:
+        # Requête perdante envoyée et facturée : enregistrée à part (échec, prompt estimé) pour que
+        # le coût et le budget de l'exécution la comptent. Une requête en erreur n'est pas facturée.
+        loser_provider, loser_kwargs = requests[loser]
+        in_flight = not loser_future.done()
+        get_metrics().record(
+            tool, loser_provider, loser_kwargs.get("model", ""), chunk_id, started_at, elapsed,
+            prompt_tokens=estimate_request_tokens(loser_kwargs.get("messages"), 0, loser_kwargs.get("model")) if in_flight else 0,
+            success=False, error="annulée : l'autre fournisseur a répondu" if in_flight else str(loser_future.exception()),
+            hedge_winner="loser", scope=scope,
+        )
+    return response
+
+
+def _strip_code_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return text.strip()
+
+
+def structured_chat_completion(client, tool: str, provider: str, response_model, chunk_id: Optional[str] = None,
+                               validation_context: Optional[dict] = None, **kwargs):
+    """
+    Appel en mode JSON dont la réponse est validée par un modèle pydantic. Si la validation
+    échoue (JSON invalide, champ manquant, valeur hors bornes), l'erreur est renvoyée au
+    modèle pour une seule relance.
+
+    Args:
+        response_model: Classe pydantic attendue (ex. chunkdecisions.WorkChunkDecision).
+        validation_context (dict, optional): Contexte transmis aux validateurs (ex. {"total_chunks": 12}).
+        **kwargs: Paramètres de chat_completion (model, messages, max_tokens, hedging, scope...).
+
+    Returns:
+        tuple: (instance de response_model, texte brut de la réponse retenue).
+
+    Raises:
+        StructuredOutputError: Si la réponse relancée est toujours invalide.
+    """
+    messages = list(kwargs.pop("messages"))
+    raw, error = "", None
+    for _ in range(2):  # Réponse initiale + une relance
+        response = chat_completion(client, tool, provider, chunk_id=chunk_id, messages=messages,
+                                   response_format={"type": "json_object"}, **kwargs)
+        raw = response.choices[0].message.content or ""
+        try:
+            return response_model.model_validate_json(_strip_code_fence(raw), context=validation_context), raw
+        except ValidationError as e:
+            error = e
+            messages = messages + [
+                {"role": "assistant", "content": raw},
+                {"role": "user", "content": f"Réponse invalide : {e}\nRetournez uniquement l'objet JSON corrigé, au format demandé."},
+            ]
+    raise StructuredOutputError(f"Réponse JSON invalide après relance : {error}", raw)
+
+
+def responses_create(client, tool: str, provider: str = "openai", **kwargs):
+    """
+    Équivalent de chat_completion pour l'API Responses (`client.responses.create`), utilisée par SearchTool.
+    """
+    attempt_errors = []
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        response = get_scheduler(provider).call(lambda: client.responses.create(**kwargs), 0, attempt_errors)
+    except Exception as e:
+        get_metrics().record(tool, provider, kwargs.get("model", ""), None, started_at,
+                             time.perf_counter() - start, success=False, error=str(e),
+                             attempts=max(1, len(attempt_errors)))
+        raise
+    usage = getattr(response, "usage", None)
+    get_metrics().record(
+        tool, provider, kwargs.get("model", ""), None, started_at, time.perf_counter() - start,
+        prompt_tokens=getattr(usage, "input_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "output_tokens", 0) or 0,
+        attempts=len(attempt_errors) + 1,
+    )
+    return response
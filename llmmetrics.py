@@ -0,0 +1,277 @@
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Dict, List, Optional
+
+from artifacts import atomic_write_text
+
+# Prix publics en USD par million de tokens : (entrée, sortie)
+MODEL_PRICING: Dict[str, tuple] = {
+    "grok-3-beta": (3.00, 15.00),
+    "grok-3-mini-beta": (0.30, 0.50),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Prix des tokens d'entrée servis depuis le cache de prompt du fournisseur, USD par million
+CACHED_PROMPT_PRICING: Dict[str, float] = {
+    "grok-3-beta": 0.75,
+    "grok-3-mini-beta": 0.075,
+    "gpt-4o": 1.25,
+    "gpt-4o-mini": 0.075,
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Appels conservés par le collecteur ; les plus anciens sont oubliés au-delà (processus de longue
+# durée : serveur Streamlit, worker de file de tâches)
+MAX_RECORDS = int(os.getenv("LLM_METRICS_MAX_RECORDS", 100_000))
+
+
+@dataclass
+class LLMCallRecord:
+    """Mesure d'un appel LLM (un appel `create` = un enregistrement)."""
+    run_id: str
+    tool: str
+    provider: str
+    model: str
+    chunk_id: Optional[str]
+    started_at: float
+    wall_time_s: float
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+    success: bool
+    error: Optional[str] = None
+    attempts: int = 1
+    # Part de prompt_tokens servie depuis le cache de prompt (usage.prompt_tokens_details.cached_tokens)
+    cached_prompt_tokens: int = 0
+    # Hedging : requête gagnante ("primary"/"hedge"), "loser" pour la requête perdante (comptée à
+    # part pour son coût), "none" si les deux ont échoué, None si le hedging était inactif
+    hedge_winner: Optional[str] = None
+    # Exécution qui a fait l'appel (budget.RunBudget.scope), parmi toutes celles du processus
+    scope: Optional[str] = None
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+    """
+    Calcule le coût d'un appel à partir de la grille MODEL_PRICING (0 si le modèle est inconnu).
+    Les tokens d'entrée servis depuis le cache sont facturés au tarif CACHED_PROMPT_PRICING.
+    """
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    cached_price = CACHED_PROMPT_PRICING.get(model, input_price)
+    cached_prompt_tokens = min(cached_prompt_tokens, prompt_tokens)
+    return ((prompt_tokens - cached_prompt_tokens) * input_price + cached_prompt_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Percentile par interpolation linéaire (None si la liste est vide).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class LLMMetrics:
+    """
+    Collecteur des appels LLM du processus, partagé par tous les outils.
+
+    Les enregistrements sont rattachés à un run (voir start_run) ; les agrégats
+    (percentiles de latence, tokens, coût) se calculent par run, par outil et par modèle.
+    Seuls les max_records derniers appels sont conservés.
+    """
+
+    def __init__(self, max_records: int = MAX_RECORDS):
+        self._lock = threading.Lock()
+        self._records: Deque[LLMCallRecord] = deque(maxlen=max_records)
+        self.run_id = uuid.uuid4().hex[:12]
+
+    def start_run(self, run_id: Optional[str] = None) -> str:
+        """Ouvre un nouveau run : les appels suivants y seront rattachés."""
+        with self._lock:
+            self.run_id = run_id or uuid.uuid4().hex[:12]
+            return self.run_id
+
+    def record(self, tool: str, provider: str, model: str, chunk_id: Optional[str], started_at: float,
+               wall_time_s: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+               success: bool = True, error: Optional[str] = None, attempts: int = 1,
+               hedge_winner: Optional[str] = None, cached_prompt_tokens: int = 0,
+               scope: Optional[str] = None) -> LLMCallRecord:
+        record = LLMCallRecord(
+            run_id=self.run_id,
+            tool=tool,
+            provider=provider,
+            model=model,
+            chunk_id=chunk_id,
+            started_at=started_at,
+            wall_time_s=wall_time_s,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=estimate_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens),
+            success=success,
+            error=error,
+            attempts=attempts,
+            hedge_winner=hedge_winner,
+            cached_prompt_tokens=cached_prompt_tokens,
+            scope=scope,
+        )
+        with self._lock:
+            self._records.append(record)
+        return record
+
+    def latencies(self, tool: str, provider: str, min_samples: int = 1) -> List[float]:
+        """Latences des appels réussis d'un outil chez un fournisseur (liste vide sous min_samples)."""
+        with self._lock:
+            values = [r.wall_time_s for r in self._records
+                      if r.success and r.tool == tool and r.provider == provider and r.hedge_winner in (None, "primary")]
+        return values if len(values) >= min_samples else []
+
+    def hedge_report(self, run_id: Optional[str] = None) -> dict:
+        """
+        Latence de queue des appels par morceau (p95/p99) et part des appels doublés gagnés
+        par le second fournisseur. Le gain du hedging se lit en comparant ce rapport à celui
+        d'un run identique sans hedging (voir benchmarks/bench_pipelines.py --hedging).
+        """
+        chunk_records = [r for r in self.records(run_id) if r.success and r.chunk_id and "#" in r.chunk_id]
+        latencies = [r.wall_time_s for r in chunk_records]
+        report = {
+            "chunk_calls": len(chunk_records),
+            "hedged_calls": sum(1 for r in chunk_records if r.hedge_winner is not None),
+            "hedge_wins": sum(1 for r in chunk_records if r.hedge_winner == "hedge"),
+        }
+        for pct in (95, 99):
+            value = percentile(latencies, pct)
+            report[f"chunk_latency_p{pct}_s"] = round(value, 4) if value is not None else None
+        return report
+
+    def records(self, run_id: Optional[str] = None, scope: Optional[str] = None) -> List[LLMCallRecord]:
+        with self._lock:
+            return [r for r in self._records
+                    if (run_id is None or r.run_id == run_id) and (scope is None or r.scope == scope)]
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+
+    @staticmethod
+    def _aggregate(records: List[LLMCallRecord]) -> dict:
+        latencies = [r.wall_time_s for r in records if r.success]
+        stats = {
+            "calls": len(records),
+            "errors": sum(1 for r in records if not r.success),
+            "retries": sum(r.attempts - 1 for r in records),
+            "prompt_tokens": sum(r.prompt_tokens for r in records),
+            "cached_prompt_tokens": sum(r.cached_prompt_tokens for r in records),
+            "completion_tokens": sum(r.completion_tokens for r in records),
+            "cost_usd": round(sum(r.cost_usd for r in records), 6),
+            "wall_time_s": round(sum(r.wall_time_s for r in records), 3),
+        }
+        for pct in PERCENTILES:
+            value = percentile(latencies, pct)
+            stats[f"latency_p{pct}_s"] = round(value, 4) if value is not None else None
+        return stats
+
+    def summary(self, run_id: Optional[str] = None) -> dict:
+        """
+        Agrège les appels d'un run (tous les runs si run_id vaut None).
+
+        Returns:
+            dict: Totaux, percentiles de latence et coût, globalement puis par outil et par modèle.
+        """
+        records = self.records(run_id)
+        by_tool: Dict[str, List[LLMCallRecord]] = {}
+        by_model: Dict[str, List[LLMCallRecord]] = {}
+        for r in records:
+            by_tool.setdefault(r.tool, []).append(r)
+            by_model.setdefault(f"{r.provider}/{r.model}", []).append(r)
+        return {
+            "run_id": run_id,
+            "total": self._aggregate(records),
+            "by_tool": {tool: self._aggregate(rs) for tool, rs in by_tool.items()},
+            "by_model": {model: self._aggregate(rs) for model, rs in by_model.items()},
+            "hedging": self.hedge_report(run_id),
+        }
+
+    def export_json(self, path: str, run_id: Optional[str] = None):
+        """Écrit le résumé et le détail des appels dans un fichier JSON local."""
+        payload = {
+            "summary": self.summary(run_id),
+            "calls": [asdict(r) for r in self.records(run_id)],
+        }
+        atomic_write_text(path, json.dumps(payload, ensure_ascii=False, indent=2))
+
+    def to_prometheus(self, run_id: Optional[str] = None) -> str:
+        """
+        Rend les métriques au format texte Prometheus (exposition 0.0.4).
+        """
+        lines = []
+        summary = self.summary(run_id)
+        series = {
+            "llm_calls_total": ("counter", "Nombre d'appels LLM", "calls"),
+            "llm_call_errors_total": ("counter", "Nombre d'appels LLM en erreur", "errors"),
+            "llm_call_retries_total": ("counter", "Nombre de réessais (429, 5xx, réseau)", "retries"),
+            "llm_prompt_tokens_total": ("counter", "Tokens envoyés", "prompt_tokens"),
+            "llm_cached_prompt_tokens_total": ("counter", "Tokens envoyés servis depuis le cache de prompt", "cached_prompt_tokens"),
+            "llm_completion_tokens_total": ("counter", "Tokens générés", "completion_tokens"),
+            "llm_cost_usd_total": ("counter", "Coût estimé en USD", "cost_usd"),
+        }
+        for metric, (metric_type, help_text, key) in series.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for model_key, stats in summary["by_model"].items():
+                provider, model = model_key.split("/", 1)
+                for tool, tool_stats in self._by_tool_for_model(run_id, provider, model).items():
+                    lines.append(f'{metric}{{tool="{tool}",provider="{provider}",model="{model}"}} {tool_stats[key]}')
+
+        lines.append("# HELP llm_call_latency_seconds Latence des appels LLM réussis")
+        lines.append("# TYPE llm_call_latency_seconds summary")
+        for tool, stats in summary["by_tool"].items():
+            for pct in PERCENTILES:
+                value = stats[f"latency_p{pct}_s"]
+                if value is not None:
+                    lines.append(f'llm_call_latency_seconds{{tool="{tool}",quantile="{pct / 100}"}} {value}')
+            lines.append(f'llm_call_latency_seconds_sum{{tool="{tool}"}} {stats["wall_time_s"]}')
+            lines.append(f'llm_call_latency_seconds_count{{tool="{tool}"}} {stats["calls"]}')
+        return "\n".join(lines) + "\n"
+
+    def _by_tool_for_model(self, run_id: Optional[str], provider: str, model: str) -> Dict[str, dict]:
+        grouped: Dict[str, List[LLMCallRecord]] = {}
+        for r in self.records(run_id):
+            if r.provider == provider and r.model == model:
+                grouped.setdefault(r.tool, []).append(r)
+        return {tool: self._aggregate(rs) for tool, rs in grouped.items()}
+
+    def export_prometheus(self, path: str, run_id: Optional[str] = None):
+        """
+        Écrit les métriques au format texte Prometheus (fichier lisible par node_exporter/textfile).
+        L'écriture est atomique : le collecteur ne lit jamais un fichier partiel.
+        """
+        atomic_write_text(path, self.to_prometheus(run_id))
+
+
+_metrics = LLMMetrics()
+
+
+def get_metrics() -> LLMMetrics:
+    """Retourne le collecteur partagé du processus."""
+    return _metrics
+
+
+def export_metrics(path: str, run_id: Optional[str] = None):
+    """
+    Exporte les métriques vers un fichier : format Prometheus si l'extension est .prom, JSON sinon.
+    """
+    if path.endswith(".prom"):
+        _metrics.export_prometheus(path, run_id)
+    else:
+        _metrics.export_json(path, run_id)
+
@@ -0,0 +1,223 @@
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import openai
+
+from tokencount import count_tokens
+
+# Quotas par défaut par fournisseur (surchargeables par variables d'environnement :
+# XAI_RPM, XAI_TPM, XAI_MAX_CONCURRENCY, OPENAI_RPM, OPENAI_TPM, OPENAI_MAX_CONCURRENCY)
+PROVIDER_LIMITS: Dict[str, dict] = {
+    "xai": {"rpm": 480, "tpm": 200_000, "max_concurrency": 8},
+    "openai": {"rpm": 500, "tpm": 30_000, "max_concurrency": 8},
+}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+FATAL_STATUS = {401, 403, 404}
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    Erreurs transitoires : quota dépassé (429), erreurs serveur (5xx), timeouts et coupures réseau.
+    Les erreurs d'authentification ou de requête (401, 400...) ne sont pas réessayées.
+    """
+    if isinstance(exc, openai.APIConnectionError):  # Inclut APITimeoutError
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS
+
+
+def is_fatal(exc: Exception) -> bool:
+    """Erreurs qui feront échouer tous les appels suivants (clé invalide, accès refusé, modèle inconnu)."""
+    return getattr(exc, "status_code", None) in FATAL_STATUS
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Seau à jetons thread-safe : `capacity` jetons au plus, rechargés à `rate` jetons/seconde.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """Bloque jusqu'à disposer de `amount` jetons (plafonné à la capacité), puis les consomme."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Corrige a posteriori une consommation estimée (delta > 0 : consommation supplémentaire)."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class ProviderScheduler:
+    """
+    Ordonnanceur des appels d'un fournisseur LLM, partagé par tous les outils du processus.
+
+    - deux seaux à jetons (requêtes/minute et tokens/minute) lissent le débit sous les quotas ;
+    - les erreurs transitoires sont réessayées avec un backoff exponentiel à gigue complète,
+      en respectant l'en-tête Retry-After s'il est présent ;
+    - la concurrence s'adapte (AIMD) : divisée par deux à chaque 429, augmentée d'un cran
+      après une série d'appels réussis, dans la limite de max_concurrency.
+    """
+
+    def __init__(self, provider: str, rpm: int, tpm: int, max_concurrency: int, min_concurrency: int = 1,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0,
+                 increase_after: int = 10):
+        self.provider = provider
+        self.requests = TokenBucket(capacity=max(1, rpm // 6), rate=rpm / 60.0)
+        self.tokens = TokenBucket(capacity=max(1, tpm // 6), rate=tpm / 60.0)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.increase_after = increase_after
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+
+    def _enter(self):
+        with self._condition:
+            while self._active >= self.concurrency:
+                self._condition.wait()
+            self._active += 1
+
+    def _leave(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def _on_rate_limited(self):
+        with self._condition:
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            self._successes = 0
+            self.stats["rate_limited"] += 1
+
+    def backoff_delay(self, attempt: int, exc: Exception = None) -> float:
+        retry_after = _retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func: Callable, estimated_tokens: int = 0, attempt_errors: Optional[List[str]] = None):
+        """
+        Exécute `func()` sous les quotas du fournisseur, avec réessais sur erreurs transitoires.
+
+        Args:
+            func (Callable): Appel à effectuer (sans argument), ex. lambda: client.chat.completions.create(...).
+            estimated_tokens (int): Tokens estimés (prompt + max_tokens) réservés dans le seau de tokens.
+            attempt_errors (list, optional): Reçoit le message de chaque tentative échouée.
+
+        Returns:
+            Le résultat de `func()`. La dernière exception est relevée si toutes les tentatives échouent.
+        """
+        with self._condition:
+            self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire(1)
+            if estimated_tokens:
+                self.tokens.acquire(estimated_tokens)
+            self._enter()
+            try:
+                result = func()
+            except Exception as e:
+                self._leave()
+                if attempt_errors is not None:
+                    attempt_errors.append(str(e))
+                if is_rate_limited(e):
+                    self._on_rate_limited()
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._condition:
+                        self.stats["failures"] += 1
+                    raise
+                with self._condition:
+                    self.stats["retries"] += 1
+                time.sleep(self.backoff_delay(attempt, e))
+                continue
+            self._leave()
+            self._on_success()
+            usage = getattr(result, "usage", None)
+            used = (getattr(usage, "total_tokens", None) or 0) if usage is not None else 0
+            if estimated_tokens and used:
+                self.tokens.adjust(used - estimated_tokens)
+            return result
+
+
+_schedulers: Dict[str, ProviderScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """
+    Retourne l'ordonnanceur partagé du fournisseur, créé au premier appel à partir
+    de PROVIDER_LIMITS et des variables d'environnement.
+    """
+    provider = provider.lower()
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            limits = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["openai"])
+            prefix = provider.upper()
+            _schedulers[provider] = ProviderScheduler(
+                provider,
+                rpm=int(os.getenv(f"{prefix}_RPM", limits["rpm"])),
+                tpm=int(os.getenv(f"{prefix}_TPM", limits["tpm"])),
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", limits["max_concurrency"])),
+            )
+        return _schedulers[provider]
+
+
+def estimate_request_tokens(messages, max_tokens: int = 0, model: Optional[str] = None) -> int:
+    """
+    Tokens d'une requête : contenu des messages compté par tokencount (tiktoken, sinon
+    ≈ 4 caractères par token) plus le plafond de sortie.
+    """
+    tokens = 0
+    for message in messages or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        tokens += count_tokens(content, model) if isinstance(content, str) else 0
+    return tokens + (max_tokens or 0)
@@ -1,5 +1,6 @@
 from crewai.tools import BaseTool
 from openai import OpenAI
+from llmclient import chat_completion
 from typing import Optional
 import os
 from searchtool import SearchTool
@@ -8,7 +9,7 @@ class MarketStudyTool(BaseTool):
     name: str = "market_study_tool"  # Nom de l'outil avec annotation de type
     description: str = "Outil pour réaliser une étude de marché en comparant une solution à ses concurrents."  # Description
 
-    def _run(self, synthesis: str, web_info: str = "", innovation_analysis: str = "", solution_name: str = "Citykomi", company_name: str = "", llm_provider: str = "xai") -> str:
+    def _run(self, synthesis: str, web_info: str = "", innovation_analysis: str = "", solution_name: str = "Citykomi", company_name: str = "", llm_provider: str = "xai", hedging: Optional[bool] = None) -> str:
         """
         Réalise une étude de marché en comparant la solution à ses concurrents.
         Args:
@@ -18,6 +19,7 @@ class MarketStudyTool(BaseTool):
             solution_name (str): Nom de la solution (ex. "Citykomi"). Par défaut "Citykomi".
             company_name (str): Nom de l'entreprise (ex. "Citykomi Inc"). Par défaut vide.
             llm_provider (str): Fournisseur du LLM ("xai" ou "openai"). Par défaut "xai".
+            hedging (bool, optional): Hedging xAI/OpenAI pour cet appel. Par défaut, réglage du processus.
         Returns:
             str: Analyse de marché structurée.
         """
@@ -25,7 +27,7 @@ class MarketStudyTool(BaseTool):
         # Configure le client selon le fournisseur
         if llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
             model_id = "grok-3-beta"  # Modèle générique pour xAI
         else:  # openai
             api_key = os.getenv("OPENAI_API_KEY")
@@ -34,7 +36,7 @@ class MarketStudyTool(BaseTool):
         if not api_key:
             return f"Erreur : Clé API pour {llm_provider.upper()}_API_KEY non définie dans les variables d'environnement"
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
 
         # Étape 1 : Recherche de solutions similaires sur le marché
         search_tool = SearchTool()
@@ -85,7 +87,9 @@ class MarketStudyTool(BaseTool):
         )
 
         try:
-            analysis_response = client.chat.completions.create(
+            analysis_response = chat_completion(
+                client, self.name, llm_provider,
+                hedging=hedging,
                 model=model_id,
                 messages=[
                     {"role": "system", "content": "Vous êtes un analyste de marché spécialisé dans les technologies conversationnelles."},
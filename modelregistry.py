@@ -0,0 +1,57 @@
+import os
+from typing import Dict, Iterable, Optional
+
+# Registre des modèles par fournisseur et routage par tâche : les appels simples (synthèse
+# succincte, guess initial, pertinence d'un morceau, plan de parcours) partent vers un modèle
+# rapide et bon marché, seule la rédaction utilise le modèle phare.
+
+MODELS = {
+    "xai": {"flagship": "grok-3-beta", "fast": "grok-3-mini-beta"},
+    "openai": {"flagship": "gpt-4o", "fast": "gpt-4o-mini"},
+}
+
+TASK_TIERS = {
+    "condensation": "fast",  # Synthèse succincte (50 mots) de la synthèse du projet
+    "guess": "fast",  # Guess initial d'un fichier (et sa note de pertinence)
+    "relevance": "fast",  # Pertinence d'un morceau (GuessStrategyTool)
+    "planning": "fast",  # Choix des morceaux sur la table des matières (mode plan)
+    "drafting": "flagship",  # Rédaction des travaux
+}
+
+
+def routing_enabled() -> bool:
+    """Routage actif par défaut ; MODEL_ROUTING=0 envoie toutes les tâches au modèle phare."""
+    return os.getenv("MODEL_ROUTING", "1") != "0"
+
+
+def model_for(provider: str, task: str, routing: Optional[bool] = None) -> str:
+    """
+    Modèle à utiliser pour une tâche.
+
+    Args:
+        provider (str): "xai" ou "openai" (tout autre fournisseur : modèles OpenAI, comme les outils).
+        task (str): Tâche de TASK_TIERS ; une tâche inconnue va au modèle phare.
+        routing (bool, optional): Routage par tâche (par défaut : routing_enabled()).
+
+    Returns:
+        str: Identifiant du modèle. Surchargeable par <FOURNISSEUR>_<NIVEAU>_MODEL
+        (ex. XAI_FAST_MODEL, OPENAI_FLAGSHIP_MODEL).
+    """
+    routing = routing_enabled() if routing is None else routing
+    return tier_model(provider, TASK_TIERS.get(task, "flagship") if routing else "flagship")
+
+
+def tier_model(provider: str, tier: str) -> str:
+    """Modèle d'un niveau ("fast" ou "flagship") chez un fournisseur, surcharge d'environnement comprise."""
+    provider = provider if provider in MODELS else "openai"
+    return os.getenv(f"{provider.upper()}_{tier.upper()}_MODEL") or MODELS[provider][tier]
+
+
+def model_tier(provider: str, model: str) -> str:
+    """Niveau d'un modèle chez un fournisseur : "fast" pour son modèle rapide, "flagship" sinon."""
+    return "fast" if model == tier_model(provider, "fast") else "flagship"
+
+
+def route_models(provider: str, tasks: Iterable[str], routing: Optional[bool] = None) -> Dict[str, str]:
+    """Modèle de chaque tâche d'un outil, ex. {"guess": "grok-3-mini-beta", "drafting": "grok-3-beta"}."""
+    return {task: model_for(provider, task, routing) for task in tasks}
@@ -0,0 +1,277 @@
+"""
+Répartition des projets CIR sur plusieurs machines par une file de tâches partagée (jobqueue).
+
+La file (une base SQLite sur un répertoire partagé) reçoit, pour chaque projet du manifeste
+de batch_cli, des tâches par fichier et par projet :
+    - <projet>:guess:file:<i> / <projet>:work:file:<i> : GuessStrategyTool ou WorkDraftingTool
+      sur un seul fichier. Le premier fichier passe avant les autres : il fixe la synthèse
+      succincte (cache runcache) que les suivants réutilisent ;
+    - <projet>:guess:assemble / <projet>:work:assemble : l'outil sur tous les fichiers, qui
+      réutilise les résultats par fichier (runcache) et écrit la sortie dans l'ordre habituel ;
+    - <projet>:direct : DirectDraftingTool sur les morceaux retenus par guess ;
+    - <projet>:sections : sections du rapport.
+
+Les workers, sur une ou plusieurs machines, prennent les tâches avec un bail renouvelé
+pendant l'exécution. Chaque tâche s'exécute dans un processus neuf, dans le répertoire du
+projet. Une tâche dont le worker disparaît est reprise à l'expiration du bail ; la rejouer
+est sans risque (sorties réécrites, fichiers déjà traités réutilisés par runcache).
+
+Utilisation :
+    python queue_cli.py enqueue projets.json --queue /partage/jobs.sqlite --output-dir /partage/sorties
+    python queue_cli.py worker --queue /partage/jobs.sqlite --processes 4        # sur chaque machine
+    python queue_cli.py status --queue /partage/jobs.sqlite
+Sur un système de fichiers réseau, ajouter --no-wal à toutes les commandes.
+"""
+import argparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from typing import List
+
+from artifacts import atomic_write_text
+from batch_cli import PIPELINES, load_manifest, run_sections, share_provider_limits
+from jobqueue import DEFAULT_LEASE_S, DEFAULT_MAX_ATTEMPTS, JobQueue, worker_id
+
+
+def project_jobs(project: dict, output_dir: str) -> List[dict]:
+    """
+    Tâches d'un projet, dans l'ordre d'ajout, avec leurs dépendances.
+
+    Returns:
+        list: Dictionnaires {key, kind, payload, after}.
+    """
+    slug = project["slug"]
+    base = {"project": project, "output_dir": output_dir}
+    jobs = []
+
+    def file_jobs(tool: str):
+        keys = [f"{slug}:{tool}:file:{i}" for i in range(len(project["files"]))]
+        for i, key in enumerate(keys):
+            jobs.append({"key": key, "kind": "file", "payload": {**base, "tool": tool, "file_index": i},
+                         "after": keys[:1] if i else []})
+        jobs.append({"key": f"{slug}:{tool}:assemble", "kind": "assemble", "payload": {**base, "tool": tool},
+                     "after": keys})
+        return f"{slug}:{tool}:assemble"
+
+    if "guess" in project["pipelines"]:
+        guess_key = file_jobs("guess")
+        if "draft" in project["pipelines"]:
+            jobs.append({"key": f"{slug}:direct", "kind": "direct", "payload": {**base, "guess_key": guess_key},
+                         "after": [guess_key]})
+    elif "draft" in project["pipelines"]:
+        file_jobs("work")
+    if "sections" in project["pipelines"]:
+        jobs.append({"key": f"{slug}:sections", "kind": "sections", "payload": base, "after": []})
+    return jobs
+
+
+def _tool(name: str, provider: str, output_dir: str):
+    if name == "guess":
+        from guessstrategytool import GuessStrategyTool
+        return GuessStrategyTool(llm_provider=provider, output_dir=output_dir)
+    from workdraftingtool import WorkDraftingTool
+    return WorkDraftingTool(llm_provider=provider, output_dir=output_dir)
+
+
+def run_job(job: dict) -> dict:
+    """
+    Exécute une tâche (dans un processus dédié) et retourne son résultat : sorties produites
+    et consommation LLM.
+    """
+    payload = job["payload"]
+    project = payload["project"]
+    project_dir = os.path.join(payload["output_dir"], project["slug"])
+    # Tâche par fichier : répertoire propre (sorties intermédiaires), cache de relance du projet
+    job_dir = os.path.join(project_dir, "files", str(payload["file_index"])) if job["kind"] == "file" else project_dir
+    os.makedirs(job_dir, exist_ok=True)
+    os.environ["RUN_CACHE_PATH"] = os.path.join(project_dir, "run_cache.sqlite")
+    os.chdir(job_dir)
+
+    from llmmetrics import get_metrics
+    metrics = get_metrics()
+    run_id = metrics.start_run(job["key"])
+    provider = project["provider"]
+    result = {}
+    if job["kind"] == "file":
+        i = payload["file_index"]
+        output = _tool(payload["tool"], provider, job_dir)._run([project["files"][i]], [project["file_infos"][i]],
+                                                                project["synthesis"])
+        if isinstance(output, str) and output.startswith("Erreur :"):
+            raise RuntimeError(output)
+    elif job["kind"] == "assemble":
+        output = _tool(payload["tool"], provider, job_dir)._run(project["files"], project["file_infos"], project["synthesis"])
+        if isinstance(output, str) and output.startswith("Erreur :"):
+            raise RuntimeError(output)
+        if payload["tool"] == "guess":
+            result["chunks_to_draft"] = [list(chunk) for chunk in output]
+    elif job["kind"] == "direct":
+        chunks = [tuple(chunk) for chunk in job["inputs"][payload["guess_key"]].get("chunks_to_draft", [])]
+        if chunks:
+            from directdraftingtool import DirectDraftingTool
+            DirectDraftingTool(llm_provider=provider, output_dir=job_dir)._run(
+                project["files"], project["file_infos"], project["synthesis"], chunks)
+    elif job["kind"] == "sections":
+        outputs = []
+
+        def write_output(name: str, content: str):
+            atomic_write_text(name, content or "")
+            outputs.append(name)
+
+        run_sections(project, write_output)
+        result["outputs"] = outputs
+    else:
+        raise ValueError(f"Type de tâche inconnu : {job['kind']}")
+
+    total = metrics.summary(run_id)["total"]
+    result.update(llm_calls=total["calls"], prompt_tokens=total["prompt_tokens"],
+                  completion_tokens=total["completion_tokens"], cost_usd=total["cost_usd"])
+    return result
+
+
+def stop_pool(pool: ProcessPoolExecutor):
+    """Arrête le processus de tâche en cours (sans attendre sa fin) et ferme le pool."""
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.kill()
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def work_loop(queue_path: str, wal: bool, lease_s: float, idle_exit_s: float, kinds: List[str] = None,
+              processes: int = 1) -> int:
+    """
+    Boucle d'un worker : prend une tâche, l'exécute dans un processus neuf en renouvelant le
+    bail (tous les tiers de bail), la termine ou la signale en échec. Si le bail a été perdu
+    (expiré et repris par un autre worker), le processus de tâche est arrêté : l'autre worker
+    rejoue la tâche dans le même répertoire, la poursuivre paierait les appels LLM deux fois
+    et ferait se chevaucher les écritures. S'arrête après
+    idle_exit_s secondes sans tâche disponible (0 : jamais) ou quand la file est vide.
+
+    Returns:
+        int: Nombre de tâches terminées par ce worker.
+    """
+    owner = worker_id()
+    done = 0
+    idle_since = time.monotonic()
+    with JobQueue(queue_path, wal=wal) as queue:
+        while True:
+            job = queue.lease(owner, lease_s, kinds)
+            if job is None:
+                if not queue.unfinished():
+                    break
+                if idle_exit_s and time.monotonic() - idle_since > idle_exit_s:
+                    break
+                time.sleep(min(2.0, lease_s / 10))
+                continue
+            # Résultats des tâches dont celle-ci dépend (ex. morceaux retenus par guess)
+            job["inputs"] = {key: (queue.get(key) or {}).get("result") or {} for key in job["after"]}
+            print(f"[{owner}] {job['key']} (tentative {job['attempts']}/{job['max_attempts']})")
+            sys.stdout.flush()
+            start = time.perf_counter()
+            lost = False
+            with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1,
+                                     initializer=share_provider_limits, initargs=(processes,)) as pool:
+                future = pool.submit(run_job, job)
+                while True:
+                    try:
+                        result = future.result(timeout=lease_s / 3)
+                        error = None
+                        break
+                    except TimeoutError:
+                        if not queue.renew(job["id"], owner, lease_s):
+                            stop_pool(pool)
+                            result, error, lost = None, None, True
+                            break
+                    except Exception as e:
+                        result, error = None, f"{e}\n{traceback.format_exc()}"
+                        break
+            elapsed = time.perf_counter() - start
+            if lost:
+                print(f"[{owner}] {job['key']} : bail perdu après {elapsed:.1f}s, repris par un autre worker : tâche arrêtée")
+            elif error is None and queue.complete(job["id"], owner, result):
+                done += 1
+                print(f"[{owner}] {job['key']} terminée en {elapsed:.1f}s ({result.get('llm_calls', 0)} appels LLM)")
+            elif error is not None and queue.fail(job["id"], owner, error):
+                print(f"[{owner}] {job['key']} en échec : {error.splitlines()[0]}")
+            else:
+                print(f"[{owner}] {job['key']} : bail expiré et repris par un autre worker, résultat ignoré")
+            sys.stdout.flush()
+            idle_since = time.monotonic()
+    return done
+
+
+def cmd_enqueue(args) -> int:
+    projects = load_manifest(args.manifest, args.pipelines, args.provider)
+    output_dir = os.path.abspath(args.output_dir)
+    added = total = 0
+    with JobQueue(args.queue, wal=not args.no_wal) as queue:
+        for project in projects:
+            for job in project_jobs(project, output_dir):
+                total += 1
+                added += queue.enqueue(job["key"], job["kind"], job["payload"], job["after"], args.max_attempts)
+    print(f"{added} tâche(s) ajoutée(s), {total - added} déjà présente(s), pour {len(projects)} projet(s).")
+    return 0
+
+
+def cmd_worker(args) -> int:
+    if args.no_wal:
+        os.environ["RUN_CACHE_WAL"] = "0"
+    worker_args = (args.queue, not args.no_wal, args.lease, args.idle_exit, args.kinds, args.processes)
+    start = time.perf_counter()
+    if args.processes == 1:
+        done = work_loop(*worker_args)
+    else:
+        # Une boucle par fil : chacune attend son processus de tâche, le travail se fait dans ces processus
+        with ThreadPoolExecutor(max_workers=args.processes) as threads:
+            done = sum(threads.map(lambda _: work_loop(*worker_args), range(args.processes)))
+    elapsed = time.perf_counter() - start
+    print(f"{done} tâche(s) terminée(s) en {elapsed:.1f}s par {args.processes} processus "
+          f"({done * 3600 / elapsed:.1f} tâches/h).")
+    return 0
+
+
+def cmd_status(args) -> int:
+    with JobQueue(args.queue, wal=not args.no_wal) as queue:
+        counts = queue.counts()
+        failures = queue.failures()
+        results = queue.results()
+    print(" ".join(f"{status}={count}" for status, count in counts.items()))
+    print(f"Appels LLM : {sum(r.get('llm_calls', 0) for r in results)}, "
+          f"coût estimé : {sum(r.get('cost_usd', 0) for r in results):.4f} $")
+    for failure in failures:
+        print(f"  échec {failure['key']} ({failure['attempts']} tentative(s)) : {(failure['error'] or '').splitlines()[0]}")
+    return 0 if not failures else 2
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="File de tâches partagée pour la pré-rédaction de projets CIR.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue", help="Ajoute les tâches des projets d'un manifeste.")
+    enqueue.add_argument("manifest")
+    enqueue.add_argument("--output-dir", default="batch_output", help="Répertoire partagé des sorties.")
+    enqueue.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=None)
+    enqueue.add_argument("--provider", choices=["xai", "openai"], default=None)
+    enqueue.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    enqueue.set_defaults(func=cmd_enqueue)
+
+    worker = subparsers.add_parser("worker", help="Traite les tâches de la file.")
+    worker.add_argument("--processes", type=int, default=1, help="Workers en parallèle sur cette machine.")
+    worker.add_argument("--lease", type=float, default=DEFAULT_LEASE_S, help="Durée du bail, en secondes.")
+    worker.add_argument("--idle-exit", type=float, default=0,
+                        help="Arrêt après N s sans tâche disponible (0 : attend la fin de la file).")
+    worker.add_argument("--kinds", nargs="+", choices=["file", "assemble", "direct", "sections"], default=None)
+    worker.set_defaults(func=cmd_worker)
+
+    status = subparsers.add_parser("status", help="État de la file.")
+    status.set_defaults(func=cmd_status)
+
+    for subparser in (enqueue, worker, status):
+        subparser.add_argument("--queue", default="jobs.sqlite", help="Base SQLite de la file (répertoire partagé).")
+        subparser.add_argument("--no-wal", action="store_true", help="Journal classique (système de fichiers réseau).")
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Entraînement et évaluation du pré-filtre local de pertinence (relevancefilter).
+
+Quand DECISION_LOG_PATH est défini (par exemple donnees/chunk_decisions.jsonl), les outils de
+parcours y enregistrent leurs décisions par morceau (decisionlog). Ces journaux forment le jeu
+de données : morceaux rédigés ou jugés pertinents contre morceaux 'pas rédigé' ou non pertinents.
+    - train : entraîne le classifieur sur une partie des décisions, évalue sur le reste
+      (exactitude, part écartée, précision des rejets et morceaux pertinents perdus par seuil),
+      puis réentraîne sur toutes les décisions et enregistre le modèle ;
+    - report : évalue un modèle enregistré sur des journaux (par exemple ceux de nouveaux projets).
+
+Le modèle est utilisé par WorkDraftingTool et GuessStrategyTool s'il existe au chemin
+RELEVANCE_MODEL_PATH (relevance_model.npz), au seuil RELEVANCE_PREFILTER_THRESHOLD (0,9).
+
+Utilisation :
+    python relevance_cli.py train sorties/*/chunk_decisions.jsonl --output relevance_model.npz
+    python relevance_cli.py train chunk_decisions.jsonl --tools guess_strategy_tool --include-skipped
+    python relevance_cli.py report nouveaux/*/chunk_decisions.jsonl --model relevance_model.npz
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+import numpy as np
+
+from decisionlog import mine_decisions
+from relevancefilter import DEFAULT_MODEL_PATH, REPORT_THRESHOLDS, RelevanceClassifier, evaluate
+
+# Décisions en dessous desquelles le modèle n'est pas enregistré
+MIN_DECISIONS = 50
+
+
+def print_report(report: dict):
+    print(f"{report['samples']} morceau(x) évalué(s), dont {report['relevant']} pertinent(s) ; "
+          f"exactitude : {report['accuracy']:.1%}")
+    print(f"{'seuil':>6} {'écartés':>9} {'précision rejets':>17} {'pertinents perdus':>18}")
+    for row in report["thresholds"]:
+        precision = f"{row['rejection_precision']:.1%}" if row["rejection_precision"] is not None else "-"
+        print(f"{row['threshold']:>6.2f} {row['filtered_share']:>9.1%} {precision:>17} {row['relevant_lost']:>18.1%}")
+
+
+def cmd_train(args) -> int:
+    texts, labels = mine_decisions(args.logs, include_skipped=args.include_skipped, tools=args.tools)
+    print(f"{len(texts)} décision(s) distincte(s) : {sum(labels)} pertinente(s), {len(labels) - sum(labels)} non pertinente(s).")
+    if len(texts) < MIN_DECISIONS or len(set(labels)) < 2:
+        print(f"Pas assez de décisions (au moins {MIN_DECISIONS}, des deux classes) : modèle non enregistré.")
+        return 2
+
+    # Évaluation sur une partie des décisions tenue à l'écart de l'entraînement
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    test_size = max(1, int(len(texts) * args.test_ratio))
+    test, train = order[:test_size], order[test_size:]
+    if len({labels[i] for i in train}) < 2:
+        print("Une seule classe dans la partie d'entraînement : modèle non enregistré.")
+        return 2
+    classifier = RelevanceClassifier(max_features=args.max_features).fit(
+        [texts[i] for i in train], [labels[i] for i in train])
+    report = evaluate(classifier, [texts[i] for i in test], [labels[i] for i in test], args.thresholds)
+    print_report(report)
+
+    # Modèle final entraîné sur toutes les décisions
+    RelevanceClassifier(max_features=args.max_features).fit(texts, labels).save(args.output)
+    print(f"Modèle enregistré dans {args.output}.")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+def cmd_report(args) -> int:
+    texts, labels = mine_decisions(args.logs, include_skipped=args.include_skipped, tools=args.tools)
+    if not texts:
+        print("Aucune décision dans les journaux.")
+        return 2
+    report = evaluate(RelevanceClassifier.load(args.model), texts, labels, args.thresholds)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Pré-filtre local de pertinence des morceaux.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train = subparsers.add_parser("train", help="Entraîne le modèle sur des journaux de décisions.")
+    train.add_argument("--output", default=DEFAULT_MODEL_PATH, help="Fichier du modèle.")
+    train.add_argument("--test-ratio", type=float, default=0.2, help="Part des décisions réservée à l'évaluation.")
+    train.add_argument("--max-features", type=int, default=4096)
+    train.add_argument("--seed", type=int, default=0)
+    train.set_defaults(func=cmd_train)
+
+    report = subparsers.add_parser("report", help="Évalue un modèle enregistré.")
+    report.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    report.set_defaults(func=cmd_report)
+
+    for subparser in (train, report):
+        subparser.add_argument("logs", nargs="+", help="Journaux chunk_decisions.jsonl.")
+        subparser.add_argument("--tools", nargs="+", default=None, help="Outils retenus (par défaut : tous).")
+        subparser.add_argument("--include-skipped", action="store_true",
+                               help="Compte les morceaux sautés par le parcours comme non pertinents.")
+        subparser.add_argument("--thresholds", nargs="+", type=float, default=list(REPORT_THRESHOLDS))
+        subparser.add_argument("--report", default=None, help="Fichier JSON où écrire le rapport.")
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from chunkdigest import STOPWORDS
+
+# Pré-filtre local de pertinence des morceaux (CPU, sans LLM) : TF-IDF (mots et paires de mots)
+# et régression logistique, entraînés sur les décisions passées des outils de parcours
+# (decisionlog). Un morceau jugé non pertinent avec une confiance d'au moins le seuil (guides
+# utilisateur, documentation de bibliothèques, annexes) est écarté sans appel LLM.
+
+# Modèle entraîné (relevance_cli.py train) ; une valeur vide désactive le pré-filtre
+DEFAULT_MODEL_PATH = os.getenv("RELEVANCE_MODEL_PATH", "relevance_model.npz")
+# Probabilité de non-pertinence à partir de laquelle un morceau est écarté
+DEFAULT_THRESHOLD = float(os.getenv("RELEVANCE_PREFILTER_THRESHOLD", 0.9))
+# Seuils comparés par le rapport d'évaluation
+REPORT_THRESHOLDS = (0.5, 0.7, 0.8, 0.9, 0.95)
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+
+
+def _terms(text: str) -> List[str]:
+    """Mots (hors mots vides) et paires de mots consécutifs d'un texte."""
+    words = [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class RelevanceClassifier:
+    """
+    Classifieur binaire pertinent / non pertinent : vecteurs TF-IDF normalisés (numpy) et
+    régression logistique pondérée par classe, entraînée par descente de gradient.
+    """
+
+    def __init__(self, max_features: int = 4096, min_df: int = 2, l2: float = 1e-3, epochs: int = 400,
+                 learning_rate: float = 2.0):
+        self.max_features = max_features
+        self.min_df = min_df
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.bias = 0.0
+
+    def _vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            ids = [self.vocabulary[t] for t in _terms(text) if t in self.vocabulary]
+            if ids:
+                np.add.at(matrix[row], np.array(ids), 1.0)
+        matrix = np.log1p(matrix) * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    def fit(self, texts: Sequence[str], labels: Sequence[int]) -> "RelevanceClassifier":
+        """
+        Entraîne le classifieur.
+
+        Args:
+            texts (list): Textes des morceaux.
+            labels (list): 1 = pertinent, 0 = non pertinent (les deux classes doivent être présentes).
+
+        Returns:
+            RelevanceClassifier: Le classifieur entraîné.
+        """
+        y = np.asarray(labels, dtype=np.float32)
+        if len(texts) != len(y) or len(set(y.tolist())) < 2:
+            raise ValueError("Il faut des morceaux pertinents et non pertinents pour entraîner le pré-filtre.")
+        # Vocabulaire : termes présents dans au moins min_df morceaux, les plus fréquents d'abord
+        document_frequency: Dict[str, int] = {}
+        for text in texts:
+            for term in set(_terms(text)):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        kept = sorted((t for t, df in document_frequency.items() if df >= self.min_df),
+                      key=lambda t: (-document_frequency[t], t))[:self.max_features]
+        self.vocabulary = {term: i for i, term in enumerate(kept)}
+        df = np.array([document_frequency[t] for t in kept], dtype=np.float32)
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1.0).astype(np.float32)
+
+        x = self._vectorize(texts)
+        # Poids par classe : les deux classes pèsent autant quelle que soit leur proportion
+        sample_weight = np.where(y == 1, 0.5 / y.mean(), 0.5 / (1 - y.mean())).astype(np.float32) / len(y)
+        self.weights = np.zeros(x.shape[1], dtype=np.float32)
+        self.bias = 0.0
+        for _ in range(self.epochs):
+            error = (self._sigmoid(x @ self.weights + self.bias) - y) * sample_weight
+            self.weights -= self.learning_rate * (x.T @ error + self.l2 * self.weights)
+            self.bias -= self.learning_rate * float(error.sum())
+        return self
+
+    @staticmethod
+    def _sigmoid(z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Probabilité que chaque morceau soit pertinent."""
+        if not len(texts):
+            return np.zeros(0, dtype=np.float32)
+        return self._sigmoid(self._vectorize(texts) @ self.weights + self.bias)
+
+    def is_irrelevant(self, text: str, threshold: float = DEFAULT_THRESHOLD) -> bool:
+        """Vrai si le morceau est non pertinent avec une probabilité d'au moins threshold."""
+        return 1.0 - float(self.predict_proba([text])[0]) >= threshold
+
+    @property
+    def fingerprint(self) -> str:
+        """Empreinte du modèle (entre dans l'empreinte de relance des fichiers)."""
+        digest = hashlib.sha256(self.weights.tobytes())
+        digest.update("\n".join(self.vocabulary).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def save(self, path: str):
+        vocabulary = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        with open(path, "wb") as f:  # Chemin conservé tel quel (np.savez ajouterait .npz)
+            np.savez(f, vocabulary=vocabulary, idf=self.idf, weights=self.weights, bias=np.float32(self.bias))
+
+    @classmethod
+    def load(cls, path: str) -> "RelevanceClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            classifier = cls()
+            classifier.vocabulary = {term: i for i, term in enumerate(data["vocabulary"].tolist())}
+            classifier.idf = data["idf"]
+            classifier.weights = data["weights"]
+            classifier.bias = float(data["bias"])
+        return classifier
+
+    @classmethod
+    def open_default(cls) -> Optional["RelevanceClassifier"]:
+        """Modèle au chemin RELEVANCE_MODEL_PATH, ou None s'il est désactivé, absent ou illisible."""
+        path = os.getenv("RELEVANCE_MODEL_PATH", DEFAULT_MODEL_PATH)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def evaluate(classifier: RelevanceClassifier, texts: Sequence[str], labels: Sequence[int],
+             thresholds: Sequence[float] = REPORT_THRESHOLDS) -> dict:
+    """
+    Rapport de précision sur un jeu de test.
+
+    Returns:
+        dict: Exactitude au seuil 0,5 et, pour chaque seuil du pré-filtre : part des morceaux
+        écartés, précision des rejets (écartés réellement non pertinents) et part des morceaux
+        pertinents perdus.
+    """
+    y = np.asarray(labels, dtype=np.int64)
+    irrelevant = 1.0 - classifier.predict_proba(texts)
+    report = {
+        "samples": len(y),
+        "relevant": int(y.sum()),
+        "accuracy": round(float(((irrelevant < 0.5) == (y == 1)).mean()), 4) if len(y) else None,
+        "thresholds": [],
+    }
+    for threshold in thresholds:
+        rejected = irrelevant >= threshold
+        report["thresholds"].append({
+            "threshold": threshold,
+            "filtered_share": round(float(rejected.mean()), 4) if len(y) else 0.0,
+            "rejection_precision": round(float((y[rejected] == 0).mean()), 4) if rejected.any() else None,
+            "relevant_lost": round(float((rejected & (y == 1)).sum() / max(int(y.sum()), 1)), 4),
+        })
+    return report
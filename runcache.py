@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# Cache des résultats par fichier entre deux exécutions d'un outil : un fichier dont
+# l'empreinte (contenu, informations, synthèse succincte, fournisseur) n'a pas changé
+# n'est pas retraité, son résultat précédent est réutilisé tel quel.
+# La base garde les travaux rédigés et les noms des fichiers : elle n'est tenue que sur demande
+# (batch_cli et queue_cli en placent une dans le répertoire de chaque projet).
+
+# Chemin de la base ; vide par défaut : pas de cache
+DEFAULT_PATH = os.getenv("RUN_CACHE_PATH", "")
+# RUN_CACHE_WAL=0 : journal classique, pour une base sur un système de fichiers réseau
+USE_WAL = os.getenv("RUN_CACHE_WAL", "1") != "0"
+
+
+def content_hash(file_path) -> str:
+    """SHA-256 du contenu d'un document (chemin ou fichier en mémoire), lu par blocs."""
+    from fileprocessingtool import open_document
+    source = open_document(file_path)
+    digest = hashlib.sha256()
+    f = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    finally:
+        if f is not source:
+            f.close()
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path, **inputs) -> str:
+    """
+    Empreinte d'un fichier pour un outil : hash du contenu et de toutes les entrées qui
+    influencent son traitement (file_info, synthèse succincte, fournisseur, modèle, découpage).
+
+    Args:
+        file_path: Chemin du fichier, ou fichier en mémoire (nom, contenu).
+        **inputs: Entrées du traitement, sérialisables en JSON.
+
+    Returns:
+        str: Empreinte hexadécimale.
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{content_hash(file_path)}\n{payload}".encode("utf-8")).hexdigest()
+
+
+class RunCache:
+    """
+    Résultats par (outil, fichier) et synthèses succinctes, dans une base SQLite persistante.
+
+    La synthèse succincte est générée par le LLM (non déterministe) : elle est mise en cache
+    par synthèse de projet et modèle de condensation, sans quoi chaque relance changerait
+    l'empreinte de tous les fichiers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={'WAL' if USE_WAL else 'DELETE'}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_results ("
+            " tool TEXT NOT NULL, source TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+            " result TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (tool, source))"
+        )
+        # Table "syntheses" des versions précédentes (sans le modèle) : ignorée
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS condensed_syntheses ("
+            " tool TEXT NOT NULL, provider TEXT NOT NULL, model TEXT NOT NULL, synthesis_hash TEXT NOT NULL,"
+            " text TEXT NOT NULL, PRIMARY KEY (tool, provider, model, synthesis_hash))"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def open_default(cls) -> Optional["RunCache"]:
+        """Cache au chemin RUN_CACHE_PATH, ou None s'il n'est pas défini ou inaccessible."""
+        path = os.getenv("RUN_CACHE_PATH", DEFAULT_PATH)  # Relu à chaque exécution (workers multi-projets)
+        if not path:
+            return None
+        try:
+            return cls(path)
+        except sqlite3.Error:
+            return None
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, tool: str, source: str, fingerprint: str) -> Optional[dict]:
+        """Résultat enregistré pour ce fichier si son empreinte n'a pas changé, sinon None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, result FROM file_results WHERE tool = ? AND source = ?",
+                (tool, source)).fetchone()
+        if row is None or row[0] != fingerprint:
+            return None
+        return json.loads(row[1])
+
+    def store(self, tool: str, source: str, fingerprint: str, result: dict):
+        """Enregistre (ou remplace) le résultat d'un fichier."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_results (tool, source, fingerprint, result, updated) VALUES (?, ?, ?, ?, ?)",
+                (tool, source, fingerprint, json.dumps(result, ensure_ascii=False), time.time()))
+            self._conn.commit()
+
+    def get_synthesis(self, tool: str, provider: str, model: str, project_synthesis: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM condensed_syntheses WHERE tool = ? AND provider = ? AND model = ? AND synthesis_hash = ?",
+                (tool, provider, model, _text_hash(project_synthesis))).fetchone()
+        return row[0] if row else None
+
+    def put_synthesis(self, tool: str, provider: str, model: str, project_synthesis: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO condensed_syntheses (tool, provider, model, synthesis_hash, text) VALUES (?, ?, ?, ?, ?)",
+                (tool, provider, model, _text_hash(project_synthesis), text))
+            self._conn.commit()
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
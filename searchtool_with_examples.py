@@ -1,5 +1,6 @@
 from crewai.tools import BaseTool
 from openai import OpenAI
+from llmclient import responses_create
 from typing import Optional
 import os
 
@@ -22,8 +23,9 @@ class SearchTool(BaseTool):
             return "Erreur : OPENAI_API_KEY non définie dans les variables d'environnement ou en paramètre."
 
         try:
-            client = OpenAI(api_key=api_key)
-            response = client.responses.create(
+            client = OpenAI(api_key=api_key, max_retries=0)  # Réessais gérés par llmscheduler
+            response = responses_create(
+                client, self.name,
                 model="gpt-4o",
                 tools=[{"type": "web_search_preview"}],
                 input=query
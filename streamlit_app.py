@@ -1,15 +1,13 @@
 import streamlit as st
-import os
-from workdraftingtool import WorkDraftingTool
-from synthesis_tool import SynthesisTool
-from innovationanalysistool import InnovationAnalysisTool
-from marketstudytool import MarketStudyTool
-from draftingtool import DraftingTool
-from directdraftingtool import DirectDraftingTool
-from fileprocessingtool import FileProcessingTool
-from guessstrategytool import GuessStrategyTool
-# Importer les modules nécessaires pour gérer les répertoires temporaires
-import shutil  # Pour supprimer le répertoire temp_dir après usage
+import io
+import json
+import tempfile
+# Les modules des outils (crewai, openai, parseurs de fichiers) sont importés
+# dans chaque section, au premier clic : le démarrage de l'app n'en paie aucun.
+# Les fichiers uploadés sont lus en mémoire (nom, BytesIO) : rien n'est écrit sur disque,
+# et deux sessions qui envoient des fichiers de même nom ne se marchent pas dessus.
+# Les sorties des outils (artifacts) vont dans un répertoire temporaire par exécution, supprimé
+# dès le résultat affiché : aucun texte issu des documents ne reste sur le serveur.
 
 # Configuration de l'interface
 st.title("Agent Consultant IA - Interface Utilisateur")
@@ -19,6 +17,10 @@ st.write("Cette application permet d'utiliser plusieurs outils pour rédiger des
 st.header("Configuration Globale")
 llm_provider = st.selectbox("Choisir le fournisseur LLM", ["xai", "openai"], index=0)
 st.write("Assurez-vous que la clé API correspondante (`XAI_API_KEY` ou `OPENAI_API_KEY`) est définie dans votre environnement.")
+# Option de cette session, passée aux outils : le réglage global du processus (partagé par toutes
+# les sessions) n'est pas modifié
+hedging = st.checkbox("Hedging xAI/OpenAI (doublon chez l'autre fournisseur si la réponse tarde, réduit la latence de queue)",
+                      value=False)
 
 
 # Section 1 : SynthesisTool
@@ -27,23 +29,18 @@ word_file = st.file_uploader("Charger un fichier Word (.docx)", type=["docx"], k
 
 if st.button("Générer la synthèse", key="synthesis_button"):
     if word_file:
-        file_path = word_file.name
-        with open(file_path, "wb") as f:
-            f.write(word_file.getbuffer())
-
         try:
-            tool = SynthesisTool(llm_provider=llm_provider)
-            result = tool._run(file_path)
+            from synthesis_tool import SynthesisTool
+            with tempfile.TemporaryDirectory(prefix="dtautomation-") as run_dir:
+                tool = SynthesisTool(llm_provider=llm_provider, output_dir=run_dir, hedging=hedging)
+                result = tool._run(io.BytesIO(word_file.getbuffer()))
             st.subheader("Synthèse Structurée")
             st.write(result)
 
-            with open("structured_synthesis.txt", "r", encoding="utf-8") as f:
-                st.download_button("Télécharger structured_synthesis.txt", f.read(), file_name="structured_synthesis.txt", key="download_synthesis")
+            # Synthèse de cette session, servie depuis la mémoire
+            st.download_button("Télécharger structured_synthesis.txt", result, file_name="structured_synthesis.txt", key="download_synthesis")
         except Exception as e:
             st.error(f"Erreur lors de la génération de la synthèse : {str(e)}")
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
     else:
         st.warning("Veuillez charger un fichier Word.")
 
@@ -57,9 +54,11 @@ website_url = st.text_input("URL du site web (optionnel)", "www.ekonsilio.com",
 if st.button("Analyser les innovations", key="innovation_button"):
     if synthesis_input and solution_name and company_name:
         try:
+            from innovationanalysistool import InnovationAnalysisTool
             tool = InnovationAnalysisTool()
             website = website_url if website_url else None
-            result = tool._run(synthesis_input, solution_name, company_name, website, llm_provider=llm_provider)
+            result = tool._run(synthesis_input, solution_name, company_name, website, llm_provider=llm_provider,
+                               hedging=hedging)
             st.subheader("Analyse des Innovations")
             st.write(result)
         except Exception as e:
@@ -78,6 +77,7 @@ market_company_name = st.text_input("Nom de l'entreprise", "Citykomi", key="mark
 if st.button("Réaliser l'étude de marché", key="market_button"):
     if market_synthesis and market_solution_name and market_company_name:
         try:
+            from marketstudytool import MarketStudyTool
             tool = MarketStudyTool()
             result = tool._run(
                 synthesis=market_synthesis,
@@ -85,7 +85,8 @@ if st.button("Réaliser l'étude de marché", key="market_button"):
                 innovation_analysis=innovation_analysis,
                 solution_name=market_solution_name,
                 company_name=market_company_name,
-                llm_provider=llm_provider
+                llm_provider=llm_provider,
+                hedging=hedging
             )
             st.subheader("Étude de Marché")
             st.write(result)
@@ -101,30 +102,22 @@ uploaded_files_guess = st.file_uploader("Uploader les fichiers pour la stratégi
 project_synthesis_guess = st.text_area("Synthèse du projet (obligatoire, guidant la stratégie de rédaction)", "Entrez la synthèse ici", key="guess_synthesis")
 
 if uploaded_files_guess and project_synthesis_guess:
-    # Créer un répertoire temporaire temp_dir pour stocker les fichiers
-    temp_dir = "temp_dir_guess"
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)  # Créer le répertoire s'il n'existe pas
-
-    file_paths_guess = []
-    # Sauvegarder les fichiers dans temp_dir avec leurs noms originaux
-    for uploaded_file in uploaded_files_guess:
-        temp_file_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        file_paths_guess.append(temp_file_path)
+    # Fichiers en mémoire avec leurs noms originaux : (nom, contenu)
+    file_paths_guess = [(uploaded_file.name, io.BytesIO(uploaded_file.getbuffer())) for uploaded_file in uploaded_files_guess]
 
     # Champ pour les informations des fichiers
     file_infos_guess = []
-    for file_path in file_paths_guess:
-        file_info = st.text_area(f"Informations pour {os.path.basename(file_path)} (ex. type de contenu, description)", key=f"file_info_{os.path.basename(file_path)}")
-        file_infos_guess.append(file_info if file_info else f"Pour le fichier {os.path.basename(file_path)}, la position est dossier source. Contenu : contenu générique.")
+    for file_name, _ in file_paths_guess:
+        file_info = st.text_area(f"Informations pour {file_name} (ex. type de contenu, description)", key=f"file_info_{file_name}")
+        file_infos_guess.append(file_info if file_info else f"Pour le fichier {file_name}, la position est dossier source. Contenu : contenu générique.")
 
     if st.button("Générer la stratégie de rédaction", key="guess_button"):
         if file_paths_guess:
             try:
-                tool = GuessStrategyTool(llm_provider=llm_provider)
-                result = tool._run(file_paths_guess, file_infos_guess, project_synthesis_guess)
+                from guessstrategytool import GuessStrategyTool
+                with tempfile.TemporaryDirectory(prefix="dtautomation-") as run_dir:
+                    tool = GuessStrategyTool(llm_provider=llm_provider, output_dir=run_dir, hedging=hedging)
+                    result = tool._run(file_paths_guess, file_infos_guess, project_synthesis_guess)
                 st.subheader("Stratégie de Rédaction Suggerée")
                 for file_name, parts in result.items():
                     st.write(f"{file_name}: {', '.join(str(p) for p in parts)}")
@@ -136,10 +129,6 @@ if uploaded_files_guess and project_synthesis_guess:
                 st.error(f"Erreur lors de la génération de la stratégie : {str(e)}")
         else:
             st.warning("Veuillez uploader au moins un fichier.")
-
-        # Nettoyer le répertoire temporaire
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)  # Supprimer temp_dir et tous ses fichiers
 elif not project_synthesis_guess:
     st.warning("Veuillez entrer la synthèse du projet (obligatoire).")
 
@@ -152,22 +141,11 @@ uploaded_files = st.file_uploader("Uploader les fichiers", accept_multiple_files
 project_synthesis = st.text_area("Synthèse du projet (obligatoire)", "Entrez la synthèse ici pour guider la rédaction des travaux", key="directdraft_synthesis")
 
 if uploaded_files and project_synthesis:
-    # Créer un répertoire temporaire temp_dir pour stocker les fichiers
-    temp_dir = "temp_dir"
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)  # Créer le répertoire s'il n'existe pas
-
-    file_paths = []
-    # Sauvegarder les fichiers dans temp_dir avec leurs noms originaux
-    for uploaded_file in uploaded_files:
-        # Utiliser le nom original dans temp_dir (ex. temp_dir/Fonctionnalités.pdf)
-        temp_file_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        file_paths.append(temp_file_path)
+    # Fichiers en mémoire avec leurs noms originaux (ex. ("Fonctionnalités.pdf", BytesIO))
+    file_paths = [(uploaded_file.name, io.BytesIO(uploaded_file.getbuffer())) for uploaded_file in uploaded_files]
 
     # Charger les informations des fichiers (à adapter selon ton interface)
-    file_infos = [f"Pour le fichier {os.path.basename(f)}, la position est dossier source. Contenu : contenu générique." for f in file_paths]
+    file_infos = [f"Pour le fichier {name}, la position est dossier source. Contenu : contenu générique." for name, _ in file_paths]
 
     # Charger les suggestions de chunks_to_draft.txt (optionnel)
     chunks_to_draft_content = st.file_uploader("Uploader chunks_to_draft.txt (optionnel)", type=["txt"])
@@ -191,8 +169,7 @@ if uploaded_files and project_synthesis:
     all_chunks_to_draft = {}  # Pour stocker les choix "Tout rédiger"
     st.write("Spécifiez les numéros des chunks à rédiger pour chaque fichier :")
     chunk_inputs = {}
-    for file_path in file_paths:
-        file_name = os.path.basename(file_path)  # Récupérer le nom original sans temp_dir
+    for file_name, _ in file_paths:
         default_value = ", ".join(str(p) for p in suggested_chunks.get(file_name, [])) if file_name in suggested_chunks else ""
         chunk_inputs[file_name] = st.text_input(f"Chunks pour {file_name} (ex. 1, 3, 5)", value=default_value)
         all_chunks_to_draft[file_name] = st.checkbox(f"Rédiger tous les chunks pour {file_name}")
@@ -202,8 +179,9 @@ if uploaded_files and project_synthesis:
         for file_name, input_text in chunk_inputs.items():
             if all_chunks_to_draft[file_name]:
                 # Si "Tout rédiger" est coché, ajouter tous les chunks disponibles
+                from fileprocessingtool import FileProcessingTool
                 file_processor = FileProcessingTool()
-                all_chunks = file_processor._run([f for f in file_paths if os.path.basename(f) == file_name])
+                all_chunks = file_processor._run([f for f in file_paths if f[0] == file_name])
                 if all_chunks:
                     chunks_by_file = {chunk["source"]: [chunk["part_id"] for chunk in all_chunks if chunk["source"] == file_name] for chunk in all_chunks}
                     user_chunks_to_draft.extend((file_name, part_id) for part_id in chunks_by_file.get(file_name, []))
@@ -214,8 +192,10 @@ if uploaded_files and project_synthesis:
         if user_chunks_to_draft:
             # Lancer DirectDraftingTool
             try:
-                tool = DirectDraftingTool(llm_provider="xai")
-                result = tool._run(file_paths, file_infos, project_synthesis, user_chunks_to_draft)
+                from directdraftingtool import DirectDraftingTool
+                with tempfile.TemporaryDirectory(prefix="dtautomation-") as run_dir:
+                    tool = DirectDraftingTool(llm_provider="xai", output_dir=run_dir, hedging=hedging)
+                    result = tool._run(file_paths, file_infos, project_synthesis, user_chunks_to_draft)
                 st.write("Résultat :")
                 st.text(result)
 
@@ -225,10 +205,6 @@ if uploaded_files and project_synthesis:
                 st.error(f"Erreur lors de la génération des travaux : {str(e)}")
         else:
             st.write("Veuillez spécifier au moins un chunk à rédiger ou cocher 'Rédiger tous les chunks' pour un fichier.")
-
-        # Nettoyer le répertoire temporaire
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)  # Supprimer temp_dir et tous ses fichiers
 elif not project_synthesis:
     st.warning("Veuillez entrer la synthèse du projet (obligatoire).")
 
@@ -300,6 +276,7 @@ if st.button("Rédiger la section", key="draft_button"):
         st.warning("Le nom de la solution est requis pour les sections 1.2 et 1.3.")
     else:
         try:
+            from draftingtool import DraftingTool
             tool = DraftingTool()
             result = tool._run(
                 content_to_draft=content_to_draft if content_to_draft else "",
@@ -308,7 +285,8 @@ if st.button("Rédiger la section", key="draft_button"):
                 solution_name=solution_name if solution_name else "",
                 company_name=company_name if company_name else "",
                 example_text=example_text if example_text else None,
-                llm_provider=llm_provider
+                llm_provider=llm_provider,
+                hedging=hedging
             )
             st.subheader(f"Texte Rédigé - Section {selected_section} - {section_names[selected_section]}")
             st.write(result)
@@ -317,6 +295,21 @@ if st.button("Rédiger la section", key="draft_button"):
             if "SearchTool" in str(e):
                 st.warning("La section 1.6 nécessite SearchTool, qui n'est pas implémenté. Résultat limité à la synthèse fournie.")
 
+# Section 8 : Métriques des appels LLM (latence, tokens, coût) du processus Streamlit,
+# partagées par toutes les sessions ouvertes sur le serveur
+st.header("Métriques des appels LLM (serveur)")
+st.caption("Appels de toutes les sessions depuis le démarrage du serveur, pas seulement de cette session.")
+from llmmetrics import get_metrics
+llm_metrics = get_metrics()
+if llm_metrics.records():
+    metrics_summary = llm_metrics.summary()
+    st.json(metrics_summary)
+    # Agrégats seulement : le détail des appels (chunk_id) contient les noms des fichiers des autres sessions
+    st.download_button("Télécharger llm_metrics.json", json.dumps({"summary": metrics_summary}, ensure_ascii=False, indent=2), file_name="llm_metrics.json", key="download_metrics_json")
+    st.download_button("Télécharger llm_metrics.prom", llm_metrics.to_prometheus(), file_name="llm_metrics.prom", key="download_metrics_prom")
+else:
+    st.write("Aucun appel LLM enregistré pour le moment.")
+
 # Instructions pour exécuter
 st.write("**Instructions** : Assurez-vous d'avoir installé les dépendances (`streamlit`, `python-docx`, `PyPDF2`, `openai`, `crewai`, `pandas`, `python-pptx`) et défini les clés API (`XAI_API_KEY` ou `OPENAI_API_KEY`).")
 st.write("Pour exécuter localement : `streamlit run app.py`.")
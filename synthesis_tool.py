@@ -1,7 +1,9 @@
 import os
 import logging
-from docx import Document
+from typing import Optional
 from openai import OpenAI
+from llmclient import chat_completion
+from artifacts import RunArtifacts
 from crewai.tools import BaseTool
 
 # Configuration du logging
@@ -12,16 +14,25 @@ class SynthesisTool(BaseTool):
     name: str = "synthesis_tool"
     description: str = "Outil pour générer une synthèse structurée à partir d'un fichier Word contenant des informations dispersées."
     llm_provider: str = "LLm provider"  # Fournisseur LLM par défaut
+    # Répertoire des artefacts (artifacts) ; None : un répertoire neuf par exécution sous ARTIFACTS_ROOT
+    output_dir: Optional[str] = None
+    # Hedging xAI/OpenAI de cet outil (llmclient) ; None : réglage du processus (LLM_HEDGING)
+    hedging: Optional[bool] = None
 
-    def __init__(self, llm_provider: str = "xai"):
+    def __init__(self, llm_provider: str = "xai", output_dir: Optional[str] = None, hedging: Optional[bool] = None):
         """
         Initialise l'outil avec un fournisseur LLM.
 
         Args:
             llm_provider (str): Fournisseur du LLM ("xai" ou "openai"). Par défaut "xai".
+            output_dir (str, optional): Répertoire de structured_synthesis.txt. Par défaut, un
+                répertoire neuf par exécution sous ARTIFACTS_ROOT.
+            hedging (bool, optional): Hedging xAI/OpenAI pour cet outil. Par défaut, réglage du processus.
         """
         super().__init__()
         self.llm_provider = llm_provider.lower()
+        self.output_dir = output_dir
+        self.hedging = hedging
         logger.info(f"SynthesisTool initialisé avec llm_provider : {self.llm_provider}")
 
     def _run(self, file_path: str) -> str:
@@ -29,7 +40,7 @@ class SynthesisTool(BaseTool):
         Génère une synthèse structurée à partir d'un fichier Word.
 
         Args:
-            file_path (str): Chemin vers le fichier Word (.docx).
+            file_path (str): Chemin vers le fichier Word (.docx), ou objet fichier binaire (ex. BytesIO d'un upload).
 
         Returns:
             str: Synthèse structurée sous forme de texte.
@@ -39,7 +50,7 @@ class SynthesisTool(BaseTool):
         # Étape 1 : Configurer le LLM
         if self.llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
             model_id = "grok-3-beta"
         else:
             api_key = os.getenv("OPENAI_API_KEY")
@@ -50,11 +61,12 @@ class SynthesisTool(BaseTool):
             logger.error(f"Clé API pour {self.llm_provider.upper()}_API_KEY non définie.")
             return f"Erreur : Clé API pour {self.llm_provider.upper()}_API_KEY non définie."
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
         logger.info(f"LLM configuré avec provider : {self.llm_provider}")
 
         # Étape 2 : Lire le fichier Word
         try:
+            from docx import Document  # Import différé : python-docx n'est chargé qu'à la première synthèse
             doc = Document(file_path)
             full_text = []
             for para in doc.paragraphs:
@@ -82,7 +94,9 @@ class SynthesisTool(BaseTool):
         )
 
         try:
-            response = client.chat.completions.create(
+            response = chat_completion(
+                client, self.name, self.llm_provider,
+                hedging=self.hedging,
                 model=model_id,
                 messages=[{"role": "user", "content": synthesis_prompt}],
                 max_tokens=400,
@@ -94,11 +108,9 @@ class SynthesisTool(BaseTool):
             logger.error(f"Erreur lors de la génération de la synthèse : {str(e)}")
             return f"Erreur lors de la génération de la synthèse : {str(e)}"
 
-        # Étape 4 : Sauvegarder la synthèse dans un fichier
-        output_file = "structured_synthesis.txt"
+        # Étape 4 : Sauvegarder la synthèse dans le répertoire de l'exécution (écriture atomique)
         try:
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(structured_synthesis)
+            output_file = RunArtifacts.for_run(self.name, self.output_dir).write_text("structured_synthesis.txt", structured_synthesis)
             logger.info(f"Synthèse sauvegardée dans {output_file}")
         except Exception as e:
             logger.error(f"Erreur lors de l'écriture de la synthèse : {str(e)}")
@@ -0,0 +1,62 @@
+"""
+Nettoyage du texte extrait (textcleaning) : le gabarit des pages part, les chiffres du
+contenu (cellules de tableau, montants, années, résultats) restent.
+
+Utilisation :
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textcleaning import clean_pages  # noqa: E402
+
+FIGURES = ["120000", "45000", "250", "1800"]
+
+
+def report_pages():
+    """Quatre pages : en-tête et pied répétés, numéro de page, tableau de budget et résultats."""
+    return [
+        f"Société X - Rapport CIR\n"
+        f"Budget du lot {index + 1}\n"
+        f"{figure}\n"
+        f"{2023 + index % 2}\n"
+        f"Résultat : {240 + index} / 1800\n"
+        f"Confidentiel – page {index + 1} / 4\n"
+        f"{index + 1}"
+        for index, figure in enumerate(FIGURES)
+    ]
+
+
+def test_figures_and_table_cells_survive():
+    text, stats = clean_pages(report_pages())
+    lines = text.splitlines()
+    for figure in FIGURES + ["2023", "2024"]:
+        assert figure in lines
+    for index in range(4):
+        assert f"Budget du lot {index + 1}" in lines
+        assert f"Résultat : {240 + index} / 1800" in lines
+
+
+def test_headers_footers_and_page_numbers_removed():
+    text, stats = clean_pages(report_pages())
+    assert "Rapport CIR" not in text
+    assert "Confidentiel" not in text
+    assert stats["page_numbers_removed"] == 4
+    assert not any(line in {"1", "2", "3", "4"} for line in text.splitlines())
+
+
+def test_numbers_inside_a_page_are_not_page_numbers():
+    pages = [f"Mesures du banc {index}\n{index} sur 3\n{index} / 3\n{index}\nFin des mesures {index}" for index in range(1, 4)]
+    text, stats = clean_pages(pages)
+    assert stats["page_numbers_removed"] == 0
+    assert text == "\n".join(pages)
+
+
+def test_implausible_page_number_kept():
+    pages = ["Essais\n120000", "Essais bis\n45000", "Essais ter\n12 sur 40"]
+    text, stats = clean_pages(pages)
+    assert stats["page_numbers_removed"] == 0
+    for value in ("120000", "45000", "12 sur 40"):
+        assert value in text
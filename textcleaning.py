@@ -0,0 +1,120 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import List, Tuple
+
+from tokencount import count_tokens
+
+# Nettoyage du texte extrait, entre l'extraction et le découpage : en-têtes, pieds de page,
+# numéros de page et mentions répétées sur chaque page ne doivent pas partir dans les prompts.
+
+# Une ligne présente sur au moins cette part des pages (et au moins MIN_REPEATS pages) est du gabarit
+REPEAT_RATIO = 0.5
+MIN_REPEATS = 3
+
+# Numéro de page seul sur sa ligne : "3", "- 3 -", "Page 3", "3 / 12", "page 3 sur 12"
+_PAGE_NUMBER_RE = re.compile(r"^(?:page\s*)?[-–—(\[]?\s*(\d{1,4})\s*(?:(?:/|sur|of)\s*(\d{1,4}))?\s*[-–—)\]]?$",
+                             re.IGNORECASE)
+# Mention de page dans un en-tête ou un pied de page : "Rapport 2024 – page 3", "Page 3 sur 12"
+_PAGE_MENTION_RE = re.compile(r"\b(?:page|p\.)\s*\d{1,4}\b", re.IGNORECASE)
+_HYPHENATION_RE = re.compile(r"([^\W\d_])[-‐]\s*\n\s*([a-zà-ÿœæ])")
+_SPACES_RE = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def _line_key(line: str) -> str:
+    """
+    Clé de comparaison d'une ligne, espaces réduits. Les chiffres ne sont neutralisés que dans
+    les lignes qui mentionnent une page ("Page 3" = "Page 4") : une cellule de tableau, un
+    montant, une année ou un titre numéroté ("Lot 2") garde sa valeur.
+    """
+    key = _SPACES_RE.sub(" ", line.strip().lower())
+    return re.sub(r"\d+", "#", key) if _PAGE_MENTION_RE.search(key) else key
+
+
+def _is_page_number(line: str, page_count: int) -> bool:
+    """
+    Ligne réduite à un numéro de page plausible : numéro entre 1 et le nombre de pages, et
+    total égal au nombre de pages s'il est indiqué ("3 / 12").
+    """
+    match = _PAGE_NUMBER_RE.match(line)
+    if not match:
+        return False
+    number, total = int(match.group(1)), match.group(2)
+    if total is not None:
+        return 1 <= number <= int(total) == page_count
+    return 1 <= number <= page_count
+
+
+def repeated_line_keys(pages: List[str], ratio: float = REPEAT_RATIO, min_repeats: int = MIN_REPEATS) -> set:
+    """Clés des lignes répétées sur une grande part des pages (ou diapositives)."""
+    if len(pages) < min_repeats:
+        return set()
+    counts = Counter()
+    for page in pages:
+        counts.update({_line_key(line) for line in page.splitlines() if line.strip()})
+    threshold = max(min_repeats, ratio * len(pages))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def clean_pages(pages: List[str], model: str = None) -> Tuple[str, dict]:
+    """
+    Nettoie le texte d'un document découpé en pages :
+        - normalisation Unicode NFKC (ligatures, espaces insécables, formes de compatibilité) ;
+        - suppression des lignes répétées sur la plupart des pages (en-têtes, pieds, mentions légales)
+          et des numéros de page (première ou dernière ligne non vide d'une page seulement) ;
+        - recollage des mots coupés en fin de ligne ("développe-\\nment" → "développement") ;
+        - réduction des espaces et des lignes vides.
+
+    Args:
+        pages (list): Texte de chaque page ou diapositive (un seul élément pour un document continu).
+        model (str, optional): Modèle dont le tokenizer compte les tokens retirés.
+
+    Returns:
+        tuple: (texte nettoyé, statistiques du nettoyage).
+    """
+    raw = "\n".join(pages)
+    pages = [unicodedata.normalize("NFKC", page) for page in pages]
+    boilerplate = repeated_line_keys(pages)
+
+    kept_pages, removed_lines, page_numbers = [], 0, 0
+    for page in pages:
+        kept = []
+        lines = page.splitlines()
+        # Première et dernière lignes du contenu, une fois en-têtes et pieds de page retirés
+        filled = [index for index, line in enumerate(lines)
+                  if line.strip() and _line_key(line) not in boilerplate]
+        edges = {filled[0], filled[-1]} if filled else set()
+        for index, line in enumerate(lines):
+            stripped = line.strip()
+            if not stripped:
+                kept.append("")
+            elif _line_key(stripped) in boilerplate:
+                removed_lines += 1
+            elif len(pages) > 1 and index in edges and _is_page_number(stripped, len(pages)):
+                page_numbers += 1
+            else:
+                kept.append(stripped)
+        kept_pages.append("\n".join(kept))
+
+    text = "\n".join(kept_pages)
+    text, hyphenations = _HYPHENATION_RE.subn(r"\1\2", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+    words_before, words_after = len(raw.split()), len(text.split())
+    tokens_before, tokens_after = count_tokens(raw, model), count_tokens(text, model)
+    stats = {
+        "pages": len(pages),
+        "boilerplate_lines": len(boilerplate),
+        "lines_removed": removed_lines,
+        "page_numbers_removed": page_numbers,
+        "hyphenations_fixed": hyphenations,
+        "words_before": words_before,
+        "words_after": words_after,
+        "words_removed": words_before - words_after,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_removed": tokens_before - tokens_after,
+    }
+    return text, stats
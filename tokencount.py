@@ -0,0 +1,49 @@
+import threading
+
+# Comptage des tokens pour le découpage et l'estimation des prompts.
+# tiktoken est optionnel : sans lui (ou sans accès à ses fichiers d'encodage, téléchargés
+# au premier usage), on retombe sur une estimation à ≈ 4 caractères par token.
+
+# Encodage par modèle ; grok n'a pas de tokenizer public, o200k_base en est une bonne approximation
+MODEL_ENCODINGS = {
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+    "grok-3-beta": "o200k_base",
+    "grok-3-mini-beta": "o200k_base",
+}
+DEFAULT_ENCODING = "o200k_base"
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model: str = None):
+    """
+    Retourne l'encodeur tiktoken du modèle, ou None si tiktoken est indisponible.
+    """
+    encoding = MODEL_ENCODINGS.get(model, DEFAULT_ENCODING)
+    with _encoders_lock:
+        if encoding not in _encoders:
+            try:
+                import tiktoken
+                _encoders[encoding] = tiktoken.get_encoding(encoding)
+            except Exception:  # Module absent ou fichier d'encodage non téléchargeable
+                _encoders[encoding] = None
+        return _encoders[encoding]
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """
+    Nombre de tokens de `text` pour le modèle (exact avec tiktoken, estimé sinon).
+    """
+    if not text:
+        return 0
+    encoder = get_encoder(model)
+    if encoder is None:
+        return max(1, -(-len(text) // 4))
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def is_exact(model: str = None) -> bool:
+    """Indique si count_tokens utilise un vrai tokenizer pour ce modèle."""
+    return get_encoder(model) is not None
@@ -0,0 +1,118 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from chunkdecisions import PLAN_JSON_FORMAT, TraversalPlan
+from llmscheduler import estimate_request_tokens
+
+# Mode plan des outils de parcours (WorkDraftingTool, GuessStrategyTool) : au lieu d'un appel
+# par saut, un appel de planification voit la table des matières du fichier (numéros et
+# aperçus des morceaux, chunkdigest) et retourne les morceaux à traiter, qui sont ensuite
+# traités en parallèle. Les appels parallèles sont indépendants : chaque morceau est envoyé en
+# entier, recouvrement compris (seul le parcours adaptatif peut n'envoyer que le texte nouveau).
+
+# Tokens générés au plus par l'appel de planification
+PLAN_MAX_TOKENS = 400
+
+TRAVERSALS = ("walk", "plan", "auto")
+# Mode auto : plan à partir de ce nombre de morceaux, parcours adaptatif en dessous
+PLAN_MIN_CHUNKS = int(os.getenv("PLAN_MIN_CHUNKS", 30))
+# Appels de morceaux lancés en parallèle (la concurrence réelle reste bornée par llmscheduler)
+PLAN_MAX_WORKERS = int(os.getenv("PLAN_MAX_WORKERS", 8))
+
+
+def use_plan(traversal: str, total_chunks: int) -> bool:
+    """Vrai si le fichier doit être traité en mode plan (tout autre mode que plan et auto : parcours adaptatif)."""
+    return traversal == "plan" or (traversal == "auto" and total_chunks >= PLAN_MIN_CHUNKS)
+
+
+def build_plan_messages(goal: str, synthesis: str, file_name: str, file_info: str, total_chunks: int,
+                        guess: str, toc: str) -> List[dict]:
+    """
+    Messages de l'appel de planification.
+
+    Args:
+        goal (str): Ce que l'outil fera des morceaux retenus (rédiger des travaux, évaluer leur pertinence).
+        synthesis (str): Synthèse succincte du projet.
+        file_name, file_info, total_chunks, guess: Fichier, informations, nombre de morceaux, guess initial.
+        toc (str): Table des matières du fichier (chunkdigest.table_of_contents).
+
+    Returns:
+        list: Messages système et utilisateur.
+    """
+    system = (
+        "Vous planifiez le parcours d'un fichier découpé en morceaux, dans le cadre d'un projet.\n"
+        f"Les morceaux retenus serviront à {goal}. À partir de la table des matières (aperçu de chaque "
+        "morceau), retenez les morceaux qui apportent une information utile au projet et écartez ceux qui "
+        "n'apporteraient rien de nouveau (répétitions, annexes, sommaires, documentation externe).\n"
+        "**Instructions importantes** : Vous DEVEZ retourner uniquement un objet JSON de cette forme :\n"
+        f"{PLAN_JSON_FORMAT}\n"
+        f"La synthèse succincte du projet est : {synthesis}."
+    )
+    user = (
+        f"Fichier : '{file_name}'.\n"
+        f"Informations sur le fichier : {file_info}.\n"
+        f"Guess actuel sur le fichier : {guess}.\n"
+        f"Nombre total de morceaux : {total_chunks}.\n"
+        f"Table des matières :\n{toc}"
+    )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def run_plan(budget, goal: str, synthesis: str, file_name: str, file_info: str, total_chunks: int, guess: str,
+             toc: str, call_plan: Callable[[List[dict]], TraversalPlan],
+             prepare_chunk: Callable[[int, List[int], str], Optional[List[dict]]], chunk_max_tokens: int,
+             call_chunk: Callable, record_chunk: Callable, record_error: Callable, processed: List[int],
+             log: Callable = print) -> Tuple[Optional[bool], str]:
+    """
+    Mode plan d'un fichier : appel de planification, puis appels des morceaux retenus en parallèle.
+
+    Args:
+        budget (RunBudget): Budget de l'exécution (plan et morceaux).
+        goal, synthesis, file_name, file_info, total_chunks, guess, toc: Entrées de build_plan_messages.
+        call_plan (callable): messages -> TraversalPlan validé (appel de planification de l'outil).
+        prepare_chunk (callable): (part_id, morceaux du plan, guess) -> messages du morceau, ou None
+            s'il est écarté sans appel (double déjà traité, pré-filtre).
+        chunk_max_tokens (int): max_tokens d'un appel de morceau (estimation du budget).
+        call_chunk (callable): (file_name, part_id, messages) -> (décision, texte de la réponse).
+        record_chunk (callable): (file_name, part_id, décision, texte) : enregistre la réponse.
+        record_error (callable): (file_name, part_id, exception) : enregistre l'échec.
+        processed (list): Morceaux traités du fichier, complétée par les morceaux lancés.
+        log (callable): (message, niveau) pour la journalisation de l'outil.
+
+    Returns:
+        tuple: (True si le plan a été exécuté jusqu'au bout, False si le budget l'a interrompu,
+        None si le plan n'a pas pu être obtenu (parcours adaptatif à la place) ; guess mis à jour).
+    """
+    messages = build_plan_messages(goal, synthesis, file_name, file_info, total_chunks, guess, toc)
+    if not budget.allows(messages, PLAN_MAX_TOKENS):
+        return False, guess
+    try:
+        plan = call_plan(messages)
+    except Exception as e:
+        log(f"Plan indisponible pour {file_name} ({str(e)}) : parcours adaptatif.", "warning")
+        return None, guess
+    guess = plan.guess.strip() or guess
+    log(f"Plan pour {file_name} : {len(plan.morceaux)} morceau(x) sur {total_chunks} : {plan.morceaux}", "info")
+
+    # Morceaux du plan : ceux écartés sans appel sont sautés, le budget borne le nombre d'appels lancés
+    jobs, pending_tokens, complete = [], 0, True
+    for part_id in plan.morceaux:
+        chunk_messages = prepare_chunk(part_id, plan.morceaux, guess)
+        if chunk_messages is None:
+            continue
+        if not budget.allows(chunk_messages, chunk_max_tokens, pending_calls=len(jobs), pending_tokens=pending_tokens):
+            complete = False
+            break
+        pending_tokens += estimate_request_tokens(chunk_messages, chunk_max_tokens)
+        processed.append(part_id)
+        jobs.append((part_id, chunk_messages))
+
+    with ThreadPoolExecutor(max_workers=PLAN_MAX_WORKERS) as pool:
+        futures = [pool.submit(call_chunk, file_name, part_id, chunk_messages) for part_id, chunk_messages in jobs]
+        for (part_id, _), future in zip(jobs, futures):
+            try:
+                record_chunk(file_name, part_id, *future.result())
+            except Exception as e:
+                record_error(file_name, part_id, e)
+    return complete, guess
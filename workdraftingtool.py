@@ -1,32 +1,55 @@
 from crewai.tools import BaseTool
+from pydantic import Field
 from openai import OpenAI
+from llmclient import chat_completion, structured_chat_completion
+from chunkdecisions import WORK_JSON_FORMAT, TraversalPlan, WorkChunkDecision
+from llmscheduler import is_fatal
 import os
 import logging
 import sys
-import re
-from typing import List
-from fileprocessingtool import FileProcessingTool
-
-# Configuration explicite du logging
-logging.getLogger('').handlers = []
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from fileprocessingtool import FileProcessingTool, chunk_payload, document_name
+from chunkstore import ChunkStore
+from chunkdedup import DedupReport, find_duplicates
+from runcache import RunCache, file_fingerprint
+from budget import RELEVANCE_INSTRUCTION, RunBudget, relevance_score, strip_relevance_line
+from traversalplan import PLAN_MAX_TOKENS, run_plan, use_plan
+from chunkdigest import table_of_contents
+from documentoutline import format_outline
+from modelregistry import route_models, routing_enabled
+from decisionlog import SKIPPED, DecisionLog
+from relevancefilter import DEFAULT_THRESHOLD, RelevanceClassifier
+from artifacts import RunArtifacts
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.propagate = False
 
-logger.handlers = []
+# Configuration explicite du logging, différée au premier outil instancié :
+# l'import du module ne touche ni aux handlers ni à global_history.log.
+def configure_logging():
+    if logger.handlers:
+        return
+    logging.getLogger('').handlers = []
+
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
 
-# Utiliser StreamHandler sans sys.stdout pour Colab
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+    # Utiliser StreamHandler sans sys.stdout pour Colab
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
 
-file_handler = logging.FileHandler("global_history.log", mode='w', encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+    file_handler = logging.FileHandler("global_history.log", mode='w', encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+
+    print("Configuration du logging en cours...")
+    log_and_print("Logging configuré avec succès. Si ce message n'apparaît pas, il y a un problème avec le logging.")
+    print("Configuration du logging terminée.")
 
 # Fonction pour logger et afficher immédiatement dans Colab
 def log_and_print(message, level="info"):
@@ -34,18 +57,108 @@ def log_and_print(message, level="info"):
     print(f"[{level.upper()}] {message}")
     sys.stdout.flush()
 
-print("Configuration du logging en cours...")
-log_and_print("Logging configuré avec succès. Si ce message n'apparaît pas, il y a un problème avec le logging.")
-print("Configuration du logging terminée.")
+# Instructions du prompt par morceau, identiques pour tous les morceaux et tous les fichiers :
+# envoyées en message système, en tête de requête, elles forment un préfixe stable que le
+# cache de prompt des fournisseurs réutilise d'un appel à l'autre. Tout ce qui varie
+# (fichier, guess, morceaux traités, texte du morceau) suit dans le message utilisateur.
+WORK_CHUNK_INSTRUCTIONS = (
+    "Vous êtes un rédacteur de travaux réalisés dans le cadre d'un projet.\n"
+    "Votre rôle est de rédiger du fichier (décomposés en chunks) en travaux en lien avec le projet.\n"
+    "L'objectif est de faire des guess sur le fichier à l'aide des morceaux et de la synthèse du projet pour décider comment pour parcourir les chunks.\n"
+    "Par exemple, pour les fichiers longs (chunks >30),tu sautes des morceaux selon ton guess sur le fichier et le contenu probable (que tu dévines) des morceaux. Tu ne vas pas parcourir tous les morceaux, tu décides sur la base de ton guess sur le fichier et si un morceau serait intéressant ou pas à regarder.\n"
+    "Supposons que t'es au morceau 2, tu peux par exemple donner numéro 4 directement puisque t'auras jugé que ça valait pas la peine de traiter le morceau 3, parce que tu supposes que ça n'apporterait pas nouvelle information (basé sur ton guess) pour rédiger les travaux du projet.\n"
+    "Vous vous basez sur le guess actuel pour guider le parcours du fichier.\n"
+    "**Instructions importantes** : Vous DEVEZ retourner uniquement un objet JSON de cette forme :\n"
+    f"{WORK_JSON_FORMAT}\n"
+    "Le champ travaux peut contenir plusieurs paragraphes. Prochain morceau : numéro entre 1 et le nombre total de morceaux, ou 'fin'.\n"
+    "Étape 1 : Évaluez le contenu du chunk et son lien avec le projet pour le rédiger en travaux.\n"
+    "Étape 2 : S'il y a un lien, rédigez les travaux en utilisant comme sujet 'nous' avec très peu de puces et mentionnez les difficultés rencontrées (s'il y en a). Tu présentes aussi l'objectif des travaux.\n"
+    "Suis l'instruction de l'Etape 2. Ne mets pas des commentaires, des introductions. L'objectif est de rédiger sous forme de travaux.\n"
+    "Vous n'êtes pas censé dire des choses du genre : Nous avons analysé en détail ... décrites dans le document (faisant référence avec le morceau analysé), etc.\n"
+    "Ce n'est pas ça l'objectif. Ce n'est pas de décrire le contenu des fichiers. NON! Vous NE DECRIVEZ pas les morceaux. Vous rédigez le contenu directement comme des travaux réalisés. Vous transformes le morceau pour que ça sonne travaux réalisés PAS UNE DESCRIPTION!! TRES IMPORTANT\n"
+    "Notez que les premiers mots d'un chunk sont identiques à la fin du morceau précédent. Quand le morceau suit directement celui traité juste avant, ce recouvrement est omis et remplacé par une courte référence : seul le texte nouveau est à rédiger. Dans tous les cas, évitez les répétitions.\n\n"
+    "Pour donner l'impression de fluidité, s'il y a déjà eu un chunk déjà traité (il faut faire introdution pour le premier chunk), REDIGE DIRECTEMENT EN TRAVAUX, sans vouloir faire une transition ou une introduction. Tu vas commence directement par le corps du sujet, les travaux. N'UTILISE AUCUNE PHRASE DE TRANSITION, NON!\n"
+    "Étape 3 : Si le chunk n'a pas de lien avec le projet ou le contenu n'est pas intéressant, indiquez 'pas rédigé'.\n"
+    "Étape 4 : Mettez à jour votre guess sur le fichier en fonction de ce morceau.\n"
+    "Étape 5 : Choisissez le prochain morceau (numéro entre 1 et le nombre total de morceaux, ou 'fin' si rien à traiter).\n"
+    "Si un plan du fichier (sections et morceaux) est fourni, servez-vous-en : sautez directement les sections sans lien avec le projet (annexes, guides, documentations externes).\n"
+)
+
+
+def build_chunk_messages(drafting_synthesis: str, file_name: str, file_info: str, total_chunks: int,
+                         processed: List[int], guess: str, chunk: dict, previous_part_id: int = None,
+                         outline: str = "") -> List[dict]:
+    """
+    Construit les messages d'un appel par morceau : préfixe système stable (instructions et
+    synthèse succincte, constante sur tout le run) puis les données variables du morceau.
+    Si previous_part_id est le morceau précédent, seul le texte nouveau est envoyé (chunk_payload).
+    outline est le plan du fichier (format_outline), omis si le document n'a pas de titres.
+    """
+    system = f"{WORK_CHUNK_INSTRUCTIONS}\nLa synthèse succincte du projet est : {drafting_synthesis}."
+    outline_block = f"Plan du fichier (sections et morceaux) :\n{outline}\n" if outline else ""
+    user = (
+        f"Vous travaillez sur le fichier '{file_name}'.\n"
+        f"Informations sur le fichier : {file_info}.\n"
+        f"Nombre total de morceaux : {total_chunks}.\n"
+        f"Morceaux déjà traités : {processed}.\n"
+        f"Guess actuel sur le fichier : {guess}.\n"
+        f"{outline_block}"
+        f"Voici le morceau à traiter :\n"
+        f"Morceau {chunk['part_id']} : {chunk_payload(chunk, previous_part_id).strip() or 'Morceau vide'}"
+    )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
 
 class WorkDraftingTool(BaseTool):
     name: str = "work_drafting_tool"
     description: str = "Outil pour rédiger des travaux à partir de fichiers découpés, en traitant morceau par morceau avec un guess adaptatif et un historique global."
     llm_provider: str = "The LLM provider"
+    incremental: bool = True  # Réutilise les résultats des fichiers inchangés depuis la dernière exécution
+    # Budget global de l'exécution (None : sans limite, ou BUDGET_MAX_CALLS/TOKENS/SECONDS)
+    max_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    # Rédige en parallèle le morceau suivant probable (N+1) pendant le morceau N : moins de latence,
+    # mais chaque prédiction fausse est un appel payé en plus. Désactivé sauf SPECULATIVE_DRAFTING=1.
+    speculative: bool = Field(default_factory=lambda: os.getenv("SPECULATIVE_DRAFTING", "0") == "1")
+    speculation_stats: dict = Field(default_factory=dict)  # Bilan de la spéculation de la dernière exécution
+    # Parcours : "walk" (adaptatif, un appel par saut), "plan" (plan sur la table des matières puis
+    # rédaction en parallèle) ou "auto" (plan pour les fichiers d'au moins PLAN_MIN_CHUNKS morceaux)
+    traversal: str = Field(default_factory=lambda: os.getenv("TRAVERSAL_MODE", "walk"))
+    # Routage par tâche (modelregistry) : synthèse succincte, guess initial et plan sur le modèle
+    # rapide, rédaction des morceaux sur le modèle phare. Désactivé : modèle phare partout.
+    model_routing: bool = Field(default_factory=routing_enabled)
+    # Pré-filtre local (relevancefilter) : morceaux jugés non pertinents écartés sans appel LLM,
+    # si un modèle a été entraîné (RELEVANCE_MODEL_PATH). RELEVANCE_PREFILTER=0 le désactive.
+    prefilter: bool = Field(default_factory=lambda: os.getenv("RELEVANCE_PREFILTER", "1") != "0")
+    # Répertoire des artefacts (artifacts) ; None : un répertoire neuf par exécution sous ARTIFACTS_ROOT
+    output_dir: Optional[str] = None
+    # Hedging xAI/OpenAI de cet outil (llmclient) ; None : réglage du processus (LLM_HEDGING)
+    hedging: Optional[bool] = None
     
-    def __init__(self, llm_provider: str = "xai"):
+    def __init__(self, llm_provider: str = "xai", incremental: bool = True, max_calls: Optional[int] = None,
+                 max_tokens: Optional[int] = None, max_seconds: Optional[float] = None, speculative: Optional[bool] = None,
+                 traversal: Optional[str] = None, model_routing: Optional[bool] = None,
+                 prefilter: Optional[bool] = None, output_dir: Optional[str] = None, hedging: Optional[bool] = None):
         super().__init__()
+        configure_logging()
         self.llm_provider = llm_provider.lower()
+        self.incremental = incremental
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        if speculative is not None:
+            self.speculative = speculative
+        if traversal is not None:
+            self.traversal = traversal
+        if model_routing is not None:
+            self.model_routing = model_routing
+        if prefilter is not None:
+            self.prefilter = prefilter
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if hedging is not None:
+            self.hedging = hedging
         log_and_print(f"Outil initialisé avec llm_provider : {self.llm_provider}")
 
     def _run(self, file_paths: List[str], file_infos: List[str], project_synthesis: str) -> str:
@@ -56,253 +169,474 @@ class WorkDraftingTool(BaseTool):
         # Étape 1 : Configurer le LLM
         if self.llm_provider == "xai":
             api_key = os.getenv("XAI_API_KEY")
-            base_url = "https://api.x.ai/v1"
-            model_id = "grok-3-beta"
+            base_url = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")  # Surchargeable (serveur local, proxy)
         else:
             api_key = os.getenv("OPENAI_API_KEY")
             base_url = None
-            model_id = "gpt-4o"
         if not api_key:
             log_and_print(f"Clé API pour {self.llm_provider.upper()}_API_KEY non définie.", "error")
             return f"Erreur : Clé API pour {self.llm_provider.upper()}_API_KEY non définie."
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        log_and_print(f"LLM configuré avec provider : {self.llm_provider}")
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # Réessais gérés par llmscheduler
+        models = route_models(self.llm_provider, ("condensation", "guess", "planning", "drafting"), self.model_routing)
+        log_and_print(f"LLM configuré avec provider : {self.llm_provider}, modèles : {models}")
         print("LLM configuré.")
-
-        # Étape 2 : Générer une synthèse succincte pour les rédactions
-        synthesis_prompt = (
-            f"Vous êtes un expert en synthèse de projets. À partir de cette synthèse détaillée : '{project_synthesis}', "
-            f"créez une version succincte et percutante (maximum 50 mots) pour guider la rédaction des travaux. "
-            f"Cette synthèse doit refléter les objectifs clés et la pertinence des fichiers sans détails superflus."
-        )
-        try:
-            response = client.chat.completions.create(
-                model=model_id,
-                messages=[{"role": "user", "content": synthesis_prompt}],
-                max_tokens=60,
-                temperature=0.3
+        # Budget de l'exécution : les appels de cet outil comptent à partir d'ici
+        budget = RunBudget(self.name, self.max_calls, self.max_tokens, self.max_seconds)
+
+        # Cache des résultats par fichier (relance incrémentale), tenu si RUN_CACHE_PATH est défini
+        run_cache = RunCache.open_default() if self.incremental else None
+        # Décisions par morceau journalisées (jeu d'entraînement du pré-filtre), pré-filtre s'il est entraîné
+        decision_log = DecisionLog.open_default()
+        classifier = RelevanceClassifier.open_default() if self.prefilter else None
+        prefiltered_count = 0
+        if classifier:
+            log_and_print(f"Pré-filtre de pertinence chargé (seuil {DEFAULT_THRESHOLD:g}).")
+
+        # Étape 2 : Générer une synthèse succincte pour les rédactions (réutilisée si la synthèse
+        # du projet n'a pas changé : elle entre dans l'empreinte de chaque fichier)
+        drafting_synthesis = run_cache.get_synthesis(self.name, self.llm_provider, models["condensation"], project_synthesis) if run_cache else None
+        if drafting_synthesis:
+            log_and_print(f"Synthèse succincte réutilisée : {drafting_synthesis}")
+        else:
+            synthesis_prompt = (
+                f"Vous êtes un expert en synthèse de projets. À partir de cette synthèse détaillée : '{project_synthesis}', "
+                f"créez une version succincte et percutante (maximum 50 mots) pour guider la rédaction des travaux. "
+                f"Cette synthèse doit refléter les objectifs clés et la pertinence des fichiers sans détails superflus."
             )
-            drafting_synthesis = response.choices[0].message.content.strip()
-            log_and_print(f"Synthèse succincte générée : {drafting_synthesis}")
-            print(f"Synthèse succincte pour rédactions : {drafting_synthesis}")
-        except Exception as e:
-            log_and_print(f"Erreur lors de la génération de la synthèse succincte : {str(e)}", "error")
-            drafting_synthesis = "Projet axé sur des objectifs stratégiques et techniques, nécessitant une analyse ciblée des données."
+            try:
+                response = chat_completion(
+                    client, self.name, self.llm_provider,
+                    hedging=self.hedging,
+                    scope=budget.scope,
+                    model=models["condensation"],
+                    messages=[{"role": "user", "content": synthesis_prompt}],
+                    max_tokens=60,
+                    temperature=0.3
+                )
+                drafting_synthesis = response.choices[0].message.content.strip()
+                log_and_print(f"Synthèse succincte générée : {drafting_synthesis}")
+                print(f"Synthèse succincte pour rédactions : {drafting_synthesis}")
+                if run_cache:
+                    run_cache.put_synthesis(self.name, self.llm_provider, models["condensation"], project_synthesis, drafting_synthesis)
+            except Exception as e:
+                log_and_print(f"Erreur lors de la génération de la synthèse succincte : {str(e)}", "error")
+                drafting_synthesis = "Projet axé sur des objectifs stratégiques et techniques, nécessitant une analyse ciblée des données."
 
         # Étape 3 : Extraire et découper tous les fichiers avec FileProcessingTool
-        file_processor = FileProcessingTool()
-        all_chunks = file_processor._run(file_paths)
-        log_and_print(f"Extraction des chunks terminée. Nombre total de chunks : {len(all_chunks)}")
-        print("Extraction des chunks terminée.")
+        file_processor = FileProcessingTool(model=models["drafting"])  # Tokens des morceaux comptés pour le modèle de rédaction
+        chunk_store = ChunkStore()  # Morceaux écrits sur disque au fil du découpage, relus un par un
+        for error in file_processor.process_to_store(file_paths, chunk_store):
+            log_and_print(f"Erreur dans chunk : {error}", "warning")
 
-        if not all_chunks or all(chunk.get("error") for chunk in all_chunks):
+        # Étape 4 : Nombre de morceaux par fichier (les textes restent dans le magasin)
+        chunks_by_file = chunk_store.counts_by_source()
+        log_and_print(f"Extraction des chunks terminée. Nombre total de chunks : {sum(chunks_by_file.values())}")
+
+        if not chunks_by_file:
             log_and_print("Aucun fichier n’a pu être traité.", "error")
+            chunk_store.close()
+            if run_cache:
+                run_cache.close()
+            if decision_log:
+                decision_log.close()
             return "Erreur : Aucun fichier n’a pu être traité."
-
-        # Étape 4 : Organiser les morceaux par fichier
-        chunks_by_file = {}
-        for chunk in all_chunks:
-            if "error" in chunk:
-                log_and_print(f"Erreur dans chunk : {chunk['error']}", "warning")
-                continue
-            file_name = chunk["source"]  # Utilisation directe du nom sans normalisation
-            if file_name not in chunks_by_file:
-                chunks_by_file[file_name] = []
-            chunks_by_file[file_name].append(chunk)
         log_and_print(f"Organisation des chunks par fichier terminée. Fichiers trouvés : {list(chunks_by_file.keys())}")
+
+        # Quasi-doubles entre fichiers (révisions d'un même document) : un morceau dont le double
+        # a déjà été traité avec succès est sauté
+        sources = [document_name(p) for p in file_paths if document_name(p) in chunks_by_file]
+        dedup = DedupReport(find_duplicates(chunk_store, sources))
+        handled_chunks = set()  # (fichier, part_id) traités avec succès
+        if dedup.duplicates:
+            log_and_print(f"{len(dedup.duplicates)} morceau(x) quasi identique(s) à un morceau d'un autre fichier.")
         print("Organisation des chunks par fichier terminée.")
 
         # Étape 5 : Initialiser les guesses et les morceaux traités
         file_guesses = {}
+        file_scores = {}  # Pertinence estimée par le guess initial (ordre de traitement sous budget)
         processed_chunks = {}
-        works_text = []
+        deferred_chunks = {}  # Morceaux de priorité 'Basse' remis en fin de parcours (sous budget)
+        file_works = {}  # Travaux par fichier : (part_id, texte), assemblés dans l'ordre des fichiers
+        reused_files = set()  # Fichiers dont le résultat précédent est réutilisé
+        pending_files = []  # (file_name, file_info, fingerprint) des fichiers à parcourir
+        failed_files = set()
+        truncated_files = set()  # Parcours interrompu par le budget : résultat non mis en cache
+        depends_on = {}  # Fichiers dont un morceau double a permis de sauter un appel
+        last_part_ids = {}  # Dernier morceau traité avec succès (son recouvrement a été envoyé)
+        file_outlines = {}  # Plan du fichier (sections et morceaux) joint aux appels par morceau
 
         # Variable pour gérer la continuité entre les chunks
         # previous_travaux = ""  # Stocke les travaux du chunk précédent pour extraire last_words
 
-        # Étape 6 : Boucle sur les fichiers avec zip(file_paths, file_infos)
+        # Étape 6 : Fichiers vides ou inchangés, puis guess initial de chaque fichier à parcourir
         for file_path, file_info in zip(file_paths, file_infos):
-            file_name = os.path.basename(file_path)  # Récupération directe du nom du fichier
+            file_name = document_name(file_path)  # Chemin ou fichier en mémoire (nom, contenu)
             log_and_print(f"Nom de fichier extrait de file_path : {file_name}", "debug")
+            file_works[file_name] = []
             if file_name not in chunks_by_file:
-                works_text.append(f"--- Aucun contenu pour {file_name} ---")
+                file_works[file_name].append((0, f"--- Aucun contenu pour {file_name} ---"))
                 log_and_print(f"Aucun contenu trouvé pour le fichier : {file_name}", "warning")
                 continue
 
-            file_chunks = chunks_by_file[file_name]
-            total_chunks = len(file_chunks)
-            if file_name not in processed_chunks:
-                processed_chunks[file_name] = []
+            # Fichier inchangé depuis la dernière exécution : travaux précédents réutilisés, à
+            # condition que les fichiers dont il a sauté des doubles soient eux aussi inchangés
+            fingerprint = file_fingerprint(
+                file_path, file_info=file_info, synthesis=drafting_synthesis, provider=self.llm_provider,
+                models=models, chunking=file_processor.chunking, clean_text=file_processor.clean_text,
+                traversal=self.traversal, outline=file_processor.outline,
+                prefilter=f"{classifier.fingerprint}@{DEFAULT_THRESHOLD:g}" if classifier else None
+            ) if run_cache else None
+            cached = run_cache.lookup(self.name, file_name, fingerprint) if run_cache else None
+            if cached is not None and set(cached["depends_on"]) <= reused_files:
+                file_works[file_name].extend((0, works) for works in cached["works"])
+                handled_chunks.update((file_name, part_id) for part_id in cached["handled"])
+                reused_files.add(file_name)
+                log_and_print(f"{file_name} inchangé depuis la dernière exécution : travaux réutilisés.")
+                continue
+            processed_chunks[file_name] = []
+            deferred_chunks[file_name] = []
+            depends_on[file_name] = set()
+            last_part_ids[file_name] = None
+            file_outlines[file_name] = format_outline(chunk_store.outline(file_name))
 
-            # Guess initial
+            # Guess initial (avec une note de pertinence sous budget, pour ordonner les fichiers)
             initial_prompt = (
                 f"Vous êtes un analyste de projet. À partir de la synthèse du projet : '{project_synthesis}', "
                 f"du nom du fichier : '{file_name}', et des informations suivantes : {file_info}, "
                 f"estimez la pertinence de ce fichier pour rédiger des travaux. Retournez uniquement votre estimation (guess) sous forme de texte."
                 f"Tu fais au maximum 120 mots"  
+                f"{' ' + RELEVANCE_INSTRUCTION if budget.active else ''}"
             )
+            messages = [{"role": "user", "content": initial_prompt}]
+            if not budget.allows(messages, 200):
+                file_works[file_name].append((0, f"--- {file_name} non traité : budget épuisé ---"))
+                truncated_files.add(file_name)
+                continue
             try:
-                response = client.chat.completions.create(
-                    model=model_id,
-                    messages=[{"role": "user", "content": initial_prompt}],
+                response = chat_completion(
+                    client, self.name, self.llm_provider,
+                    hedging=self.hedging,
+                    scope=budget.scope,
+                    chunk_id=file_name,
+                    model=models["guess"],
+                    messages=messages,
                     max_tokens=200,
                     temperature=0.5
                 )
                 current_guess = response.choices[0].message.content.strip()
-                file_guesses[file_name] = current_guess
+                file_guesses[file_name] = strip_relevance_line(current_guess)
+                file_scores[file_name] = relevance_score(current_guess)
                 log_and_print(f"Guess initial pour {file_name} : {current_guess}")
                 print(f"Guess initial pour {file_name} calculé.")
             except Exception as e:
-                works_text.append(f"Erreur lors du guess initial pour {file_name} : {str(e)}")
+                file_works[file_name].append((0, f"Erreur lors du guess initial pour {file_name} : {str(e)}"))
                 log_and_print(f"Erreur guess initial pour {file_name} : {str(e)}", "error")
+                failed_files.add(file_name)
                 continue
+            pending_files.append((file_name, file_info, fingerprint))
+
+        def next_unprocessed(file_name: str, part_id: int):
+            """Premier morceau après part_id ni traité ni différé, ou 'fin'."""
+            skipped = set(processed_chunks[file_name]) | set(deferred_chunks[file_name])
+            return next((p for p in range(part_id + 1, chunks_by_file[file_name] + 1) if p not in skipped), "fin")
+
+        def prefiltered(file_name: str, part_id: int, chunk: dict) -> bool:
+            """Vrai si le pré-filtre écarte le morceau (marqué traité, sans appel LLM)."""
+            nonlocal prefiltered_count
+            if not classifier or not classifier.is_irrelevant(chunk.get("text") or ""):
+                return False
+            processed_chunks[file_name].append(part_id)
+            prefiltered_count += 1
+            log_and_print(f"Morceau {part_id} de {file_name} écarté par le pré-filtre de pertinence : appel évité.", "debug")
+            return True
+
+        def call_chunk(file_name: str, part_id: int, messages: List[dict]):
+            return structured_chat_completion(
+                client, self.name, self.llm_provider, WorkChunkDecision,
+                hedging=self.hedging,
+                scope=budget.scope,
+                chunk_id=f"{file_name}#{part_id}",
+                validation_context={"total_chunks": chunks_by_file[file_name]},
+                model=models["drafting"],
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.5
+            )
 
-            # Boucle sur les morceaux
+        # Spéculation : pendant l'appel du morceau N, le morceau N+1 (choix le plus fréquent du
+        # modèle) est rédigé en parallèle en supposant N traité avec succès. Le résultat est
+        # retenu si le modèle désigne bien N+1, écarté sinon. Désactivée sous budget : un appel
+        # écarté consommerait le budget sans rien produire.
+        speculate = self.speculative and not budget.active
+        speculation_pool = ThreadPoolExecutor(max_workers=1) if speculate else None
+        speculation = {}  # Prédiction en cours : key (fichier, part_id), previous, future, submitted
+        spec_stats = {"hits": 0, "misses": 0, "saved_s": 0.0}
+
+        def speculative_call(file_name: str, part_id: int, messages: List[dict]):
+            decision, result = call_chunk(file_name, part_id, messages)
+            return decision, result, time.perf_counter()
+
+        def start_speculation(file_name: str, file_info: str, part_id: int):
+            """Lance la rédaction spéculative du morceau suivant part_id, s'il peut être rédigé directement."""
+            candidate = part_id + 1
+            if (candidate > chunks_by_file[file_name] or candidate in processed_chunks[file_name]
+                    or (file_name, candidate) in dedup.duplicates):
+                return
+            chunk = chunk_store.get(file_name, candidate)
+            if classifier and classifier.is_irrelevant(chunk.get("text") or ""):
+                return  # Morceau que le pré-filtre écartera : rien à anticiper
+            messages = build_chunk_messages(drafting_synthesis, file_name, file_info, chunks_by_file[file_name],
+                                            processed_chunks[file_name] + [candidate], file_guesses[file_name],
+                                            chunk, previous_part_id=part_id, outline=file_outlines[file_name])
+            speculation.update(key=(file_name, candidate), previous=part_id, submitted=time.perf_counter(),
+                               future=speculation_pool.submit(speculative_call, file_name, candidate, messages))
+
+        def take_speculation(file_name: str, part_id: int):
+            """Appel spéculatif correspondant à ce morceau (prédiction juste), ou None ; une prédiction fausse est écartée."""
+            if not speculation:
+                return None
+            if speculation["key"] == (file_name, part_id) and speculation["previous"] == last_part_ids[file_name]:
+                spec_stats["hits"] += 1
+                hit = dict(speculation, needed=time.perf_counter())
+                speculation.clear()
+                return hit
+            spec_stats["misses"] += 1
+            log_and_print(f"Spéculation écartée : {speculation['key'][0]}#{speculation['key'][1]} non choisi.", "debug")
+            speculation.clear()
+            return None
+
+        def record_works(file_name: str, part_id: int, decision: WorkChunkDecision, result: str):
+            """Enregistre la réponse validée d'un morceau : guess mis à jour, travaux ajoutés à la sortie."""
+            log_and_print(f"Réponse LLM reçue pour morceau {part_id} : {result}")
+
+            # Réponse validée (mode JSON) : travaux sur plusieurs lignes et prochain morceau toujours présents
+            works = decision.travaux.strip()
+            file_guesses[file_name] = decision.guess.strip() or file_guesses[file_name]
+            last_part_ids[file_name] = part_id
+            handled_chunks.add((file_name, part_id))
+            log_and_print(f"Prochain morceau : {decision.prochain_morceau}", "debug")
+
+            # Une rédaction vide n'est ni un morceau rédigé ni un 'pas rédigé' : pas d'étiquette
+            if decision_log and works:
+                decision_log.record(self.name, file_name, part_id, chunk_store.text(file_name, part_id),
+                                    works.strip("'\" .").lower() != "pas rédigé", model=models["drafting"])
+
+            # Ajouter les travaux au fichier de sortie
+            if works:
+                log_and_print(f"Valeur de works après parsing : {works}", "debug")
+                if works.strip("'\" .").lower() != "pas rédigé":
+                    file_works[file_name].append((part_id, f"Travaux (source : {file_name}) : {works}"))
+                else:
+                    log_and_print(f"Travaux non ajoutés car marqués comme 'pas rédigé' pour {file_name}, morceau {part_id}")
+            else:
+                log_and_print(f"Aucun travaux extrait pour {file_name}, morceau {part_id}", "warning")
+
+        def record_error(file_name: str, part_id: int, e: Exception):
+            log_and_print(f"Erreur lors du traitement du morceau {part_id} pour {file_name} : {str(e)}", "error")
+            file_works[file_name].append((part_id, f"Erreur lors du traitement du morceau {part_id} pour {file_name} : {str(e)}"))
+            failed_files.add(file_name)
+
+        def draft_chunk(file_name: str, file_info: str, part_id: int, final_pass: bool = False):
+            """
+            Traite un morceau et retourne le prochain morceau à traiter ('fin' pour arrêter le
+            fichier), ou None si le budget ne permet pas l'appel. Hors passe finale, un morceau
+            de priorité 'Basse' est différé quand un budget est fixé.
+            """
+            total_chunks = chunks_by_file[file_name]
+            current_chunk = chunk_store.get(file_name, part_id)
+            if budget.active and not final_pass and current_chunk.get("priority") == "Basse":
+                if part_id not in deferred_chunks[file_name]:
+                    deferred_chunks[file_name].append(part_id)
+                    log_and_print(f"Morceau {part_id} de {file_name} de priorité basse : différé.", "debug")
+                return next_unprocessed(file_name, part_id)
+            original = dedup.duplicates.get((file_name, part_id))
+            if original in handled_chunks and dedup.skip((file_name, part_id)):
+                processed_chunks[file_name].append(part_id)
+                log_and_print(f"Morceau {part_id} de {file_name} quasi identique à {original[0]}#{original[1]}, déjà traité : appel évité.")
+                depends_on[file_name].add(original[0])
+                return next_unprocessed(file_name, part_id)
+            if prefiltered(file_name, part_id, current_chunk):
+                return next_unprocessed(file_name, part_id)
+
+            # Construire le prompt : instructions fixes (préfixe mis en cache) puis données du morceau
+            messages = build_chunk_messages(drafting_synthesis, file_name, file_info, total_chunks,
+                                            processed_chunks[file_name] + [part_id], file_guesses[file_name],
+                                            current_chunk, previous_part_id=last_part_ids[file_name],
+                                            outline=file_outlines[file_name])
+            if not budget.allows(messages, 1000):
+                return None
+            hit = take_speculation(file_name, part_id) if speculate else None
+            processed_chunks[file_name].append(part_id)
+            if speculate and not final_pass:
+                start_speculation(file_name, file_info, part_id)
+            log_and_print(f"Traitement du morceau {part_id} pour {file_name}{' (spéculation retenue)' if hit else ''}.", "debug")
+            print(f"Traitement du morceau {part_id} pour {file_name}.")
+
+            # Préparer last_words avant de construire le prompt
+            # if part_id > 1 and previous_travaux and previous_travaux != "pas rédigé" and len(previous_travaux.split()) >= 20:
+            #     last_words = " ".join(previous_travaux.split()[-60:])  # Prend les 30 derniers mots du chunk précédent
+            # else:
+            #     last_words = ""  # Vide pour le premier chunk ou si le précédent n'est pas rédigé
+            try:
+                if hit:
+                    # Latence économisée : la part de l'appel déjà écoulée quand le morceau a été demandé
+                    decision, result, done_at = hit["future"].result()
+                    spec_stats["saved_s"] += min(done_at, hit["needed"]) - hit["submitted"]
+                else:
+                    decision, result = call_chunk(file_name, part_id, messages)
+                record_works(file_name, part_id, decision, result)
+                return decision.prochain_morceau
+
+            except Exception as e:
+                record_error(file_name, part_id, e)
+                # Les erreurs transitoires ont déjà été réessayées par llmscheduler : on passe au
+                # morceau suivant non traité plutôt que d'abandonner le reste du fichier
+                return "fin" if is_fatal(e) else next_unprocessed(file_name, part_id)
+
+        def plan_file(file_name: str, file_info: str):
+            """
+            Mode plan (traversalplan.run_plan) : un appel choisit les morceaux à rédiger sur la table
+            des matières du fichier, puis ces morceaux sont rédigés en parallèle.
+
+            Returns:
+                bool: True si le plan a été exécuté jusqu'au bout, False si le budget l'a
+                interrompu, None si le plan n'a pas pu être obtenu (parcours adaptatif à la place).
+            """
+            total_chunks = chunks_by_file[file_name]
+
+            def call_plan(messages: List[dict]) -> TraversalPlan:
+                plan, _ = structured_chat_completion(
+                    client, self.name, self.llm_provider, TraversalPlan,
+                    hedging=self.hedging,
+                    scope=budget.scope,
+                    chunk_id=f"{file_name}#plan",
+                    validation_context={"total_chunks": total_chunks},
+                    model=models["planning"],
+                    messages=messages,
+                    max_tokens=PLAN_MAX_TOKENS,
+                    temperature=0.3
+                )
+                return plan
+
+            def prepare_chunk(part_id: int, planned: List[int], guess: str):
+                original = dedup.duplicates.get((file_name, part_id))
+                if original in handled_chunks and dedup.skip((file_name, part_id)):
+                    processed_chunks[file_name].append(part_id)
+                    depends_on[file_name].add(original[0])
+                    return None
+                chunk = chunk_store.get(file_name, part_id)
+                if prefiltered(file_name, part_id, chunk):
+                    return None
+                # Appels parallèles indépendants : morceau complet, recouvrement compris
+                return build_chunk_messages(drafting_synthesis, file_name, file_info, total_chunks, planned, guess,
+                                            chunk, previous_part_id=None, outline=file_outlines[file_name])
+
+            complete, file_guesses[file_name] = run_plan(
+                budget, "rédiger les travaux réalisés dans le projet", drafting_synthesis, file_name, file_info, total_chunks,
+                file_guesses[file_name], table_of_contents(chunk_store, file_name), call_plan, prepare_chunk, 1000,
+                call_chunk, record_works, record_error, processed_chunks[file_name], log_and_print)
+            return complete
+
+        # Étape 7 : Parcours des fichiers, les plus pertinents d'abord si un budget est fixé
+        file_order = budget.rank([name for name, _, _ in pending_files], file_scores)
+        pending_by_name = {name: (file_info, fingerprint) for name, file_info, fingerprint in pending_files}
+        if budget.active:
+            log_and_print("Ordre de traitement sous budget : " + ", ".join(
+                f"{name} ({file_scores[name]:g}/10)" for name in file_order))
+        for file_name in file_order:
+            file_info = pending_by_name[file_name][0]
+            total_chunks = chunks_by_file[file_name]
+            if use_plan(self.traversal, total_chunks):
+                planned = plan_file(file_name, file_info)
+                if planned is not None:
+                    if not planned:
+                        truncated_files.add(file_name)
+                    continue
             next_part_id = 1
             print(f"Début de la boucle pour {file_name}. next_part_id : {next_part_id}")
             while next_part_id and next_part_id != "fin" and (isinstance(next_part_id, int) or next_part_id.isdigit()) and 1 <= int(next_part_id) <= total_chunks:
+                next_part_id = int(next_part_id)
                 if next_part_id in processed_chunks[file_name]:
-                    works_text.append(f"Erreur : Morceau {next_part_id} déjà traité pour {file_name}. Passage à fin.")
+                    file_works[file_name].append((next_part_id, f"Erreur : Morceau {next_part_id} déjà traité pour {file_name}. Passage à fin."))
                     log_and_print(f"Morceau {next_part_id} déjà traité pour {file_name}", "warning")
                     break
+                next_part_id = draft_chunk(file_name, file_info, next_part_id)
+                if next_part_id is None:
+                    truncated_files.add(file_name)
+                    break
+                log_and_print(f"Fin de l'itération. next_part_id : {next_part_id}", "debug")
+
+        # Prédiction restée en suspens à la fin du dernier fichier : écartée
+        if speculation:
+            take_speculation(None, None)
+        if speculation_pool:
+            speculation_pool.shutdown(wait=True)  # Appels écartés terminés : métriques complètes
+            predictions = spec_stats["hits"] + spec_stats["misses"]
+            self.speculation_stats = dict(spec_stats, predictions=predictions,
+                                          hit_rate=spec_stats["hits"] / predictions if predictions else 0.0)
+            log_and_print(f"Spéculation : {spec_stats['hits']}/{predictions} prédiction(s) juste(s) "
+                          f"({self.speculation_stats['hit_rate']:.0%}), {spec_stats['saved_s']:.1f} s de latence "
+                          f"économisée, {spec_stats['misses']} appel(s) écarté(s).")
+
+        # Étape 8 : Morceaux différés, dans le budget restant
+        for file_name in file_order:
+            for part_id in deferred_chunks[file_name]:
+                if part_id in processed_chunks[file_name]:
+                    continue
+                if draft_chunk(file_name, pending_by_name[file_name][0], part_id, final_pass=True) is None:
+                    truncated_files.add(file_name)
+                    break
 
-                current_chunk = file_chunks[next_part_id - 1]
-                processed_chunks[file_name].append(next_part_id)
-                log_and_print(f"Traitement du morceau {next_part_id} pour {file_name}.", "debug")
-                print(f"Traitement du morceau {next_part_id} pour {file_name}.")
-
-                # Vérifier et logger le contenu du morceau
-                # chunk_text = current_chunk['text'].strip() if current_chunk['text'] else "Morceau vide"
-                # log_and_print(f"Contenu du morceau {next_part_id} pour {file_name} : {chunk_text}", "debug")
-                
-                # Préparer last_words avant de construire le prompt
-                # if next_part_id > 1 and previous_travaux and previous_travaux != "pas rédigé" and len(previous_travaux.split()) >= 20:
-                #     last_words = " ".join(previous_travaux.split()[-60:])  # Prend les 30 derniers mots du chunk précédent
-                # else:
-                #     last_words = ""  # Vide pour le premier chunk ou si le précédent n'est pas rédigé
-
-                # Construire le prompt avec instructions renforcées
-                prompt = (
-                    f"Vous êtes un rédacteur de travaux réalisés dans le cadre d'un projet.\n"
-                    f"Votre rôle est de rédiger du fichier (décomposés en chunks) en travaux en lien avec le projet.\n"
-                    # f"Il faut savoir que les informations des fichiers peuvent ne pas sembler interssantes des fois, mais il faut les utiliser pour rédiger les travaux. Parce qu'on n'a pas toujours mieux.\n"
-                    # f"Tu rejettes uniquement un morceau s'il n'a vraiment pas de lien avec le projet ou si le contenu n'est pas interessant pour rédiger en travaux.\n"
-                    # f"Et vous avez plusieurs fichiers à traiter dont les contenus ne sont pas forcément intéressants pour rédiger les travaux. C'est pour cela qu'on fait les guess pour savoir comment on parcours le fichier, surtout s'il est long.\n"
-                    f"L'objectif est de faire des guess sur le fichier à l'aide des morceaux et de la synthèse du projet pour décider comment pour parcourir les chunks.\n"
-                    # f"Par exemple, il y a des fichiers qui relèvent d'une fiche de prise en main utilisateur, d'autres qui sont juste des documentations sur une librairie ou une solution non pertinente, des fichiers marketing ou des cahiers de charge non liés aux travaux réalisés.\n"
-                    f"Par exemple, pour les fichiers longs (chunks >30),tu sautes des morceaux selon ton guess sur le fichier et le contenu probable (que tu dévines) des morceaux. Tu ne vas pas parcourir tous les morceaux, tu décides sur la base de ton guess sur le fichier et si un morceau serait intéressant ou pas à regarder.\n"
-                    f"Supposons que t'es au morceau 2, tu peux par exemple donner numéro 4 directement puisque t'auras jugé que ça valait pas la peine de traiter le morceau 3, parce que tu supposes que ça n'apporterait pas nouvelle information (basé sur ton guess) pour rédiger les travaux du projet.\n"
-                    f"Vous vous basez sur le guess actuel pour guider le parcours du fichier.\n"
-                    # f"Il est possible que l'utilisateur donne un fichier qui ne colle pas trop avec le projet. Il faut pouvoir les détecter et ne pas les traiter.\n"
-                    # f"Tu peux vraiment sauter aux différents morceaux comme tu veux. Tu n'es pas obligé de suivre un ordre linéaire. Surtout si tu as des doutes sur un fichier décider le plus tôt.\n"
-                    # f"Dès qu'un fichier ne semble plus pertinent pour toi, tu peux passer directement à fin\n"
-                    f"La synthèse succincte du projet est : {drafting_synthesis}.\n"
-                    f"Vous travaillez sur le fichier '{file_name}'.\n"
-                    f"Informations sur le fichier : {file_info}.\n"
-                    f"Nombre total de morceaux : {total_chunks}.\n"
-                    f"Morceaux déjà traités : {processed_chunks[file_name]}.\n"
-                    f"Guess actuel sur le fichier : {file_guesses[file_name]}.\n"
-                    f"Voici le morceau à traiter :\n"
-                    f"Morceau {current_chunk['part_id']} : {current_chunk['text']}\n\n"
-                    f"**Instructions importantes** : Vous DEVEZ retourner une réponse dans ce format exact :\n"
-                    f"Travaux: texte rédigé ou 'pas rédigé'\n"
-                    f"Guess: nouveau guess\n"
-                    f"Prochain morceau: numéro ou 'fin'\n"
-                    f"--- Métadonnées ---\n"
-                    f"Source: {file_name}\n"
-                    f"Part_id: {current_chunk['part_id']}\n"
-                    f"Étape 1 : Évaluez le contenu du chunk et son lien avec le projet pour le rédiger en travaux.\n"
-                    f"Étape 2 : S'il y a un lien, rédigez les travaux en utilisant comme sujet 'nous' avec très peu de puces et mentionnez les difficultés rencontrées (s'il y en a). Tu présentes aussi l'objectif des travaux.\n"
-                    f"Suis l'instruction de l'Etape 2. Ne mets pas des commentaires, des introductions. L'objectif est de rédiger sous forme de travaux.\n"
-                    f"Vous n'êtes pas censé dire des choses du genre : Nous avons analysé en détail ... décrites dans le document (faisant référence avec le morceau analysé), etc.\n"
-                    f"Ce n'est pas ça l'objectif. Ce n'est pas de décrire le contenu des fichiers. NON! Vous NE DECRIVEZ pas les morceaux. Vous rédigez le contenu directement comme des travaux réalisés. Vous transformes le morceau pour que ça sonne travaux réalisés PAS UNE DESCRIPTION!! TRES IMPORTANT\n"
-                    f"Notez que les 100 premiers mots du chunk sont identiques à la fin du morceau précédent. Rédigez en tenant compte de ce chevauchement pour qu'on n'ait pas de répétition.\n\n"
-                    # f"Pour qu'il n'y ait pas de coupure dans la rédaction, tu utilises Last words (s'il existe) pour avoir une idée sur sur la fin du texte du chunk précédent rédigé dont sera la suite la rédaction que tu vas faire.\n"
-                    # f"Last words: {last_words}.\n"
-                    f"Pour donner l'impression de fluidité, s'il y a déjà eu un chunk déjà traité (il faut faire introdution pour le premier chunk), REDIGE DIRECTEMENT EN TRAVAUX, sans vouloir faire une transition ou une introduction. Tu vas commence directement par le corps du sujet, les travaux. N'UTILISE AUCUNE PHRASE DE TRANSITION, NON!\n"
-                    # f"Étape 3 : IL FAUT TOUJOURS REDIGER MEME S'IL N'Y A PAS DE LIEN AVEC LE PROJET.\n"
-                    f"Étape 3 : Si le chunk n'a pas de lien avec le projet ou le contenu n'est pas intéressant, indiquez 'pas rédigé'.\n"
-                    f"Étape 4 : Mettez à jour votre guess sur le fichier en fonction de ce morceau.\n"
-                    f"Étape 5 : Choisissez le prochain morceau (numéro entre 1 et {total_chunks}, ou 'fin' si rien à traiter).\n\n"
-                 )
-                try:
-                    response = client.chat.completions.create(
-                        model=model_id,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=1000,
-                        temperature=0.5
-                    )
-                    result = response.choices[0].message.content.strip()
-                    log_and_print(f"Réponse LLM reçue pour morceau {next_part_id} : {result}")
-                    # print(f"Réponse LLM pour morceau {next_part_id} : {result}")
-
-                    # Parser la réponse
-                    lines = result.split("\n")
-                    works = ""
-                    new_guess = file_guesses[file_name]
-                    next_part = None
-
-                    for line in lines:
-                        line = line.strip()
-                        # log_and_print(f"Ligne parsée : '{line}'", "debug")
-                        if line.lower().startswith("travaux:"):
-                            works = line.replace("Travaux:", "").replace("Travaux :", "").strip()
-                            # log_and_print(f"Travaux extraits : {works}", "debug")
-                        elif re.match(r"Guess\s*:\s*.+", line):
-                            match = re.match(r"Guess\s*:\s*(.+)", line)
-                            if match:
-                                new_guess = match.group(1).strip()
-                                file_guesses[file_name] = new_guess
-                                # log_and_print(f"Nouveau guess extrait avec regex : {new_guess}", "debug")
-                            else:
-                                log_and_print(f"Format inattendu pour 'Guess' : {line}", "warning")
-                        elif re.match(r"Prochain morceau\s*:\s*\w+", line):
-                            match = re.match(r"Prochain morceau\s*:\s*(\w+)", line)
-                            if match:
-                                next_part_str = match.group(1).strip()
-                                next_part = int(next_part_str) if next_part_str.isdigit() else next_part_str
-                                log_and_print(f"Prochain morceau extrait avec regex : {next_part}", "debug")
-                            else:
-                                log_and_print(f"Format inattendu pour 'Prochain morceau' : {line}", "warning")
-
-                    if next_part is None:
-                        log_and_print(f"Échec du parsing de 'Prochain morceau' pour {file_name}, morceau {next_part_id}. Réponse : {result}", "error")
-                        next_part = "fin"
-
-                    # Ajouter les travaux au fichier de sortie
-                    if works:
-                        log_and_print(f"Valeur de works après parsing : {works}", "debug")
-                        if works != "pas rédigé":
-                            works_text.append(f"Travaux (source : {file_name}) : {works}")
-                        else:
-                            log_and_print(f"Travaux non ajoutés car marqués comme 'pas rédigé' pour {file_name}, morceau {next_part_id}")
-                    else:
-                        log_and_print(f"Aucun travaux extrait pour {file_name}, morceau {next_part_id}", "warning")
-
-                    # Mise à jour de previous_travaux pour le prochain chunk
-                    # previous_travaux = works
-                    
-                    next_part_id = next_part
-                    log_and_print(f"Fin de l'itération. next_part_id : {next_part_id}", "debug")
-                    # print(f"Fin de l'itération. next_part_id : {next_part_id}")
-
-                except Exception as e:
-                    log_and_print(f"Erreur lors du traitement du morceau {next_part_id} pour {file_name} : {str(e)}", "error")
-                    works_text.append(f"Erreur lors du traitement du morceau {next_part_id} pour {file_name} : {str(e)}")
-                    next_part = "fin"
-                    next_part_id = next_part
+        # Résultats des fichiers entièrement parcourus mis en cache pour la prochaine exécution
+        if run_cache:
+            for file_name in file_order:
+                if file_name in failed_files or file_name in truncated_files:
+                    continue
+                run_cache.store(self.name, file_name, pending_by_name[file_name][1], {
+                    "works": [works for _, works in file_works[file_name]],
+                    "handled": sorted(part_id for source, part_id in handled_chunks if source == file_name),
+                    "depends_on": sorted(depends_on[file_name]),
+                })
+
+        # Morceaux jamais choisis par le parcours des fichiers terminés : étiquettes faibles du journal
+        if decision_log:
+            for file_name in file_order:
+                if file_name in failed_files or file_name in truncated_files:
+                    continue
+                for part_id in range(1, chunks_by_file[file_name] + 1):
+                    if part_id not in processed_chunks[file_name]:
+                        decision_log.record(self.name, file_name, part_id, chunk_store.text(file_name, part_id),
+                                            False, kind=SKIPPED)
+            decision_log.close()
+        if classifier:
+            log_and_print(f"Pré-filtre de pertinence : {prefiltered_count} morceau(x) écarté(s) sans appel LLM.")
+
+        chunk_store.close()
+        log_and_print(dedup.summary())
+        if run_cache:
+            run_cache.close()
+            log_and_print(f"Relance incrémentale : {len(reused_files)} fichier(s) réutilisé(s) sur {len(sources)}.")
+
+        # Travaux dans l'ordre des fichiers ; sous budget, dans l'ordre des morceaux (différés inclus)
+        works_text = []
+        for file_name, works in file_works.items():
+            works_text.extend(text for _, text in (sorted(works, key=lambda w: w[0]) if budget.active else works))
+        if budget.active:
+            log_and_print(budget.summary())
+            if budget.exhausted_reason:
+                works_text.append(f"--- Budget épuisé ({budget.exhausted_reason}) : résultat partiel, "
+                                  f"fichier(s) non terminé(s) : {', '.join(sorted(truncated_files))} ---")
 
         # Vérifier si works_text est vide avant écriture
         if not works_text:
             log_and_print("Aucun travaux rédigé pour aucun fichier.", "warning")
             works_text.append("Aucun travaux rédigé pour les fichiers traités.")
 
-        # Écrire les travaux dans un fichier unique
+        # Écrire les travaux dans le répertoire de l'exécution (écriture atomique)
         try:
-            with open("works_output.txt", "w", encoding="utf-8") as f:
-                f.write("\n\n".join(works_text))
-            log_and_print("Travaux écrits dans works_output.txt")
+            output_path = RunArtifacts.for_run(self.name, self.output_dir).write_text("works_output.txt", "\n\n".join(works_text))
+            log_and_print(f"Travaux écrits dans {output_path}")
         except Exception as e:
             log_and_print(f"Erreur lors de l'écriture dans works_output.txt : {str(e)}", "error")
 